@@ -4,8 +4,14 @@ import streamlit as st
 from dotenv import load_dotenv
 from langchain_huggingface import HuggingFaceEmbeddings
 from fastembed import SparseTextEmbedding
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, models
 from sentence_transformers import CrossEncoder
+from embedding_cache import EmbeddingCache, CachedDenseEmbeddings, CachedSparseEmbedding
+from id_allocator import IdAllocator
+from semantic_cache import SemanticAnswerCache
+from refinement_cache import RefinementCache
+from reranker import RerankEngine
+from inference_backends import FastEmbedDenseEmbeddings, FastEmbedCrossEncoder
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -16,6 +22,10 @@ load_dotenv()
 # ---------------- API KEYS ----------------
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# ---------------- LOCAL STATE ----------------
+# Caches and other on-disk state shared by ingestion and querying
+DATA_DIR = os.getenv("KANUN_DATA_DIR", ".kanun_data")
+
 # ---------------- QDRANT CONFIG ----------------
 COLLECTION_NAME = "pdf_rag_hybrid_collection"
 ORGANIZATION_COLLECTION_NAME = "organization_collection"
@@ -24,20 +34,183 @@ QDRANT_PORT = 6333
 QDRANT_URL = f"http://{QDRANT_HOST}:{QDRANT_PORT}"
 
 # Dense Configuration (all-MiniLM-L6-v2)
+DENSE_MODEL_NAME = "all-MiniLM-L6-v2"
 VECTOR_SIZE = 384 
 DENSE_VECTOR_NAME = "dense_vector"
+# Inference backend: "torch" (HuggingFace / PyTorch) or "onnx" (fastembed, ONNX Runtime on CPU).
+# Check parity after switching with `python inference_backends.py`.
+DENSE_BACKEND = os.getenv("DENSE_BACKEND", "torch")
+# int8 export by default (smaller, faster on CPU); ONNX_QUANTIZED=0 selects the fp32 export
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "1") == "1"
+DENSE_ONNX_MODEL_NAME = "Xenova/all-MiniLM-L6-v2-int8" if ONNX_QUANTIZED else "sentence-transformers/all-MiniLM-L6-v2"
 
 # Sparse Configuration 
 SPARSE_MODEL_NAME = "Qdrant/bm25"
 SPARSE_VECTOR_NAME = "sparse_vector"
 
+# ---------------- COLLECTION PROFILES ----------------
+# Storage/index settings applied when a collection is created, plus the
+# matching search params used by perform_hybrid_search.
+#   quantization: None | "scalar" (int8) | "binary"
+#   oversampling/rescore: fetch more quantized candidates, rescore with originals
+COLLECTION_PROFILES = {
+    "latency_optimized": {
+        "quantization": "scalar", "quantization_always_ram": True,
+        "vectors_on_disk": False, "payload_on_disk": False, "sparse_on_disk": False,
+        "hnsw_m": 32, "hnsw_ef_construct": 200, "sparse_idf": True,
+        "search_hnsw_ef": 128, "search_oversampling": 1.5, "search_rescore": True,
+    },
+    "memory_optimized": {
+        "quantization": "scalar", "quantization_always_ram": True,
+        "vectors_on_disk": True, "payload_on_disk": True, "sparse_on_disk": True,
+        "hnsw_m": 16, "hnsw_ef_construct": 100, "sparse_idf": True,
+        "search_hnsw_ef": 64, "search_oversampling": 2.0, "search_rescore": True,
+    },
+    "large_corpus": {
+        "quantization": "binary", "quantization_always_ram": True,
+        "vectors_on_disk": True, "payload_on_disk": True, "sparse_on_disk": True,
+        "hnsw_m": 16, "hnsw_ef_construct": 128, "sparse_idf": True,
+        "search_hnsw_ef": 128, "search_oversampling": 3.0, "search_rescore": True,
+    },
+}
+DEFAULT_COLLECTION_PROFILE = os.getenv("COLLECTION_PROFILE", "latency_optimized")
+# Per-collection override, e.g. {COLLECTION_NAME: "large_corpus"}
+COLLECTION_PROFILE_BY_NAME = {}
+
+# ---------------- INGESTION CONFIG ----------------
+EMBED_BATCH_SIZE = 64      # Chunks per dense/sparse model call
+UPSERT_BATCH_SIZE = 256    # Points per Qdrant upload request
+
+# PDF parsing runs in a process pool; large PDFs are split into page ranges
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", os.cpu_count() or 1))
+PARSE_PAGES_PER_TASK = 40  # Pages per parsing task
+
+# Streaming pipeline bounds (keep peak memory flat for very large documents)
+PARSE_MAX_IN_FLIGHT = 2 * PARSE_WORKERS  # Page ranges queued in the parsing pool
+INGEST_QUEUE_SIZE = 8                    # Point batches buffered before upload
+
+# Repeated chunk suppression: MinHash + LSH over word shingles finds the
+# candidate, and only an identical normalized text is dropped (legal clauses
+# that differ in one word must both be kept)
+DEDUP_ENABLED = True
+DEDUP_THRESHOLD = 0.97     # Estimated Jaccard similarity of a candidate
+DEDUP_NUM_PERM = 128
+DEDUP_BANDS = 16           # 16 bands x 8 rows
+DEDUP_SHINGLE_SIZE = 3     # Words per shingle
+
+# Atomic global_chunk_id / chunk_seq sequences (safe across processes)
+ID_ALLOCATOR_DB = os.path.join(DATA_DIR, "id_sequences.sqlite")
+
+# Background ingestion jobs (SQLite queue + worker processes)
+JOBS_DB = os.path.join(DATA_DIR, "ingestion_jobs.sqlite")
+JOBS_SPOOL_DIR = os.path.join(DATA_DIR, "uploads")  # Uploaded PDFs wait here until ingested
+INGEST_JOB_WORKERS = 2     # Worker processes running jobs concurrently
+JOB_STALE_AFTER_S = 300    # A running job without heartbeat this long is resumed by another worker
+JOB_POLL_INTERVAL_S = 2    # Worker idle poll / page refresh interval
+JOB_SHUTDOWN_TIMEOUT_S = 10  # On exit, wait this long for workers to finish their job, then terminate them
+
+# ---------------- EMBEDDING CACHE ----------------
+# Content-addressed (model name, text hash) cache in front of both embedders
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+EMBED_CACHE_DIR = os.path.join(DATA_DIR, "embedding_cache")
+EMBED_CACHE_MAX_ENTRIES = 100_000  # Per model; least recently used entries are evicted
+
+# ---------------- QUERY UNDERSTANDING ----------------
+# Act names, section numbers, years and page references found in the question
+# are pushed down as payload filters (unfiltered search is the fallback)
+FILTER_PUSHDOWN_ENABLED = True
+
+# ---------------- ACT ROUTING ----------------
+# Two-level index: ingestion keeps act/section summary vectors in a small
+# "<collection>__routing" collection; queries first route to the top acts
+ROUTING_ENABLED = True
+ROUTING_COLLECTION_SUFFIX = "__routing"
+ROUTING_MIN_ACTS = 20   # Route only once the collection holds at least this many acts
+ROUTING_TOP_ACTS = 5
+ROUTING_LOCK_TIMEOUT_S = 600     # Wait for a concurrent rebuild of the same collection
+ROUTING_LOCK_STALE_S = 3600      # A rebuild lock older than this is considered abandoned
+
+# ---------------- FEDERATED SEARCH ----------------
+# Collection behind each chat page; utils/ui_components.ROLE_PAGES decides
+# which of them a role may include in a federated (multi-collection) search
+PAGE_COLLECTIONS = {
+    "pages/Legal_Assistant.py": COLLECTION_NAME,
+    "pages/Organization_Assistant.py": ORGANIZATION_COLLECTION_NAME,
+}
+COLLECTION_LABELS = {
+    COLLECTION_NAME: "Legal",
+    ORGANIZATION_COLLECTION_NAME: "Organization",
+}
+# Per-collection scores are normalized before fusing ("dbsf" | "minmax" | "rrf")
+FEDERATED_FUSION_METHOD = "dbsf"
+FEDERATED_MAX_WORKERS = 4
+
+# ---------------- MULTI-TENANCY ----------------
+# Collections shared by several client organizations: points carry a tenant id
+# with a tenant-optimized (is_tenant) keyword index, and every search and
+# ingestion run is scoped to one tenant. Large tenants can be moved to a
+# dedicated collection with `python tenants.py <tenant_id>`.
+TENANT_COLLECTIONS = {ORGANIZATION_COLLECTION_NAME}
+TENANT_FIELD = "tenant_id"
+DEFAULT_TENANT_ID = "default"  # Tenant of users without a "tenant_id" in users.json
+TENANT_DB = os.path.join(DATA_DIR, "tenants.sqlite")  # Registry of dedicated tenant collections
+TENANT_REGISTRY_TTL_S = 30  # How long a process trusts its in-memory copy of the registry
+
+# ---------------- FUSION CONFIG ----------------
+FUSION_METHOD = "rrf"          # "rrf" (weighted) | "dbsf" (distribution-based) | "minmax"
+FUSION_RRF_K = 60
+FUSION_ORIGINAL_WEIGHT = 1.5   # Weight of the user's own question vs 1.0 for each generated variant
+
 # ---------------- RERANKING CONFIG ----------------
 # Using a standard Cross-Encoder for high-accuracy re-ranking
 RERANK_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "torch")  # "torch" (sentence-transformers) | "onnx" (fastembed)
+RERANK_ONNX_MODEL_NAME = "Xenova/ms-marco-MiniLM-L-6-v2-int8" if ONNX_QUANTIZED else "Xenova/ms-marco-MiniLM-L-6-v2"
 TOP_K_RERANK = 10  # Number of docs to pass to LLM after re-ranking
+RERANK_MODE = "full"         # "full" | "cascade" (top-M only, skipped when the fused ranking is decisive)
+RERANK_CASCADE_TOP_M = 30    # Fused candidates scored in cascade mode
+RERANK_SKIP_MARGIN = 0.2     # Cascade skips the cross-encoder if the score gap after TOP_K is >= this share of the top score
+RERANK_MAX_LENGTH = 256      # Tokens per (query, chunk) pair; longer inputs are truncated
+RERANK_BATCH_SIZE = 32
+RERANK_CACHE_MAX_ENTRIES = 50_000  # (query, point id) scores, LRU
+
+# ---------------- CONTEXT PACKING ----------------
+# Re-ranked chunks are packed into the prompt under a token budget: adjacent
+# chunks of a file are merged, MMR picks diverse chunks, citations per span
+CONTEXT_PACKING_ENABLED = True
+CONTEXT_TOKEN_BUDGET = 3000
+CONTEXT_MMR_LAMBDA = 0.7        # 1.0 = pure relevance, lower = more diversity
+CONTEXT_CHARS_PER_TOKEN = 4.0   # Token estimate for Gemini input
+# Small-to-big: after re-ranking, each winner brings the chunks up to this many
+# positions before/after it (same file and section, by file_chunk_id); 0 disables
+NEIGHBOR_WINDOW = 1
+
+# ---------------- SEMANTIC ANSWER CACHE ----------------
+# Near-duplicate questions reuse a cached answer (per collection, dropped on re-ingest)
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE_THRESHOLD = 0.95       # Cosine similarity of query embeddings
+SEMANTIC_CACHE_MAX_ENTRIES = 1000     # Per collection, LRU eviction
+SEMANTIC_CACHE_TTL_S = 24 * 60 * 60
+
+# ---------------- QUERY REFINEMENT ----------------
+MAX_REFINED_QUERIES = 3  # LLM variations searched besides the original question (0 disables refinement)
+REFINE_CACHE_ENABLED = True
+REFINE_CACHE_MAX_ENTRIES = 5000
+REFINE_CACHE_TTL_S = 7 * 24 * 60 * 60
+REFINE_CACHE_DB = os.path.join(DATA_DIR, "refinement_cache.sqlite")  # None keeps the cache in memory only
+# The original question is searched while refinement runs. With a deadline, a
+# slow refinement is abandoned and the answer uses the original query's results.
+REFINE_DEADLINE_MS = None  # e.g. 1500; None waits for refinement
 
 # ---------------- LLM CONFIG ----------------
 LLM_MODEL = "gemini-2.5-flash-lite" 
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")  # "gemini" | "fake" (offline, deterministic)
+FAKE_LLM_TOKEN_DELAY_S = 0.02
+STREAM_ANSWERS = True  # Chat pages render the answer token by token
+# Async pipeline (rag_query_async): one shared event loop with AsyncQdrantClient
+# and the async GenAI client instead of the LangGraph/thread pool path
+ASYNC_PIPELINE = os.getenv("ASYNC_PIPELINE", "false").lower() == "true"
+ASYNC_CPU_WORKERS = 4  # Bounded executor for embedding and re-ranking
 
 # Generation Configs exposed for control
 GEN_CONFIG = {
@@ -76,8 +249,8 @@ You are an expert Information Retrieval Specialist. Your task is to transform a
 
 ### Instructions
 1. Analyze the intent and underlying concepts of the User's Question.
-2. Generate EXACTLY 3 distinct search queries.
-3. Diversity Strategy:
+2. Generate EXACTLY {max_queries} distinct search queries.
+3. Diversity Strategy (in this order, as many as requested):
    - Query 1: A rephrasing of the original question using technical synonyms.
    - Query 2: A query targeting the "why" or "how" (the underlying principles).
    - Query 3: A query phrased as a potential answer or a statement (HyDE approach).
@@ -162,10 +335,72 @@ You are a **Strict Compliance Auditor**.
 6.  **Output:** A concise audit report.
 """
 
+# ---------------- COLLECTION PROFILE HELPERS ----------------
+
+def get_collection_profile(collection_name: str) -> dict:
+    """Return the profile settings that apply to `collection_name`."""
+    name = COLLECTION_PROFILE_BY_NAME.get(collection_name, DEFAULT_COLLECTION_PROFILE)
+    return COLLECTION_PROFILES.get(name, COLLECTION_PROFILES["latency_optimized"])
+
+def build_collection_params(collection_name: str) -> dict:
+    """Return create_collection keyword arguments for the collection's profile."""
+    profile = get_collection_profile(collection_name)
+
+    quantization_config = None
+    if profile["quantization"] == "scalar":
+        quantization_config = models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=profile["quantization_always_ram"]
+            )
+        )
+    elif profile["quantization"] == "binary":
+        quantization_config = models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=profile["quantization_always_ram"])
+        )
+
+    hnsw_config = models.HnswConfigDiff(m=profile["hnsw_m"], ef_construct=profile["hnsw_ef_construct"])
+    if collection_name in TENANT_COLLECTIONS:
+        # Searches are always scoped to one tenant: build one HNSW graph per
+        # tenant (payload_m) instead of a global one (m=0)
+        hnsw_config = models.HnswConfigDiff(m=0, payload_m=profile["hnsw_m"], ef_construct=profile["hnsw_ef_construct"])
+
+    return {
+        "vectors_config": {
+            DENSE_VECTOR_NAME: models.VectorParams(
+                size=VECTOR_SIZE, distance=models.Distance.COSINE, on_disk=profile["vectors_on_disk"]
+            )
+        },
+        "sparse_vectors_config": {
+            SPARSE_VECTOR_NAME: models.SparseVectorParams(
+                index=models.SparseIndexParams(on_disk=profile["sparse_on_disk"]),
+                # BM25 needs IDF computed by Qdrant at query time
+                modifier=models.Modifier.IDF if profile["sparse_idf"] else None,
+            )
+        },
+        "hnsw_config": hnsw_config,
+        "quantization_config": quantization_config,
+        "on_disk_payload": profile["payload_on_disk"],
+    }
+
+def build_search_params(collection_name: str) -> models.SearchParams:
+    """Return dense search params (ef, quantization oversampling/rescore) for the collection's profile."""
+    profile = get_collection_profile(collection_name)
+    quantization = None
+    if profile["quantization"]:
+        quantization = models.QuantizationSearchParams(
+            rescore=profile["search_rescore"], oversampling=profile["search_oversampling"]
+        )
+    return models.SearchParams(hnsw_ef=profile["search_hnsw_ef"], quantization=quantization)
+
 # ---------------- CACHED RESOURCES ----------------
 _DENSE_MODEL = None
 _SPARSE_MODEL = None
 _RERANK_MODEL = None
+_RERANK_ENGINE = None
+_EMBED_CACHE = None
+_ID_ALLOCATOR = None
+_SEMANTIC_CACHE = None
+_REFINE_CACHE = None
 
 @st.cache_resource
 def get_qdrant_client():
@@ -177,12 +412,78 @@ def get_qdrant_client():
         st.error(f"Error connecting to Qdrant: {e}")
         return None
 
+def get_embedding_cache():
+    """Return the shared on-disk embedding cache, or None if disabled/unavailable."""
+    global _EMBED_CACHE
+    if _EMBED_CACHE is None and EMBED_CACHE_ENABLED:
+        try:
+            _EMBED_CACHE = EmbeddingCache(EMBED_CACHE_DIR, max_entries=EMBED_CACHE_MAX_ENTRIES)
+        except Exception as e:
+            logging.error(f"Error opening embedding cache: {e}")
+            return None
+    return _EMBED_CACHE
+
+def get_embedding_cache_stats() -> dict:
+    """Return hit/miss counters and hit rate of the embedding cache."""
+    cache = get_embedding_cache()
+    return cache.stats() if cache else {"hits": 0, "misses": 0, "hit_rate": 0.0}
+
+def get_id_allocator():
+    """Return the shared chunk-ID allocator."""
+    global _ID_ALLOCATOR
+    if _ID_ALLOCATOR is None:
+        _ID_ALLOCATOR = IdAllocator(ID_ALLOCATOR_DB)
+    return _ID_ALLOCATOR
+
+def get_collection_generation(collection_name: str) -> int:
+    """Return the ingestion generation of a collection (changes on every re-ingest)."""
+    return get_id_allocator().peek(collection_name, "generation")
+
+def bump_collection_generation(collection_name: str):
+    """Mark a collection as changed so answers cached for it are invalidated."""
+    get_id_allocator().reserve(collection_name, "generation", 1)
+
+def get_semantic_cache():
+    """Return the process-wide semantic answer cache, or None if disabled."""
+    global _SEMANTIC_CACHE
+    if _SEMANTIC_CACHE is None and SEMANTIC_CACHE_ENABLED:
+        _SEMANTIC_CACHE = SemanticAnswerCache(
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+            ttl_seconds=SEMANTIC_CACHE_TTL_S,
+        )
+    return _SEMANTIC_CACHE
+
+def get_refinement_cache():
+    """Return the process-wide query refinement cache, or None if disabled."""
+    global _REFINE_CACHE
+    if _REFINE_CACHE is None and REFINE_CACHE_ENABLED:
+        try:
+            _REFINE_CACHE = RefinementCache(
+                max_entries=REFINE_CACHE_MAX_ENTRIES,
+                ttl_seconds=REFINE_CACHE_TTL_S,
+                db_path=REFINE_CACHE_DB,
+            )
+        except Exception as e:
+            logging.error(f"Error opening refinement cache, falling back to memory: {e}")
+            _REFINE_CACHE = RefinementCache(REFINE_CACHE_MAX_ENTRIES, REFINE_CACHE_TTL_S)
+    return _REFINE_CACHE
+
 def get_dense_model():
     """Return the initialized Dense embeddings model (LangChain wrapper)."""
     global _DENSE_MODEL
     if _DENSE_MODEL is None:
         try:
-            _DENSE_MODEL = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+            if DENSE_BACKEND == "onnx":
+                model_name = DENSE_ONNX_MODEL_NAME
+                _DENSE_MODEL = FastEmbedDenseEmbeddings(model_name, batch_size=EMBED_BATCH_SIZE)
+            else:
+                model_name = DENSE_MODEL_NAME
+                _DENSE_MODEL = HuggingFaceEmbeddings(model_name=DENSE_MODEL_NAME)
+            cache = get_embedding_cache()
+            if cache:
+                # Cache entries are per model name, so backends never mix vectors
+                _DENSE_MODEL = CachedDenseEmbeddings(_DENSE_MODEL, model_name, cache, dim=VECTOR_SIZE)
         except Exception as e:
             logging.error(f"Error loading Dense Model: {e}")
             st.error(f"Error loading Dense Model: {e}")
@@ -195,6 +496,9 @@ def get_sparse_model():
     if _SPARSE_MODEL is None:
         try:
             _SPARSE_MODEL = SparseTextEmbedding(model_name=SPARSE_MODEL_NAME)
+            cache = get_embedding_cache()
+            if cache:
+                _SPARSE_MODEL = CachedSparseEmbedding(_SPARSE_MODEL, SPARSE_MODEL_NAME, cache)
         except Exception as e:
             logging.error(f"Error loading Sparse Model (fastembed): {e}")
             st.error(f"Error loading Sparse Model (fastembed): {e}")
@@ -206,10 +510,31 @@ def get_rerank_model():
     global _RERANK_MODEL
     if _RERANK_MODEL is None:
         try:
-            # We use CrossEncoder from sentence_transformers
-            _RERANK_MODEL = CrossEncoder(RERANK_MODEL_NAME)
+            if RERANK_BACKEND == "onnx":
+                _RERANK_MODEL = FastEmbedCrossEncoder(RERANK_ONNX_MODEL_NAME, max_length=RERANK_MAX_LENGTH)
+            else:
+                # We use CrossEncoder from sentence_transformers
+                _RERANK_MODEL = CrossEncoder(RERANK_MODEL_NAME, max_length=RERANK_MAX_LENGTH)
         except Exception as e:
             logging.error(f"Error loading Rerank Model: {e}")
             st.error(f"Error loading Rerank Model: {e}")
             return None
-    return _RERANK_MODEL
\ No newline at end of file
+    return _RERANK_MODEL
+
+def get_rerank_engine():
+    """Return the re-ranking engine (score cache + cascade) around the CrossEncoder."""
+    global _RERANK_ENGINE
+    if _RERANK_ENGINE is None:
+        model = get_rerank_model()
+        if model is None:
+            return None
+        _RERANK_ENGINE = RerankEngine(
+            model,
+            RERANK_ONNX_MODEL_NAME if RERANK_BACKEND == "onnx" else RERANK_MODEL_NAME,
+            mode=RERANK_MODE,
+            batch_size=RERANK_BATCH_SIZE,
+            cascade_top_m=RERANK_CASCADE_TOP_M,
+            skip_margin=RERANK_SKIP_MARGIN,
+            cache_max_entries=RERANK_CACHE_MAX_ENTRIES,
+        )
+    return _RERANK_ENGINE
@@ -0,0 +1,166 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Dict, Set
+
+
+@dataclass
+class ContextSpan:
+    """Text of one or more adjacent chunks of the same source, with its citation."""
+    legal_act_name: str
+    source_file: str
+    chunk_ids: List[int]
+    pages: List
+    text: str
+    score: float
+    collection_label: str = ""  # Set in federated (multi-collection) searches
+
+    @property
+    def citation(self) -> str:
+        pages = sorted(
+            {p for p in self.pages if p not in (None, "?")},
+            key=lambda p: (0, p, "") if isinstance(p, int) else (1, 0, str(p)),
+        )
+        label = f" | {self.collection_label}" if self.collection_label else ""
+        if not pages:
+            return f"[Source: {self.legal_act_name}{label}]"
+        page_text = str(pages[0]) if len(pages) == 1 else f"{pages[0]}-{pages[-1]}"
+        return f"[Source: {self.legal_act_name}, Page {page_text}{label}]"
+
+
+@dataclass
+class PackedContext:
+    text: str
+    spans: List[ContextSpan] = field(default_factory=list)
+    docs_used: int = 0
+    tokens: int = 0
+    tokens_unpacked: int = 0  # What joining every doc verbatim would have cost
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_unpacked - self.tokens)
+
+
+def estimate_tokens(text: str, chars_per_token: float = 4.0) -> int:
+    return int(len(text) / chars_per_token) + 1
+
+
+def _words(text: str) -> Set[str]:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _strip_overlap(previous: str, following: str, max_overlap: int) -> str:
+    """Drops the prefix of `following` that repeats the end of `previous` (splitter overlap)."""
+    for size in range(min(max_overlap, len(previous), len(following)), 9, -1):
+        if previous.endswith(following[:size]):
+            return following[size:]
+    return following
+
+
+def mmr_order(docs: List[Dict], mmr_lambda: float) -> List[Dict]:
+    """
+    Maximal Marginal Relevance ordering: relevance is the (min-max scaled)
+    rerank score, redundancy the lexical Jaccard similarity to the docs
+    already picked.
+    """
+    if len(docs) <= 1:
+        return list(docs)
+    scores = [float(d.get("score") or 0.0) for d in docs]
+    low, high = min(scores), max(scores)
+    relevance = [(s - low) / (high - low) if high > low else 1.0 for s in scores]
+    words = [_words(d["chunk"]) for d in docs]
+
+    remaining = list(range(len(docs)))
+    picked: List[int] = []
+    while remaining:
+        best = max(
+            remaining,
+            key=lambda i: mmr_lambda * relevance[i]
+            - (1 - mmr_lambda) * max((_jaccard(words[i], words[j]) for j in picked), default=0.0),
+        )
+        picked.append(best)
+        remaining.remove(best)
+    return [docs[i] for i in picked]
+
+
+def merge_adjacent(docs: List[Dict], max_overlap: int = 200) -> List[ContextSpan]:
+    """
+    Merges chunks of the same source file (in the same collection) with
+    consecutive file_chunk_id into single spans (removing the repeated
+    overlap). Spans are ordered by their best score.
+    """
+    by_source: Dict[tuple, List[Dict]] = {}
+    loose: List[Dict] = []
+    for d in docs:
+        if d.get("source_file") is not None and d.get("file_chunk_id") is not None:
+            by_source.setdefault((d.get("collection"), d["source_file"]), []).append(d)
+        else:
+            loose.append(d)
+
+    spans: List[ContextSpan] = []
+    for (_, source_file), source_docs in by_source.items():
+        span = None
+        for d in sorted(source_docs, key=lambda x: x["file_chunk_id"]):
+            if span and d["file_chunk_id"] == span.chunk_ids[-1] + 1:
+                span.text += _strip_overlap(span.text, d["chunk"], max_overlap)
+                span.chunk_ids.append(d["file_chunk_id"])
+                span.pages.append(d.get("page_number"))
+                span.score = max(span.score, float(d.get("score") or 0.0))
+                continue
+            span = ContextSpan(
+                legal_act_name=d.get("legal_act_name", "Nepal Act"),
+                source_file=source_file,
+                chunk_ids=[d["file_chunk_id"]],
+                pages=[d.get("page_number")],
+                text=d["chunk"],
+                score=float(d.get("score") or 0.0),
+                collection_label=d.get("collection_label") or "",
+            )
+            spans.append(span)
+
+    for d in loose:
+        spans.append(ContextSpan(
+            legal_act_name=d.get("legal_act_name", "Nepal Act"),
+            source_file=d.get("source_file") or "",
+            chunk_ids=[],
+            pages=[d.get("page_number")],
+            text=d["chunk"],
+            score=float(d.get("score") or 0.0),
+            collection_label=d.get("collection_label") or "",
+        ))
+    return sorted(spans, key=lambda s: s.score, reverse=True)
+
+
+def _render(spans: List[ContextSpan]) -> str:
+    return "\n\n".join(f"{span.citation}: {span.text}" for span in spans)
+
+
+def pack_context(docs: List[Dict], token_budget: int, mmr_lambda: float = 0.7,
+                 chars_per_token: float = 4.0) -> PackedContext:
+    """
+    Builds the prompt context from re-ranked docs: docs are taken in MMR
+    order while the merged context fits `token_budget` (estimated tokens),
+    adjacent chunks are merged into spans and each span keeps its citation.
+    """
+    unpacked = "\n\n".join(f"[Source: {d.get('legal_act_name', 'Nepal Act')}]: {d['chunk']}" for d in docs)
+    selected: List[Dict] = []
+    spans: List[ContextSpan] = []
+    for d in mmr_order(docs, mmr_lambda):
+        candidate_spans = merge_adjacent(selected + [d])
+        # The best doc is always kept, even if it alone exceeds the budget
+        if estimate_tokens(_render(candidate_spans), chars_per_token) > token_budget and selected:
+            continue
+        selected.append(d)
+        spans = candidate_spans
+
+    text = _render(spans)
+    return PackedContext(
+        text=text,
+        spans=spans,
+        docs_used=len(selected),
+        tokens=estimate_tokens(text, chars_per_token) if text else 0,
+        tokens_unpacked=estimate_tokens(unpacked, chars_per_token) if unpacked else 0,
+    )
@@ -0,0 +1,75 @@
+import re
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Universal hashing h(x) = (a*x + b) mod P with a 31-bit prime keeps a*x within uint64
+_PRIME = np.uint64((1 << 31) - 1)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase text with runs of whitespace collapsed (what counts as "the same" chunk text)."""
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def _shingle_hashes(text: str, shingle_size: int) -> np.ndarray:
+    """CRC32 hashes of the word n-gram shingles of normalized text."""
+    words = normalize_text(text).split(" ")
+    if len(words) <= shingle_size:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+class MinHashLSH:
+    """
+    Near-duplicate index over MinHash signatures with banded LSH.
+
+    Candidates come from band buckets (roughly (1/bands)^(1/rows) similarity
+    or more) and are confirmed against `threshold` with the signature's
+    estimated Jaccard similarity.
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, bands: int = 16, shingle_size: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        rng = np.random.default_rng(seed)
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self._a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[str, np.ndarray] = {}
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = _shingle_hashes(text, self.shingle_size) % _PRIME
+        return ((np.outer(self._a, hashes) + self._b[:, None]) % _PRIME).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def query(self, signature: np.ndarray) -> Optional[str]:
+        """Returns the key of the most similar indexed item above the threshold, if any."""
+        candidates = set()
+        for band, band_key in self._band_keys(signature):
+            candidates.update(self._buckets[band].get(band_key, ()))
+
+        best_key, best_score = None, self.threshold
+        for key in candidates:
+            score = float(np.mean(self._signatures[key] == signature))
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def insert(self, key: str, signature: np.ndarray):
+        self._signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band].setdefault(band_key, []).append(key)
+
+    def __len__(self):
+        return len(self._signatures)
@@ -0,0 +1,307 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import List, Dict, Optional
+
+import numpy as np
+from fastembed import SparseEmbedding
+
+
+def text_key(model_name: str, text: str) -> str:
+    """Content address of an embedding: hash of (model name, text)."""
+    return hashlib.sha256(f"{model_name}\x1f{text}".encode("utf-8")).hexdigest()
+
+
+def _slot_tag(key: str) -> int:
+    """64-bit tag of a key stored next to its slot (0 marks an empty or half-written slot)."""
+    return int(key[:16], 16) or 1
+
+
+def _open_memmap(path: str, dtype, shape: tuple) -> np.memmap:
+    """
+    Opens a fixed-size memory-mapped file, creating it atomically: it is
+    sized under a temporary name and linked into place, so a process racing
+    on the same path never truncates (or maps a short) file.
+    """
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.truncate(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed embedding cache.
+
+    Dense vectors live in one memory-mapped float32 matrix per model
+    (`max_entries` x dim rows); a SQLite index maps each key to its row and
+    tracks last use for LRU eviction. Sparse vectors are variable length, so
+    they are stored as blobs in the same SQLite index under the same cap.
+
+    Several processes share the files. Each row has a tag (a hash of its
+    key) in a second memmap. The tag is cleared while the row is rewritten.
+    A read only counts as a hit if the tag matches before and after copying
+    the row, so an evicted, half-written or rolled-back row is a miss and
+    never another text's vector.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._lock = threading.RLock()
+        self._stores: Dict[str, tuple] = {}
+        self._hits = 0
+        self._misses = 0
+
+        self._db = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite"), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS dense_entries ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, slot INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sparse_entries ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, indices BLOB NOT NULL, vals BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS dense_lru ON dense_entries (model, last_used)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS sparse_lru ON sparse_entries (model, last_used)")
+
+    # ---------------- internals ----------------
+
+    def _store(self, model_name: str, dim: int) -> tuple:
+        """Opens (or creates) the memory-mapped (vectors, slot tags) backing `model_name`."""
+        store = self._stores.get(model_name)
+        if store is None:
+            safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+            path = os.path.join(self.cache_dir, f"{safe_name}.{dim}.f32")
+            store = (
+                _open_memmap(path, np.float32, (self.max_entries, dim)),
+                _open_memmap(f"{path}.tags", np.uint64, (self.max_entries,)),
+            )
+            self._stores[model_name] = store
+        return store
+
+    def _touch(self, table: str, keys: List[str]):
+        if keys:
+            now = time.time()
+            self._db.executemany(f"UPDATE {table} SET last_used = ? WHERE key = ?", [(now, k) for k in keys])
+
+    def _record(self, hits: int, misses: int):
+        self._hits += hits
+        self._misses += misses
+
+    # ---------------- dense ----------------
+
+    def get_dense(self, model_name: str, texts: List[str], dim: int) -> List[Optional[List[float]]]:
+        """Returns cached vectors aligned with `texts` (None for misses)."""
+        keys = [text_key(model_name, t) for t in texts]
+        with self._lock:
+            found = {}
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, slot FROM dense_entries WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update(rows)
+
+            vectors, tags = self._store(model_name, dim) if found else (None, None)
+            valid = {}
+            for key, slot in found.items():
+                tag = _slot_tag(key)
+                if tags[slot] != tag:
+                    continue
+                vector = vectors[slot].tolist()
+                # Unchanged tag: the row was not rewritten while it was copied
+                if tags[slot] == tag:
+                    valid[key] = vector
+            results = [valid.get(k) for k in keys]
+            self._touch("dense_entries", list(valid))
+            self._record(len(valid), len(keys) - len(valid))
+        return results
+
+    def put_dense(self, model_name: str, texts: List[str], vectors: List[List[float]]):
+        """Stores vectors, evicting the least recently used rows once the cap is reached."""
+        if not texts:
+            return
+        dim = len(vectors[0])
+        with self._lock:
+            vectors_store, tags = self._store(model_name, dim)
+            now = time.time()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for text, vector in zip(texts, vectors):
+                    key = text_key(model_name, text)
+                    row = self._db.execute("SELECT slot FROM dense_entries WHERE key = ?", (key,)).fetchone()
+                    if row is None:
+                        (count,) = self._db.execute(
+                            "SELECT COUNT(*) FROM dense_entries WHERE model = ?", (model_name,)
+                        ).fetchone()
+                        if count < self.max_entries:
+                            slot = count
+                        else:
+                            old_key, slot = self._db.execute(
+                                "SELECT key, slot FROM dense_entries WHERE model = ? ORDER BY last_used LIMIT 1",
+                                (model_name,),
+                            ).fetchone()
+                            self._db.execute("DELETE FROM dense_entries WHERE key = ?", (old_key,))
+                        self._db.execute(
+                            "INSERT INTO dense_entries (key, model, slot, last_used) VALUES (?, ?, ?, ?)",
+                            (key, model_name, slot, now),
+                        )
+                    else:
+                        slot = row[0]
+                    # Shared mappings are coherent across processes; flush is only for durability
+                    tags[slot] = 0
+                    vectors_store[slot] = vector
+                    tags[slot] = _slot_tag(key)
+                vectors_store.flush()
+                tags.flush()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    # ---------------- sparse ----------------
+
+    def get_sparse(self, model_name: str, texts: List[str]) -> List[Optional[SparseEmbedding]]:
+        """Returns cached sparse embeddings aligned with `texts` (None for misses)."""
+        keys = [text_key(model_name, t) for t in texts]
+        with self._lock:
+            found = {}
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, indices, vals FROM sparse_entries WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, indices, vals in rows:
+                    found[key] = SparseEmbedding(
+                        values=np.frombuffer(vals, dtype=np.float32),
+                        indices=np.frombuffer(indices, dtype=np.int64),
+                    )
+            self._touch("sparse_entries", list(found))
+            self._record(len(found), len(keys) - len(found))
+        return [found.get(k) for k in keys]
+
+    def put_sparse(self, model_name: str, texts: List[str], embeddings: List[SparseEmbedding]):
+        """Stores sparse embeddings and trims the model's entries back to the cap (LRU)."""
+        if not texts:
+            return
+        now = time.time()
+        rows = [
+            (
+                text_key(model_name, text),
+                model_name,
+                np.asarray(emb.indices, dtype=np.int64).tobytes(),
+                np.asarray(emb.values, dtype=np.float32).tobytes(),
+                now,
+            )
+            for text, emb in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO sparse_entries (key, model, indices, vals, last_used) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                (count,) = self._db.execute(
+                    "SELECT COUNT(*) FROM sparse_entries WHERE model = ?", (model_name,)
+                ).fetchone()
+                if count > self.max_entries:
+                    self._db.execute(
+                        "DELETE FROM sparse_entries WHERE key IN ("
+                        "SELECT key FROM sparse_entries WHERE model = ? ORDER BY last_used LIMIT ?)",
+                        (model_name, count - self.max_entries),
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    # ---------------- stats ----------------
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for this process since start-up."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / lookups) if lookups else 0.0,
+            }
+
+
+class CachedDenseEmbeddings:
+    """
+    Drop-in wrapper for the LangChain dense embedder (`embed_documents` /
+    `embed_query`) that only sends cache misses to the underlying model.
+    """
+
+    def __init__(self, model, model_name: str, cache: EmbeddingCache, dim: int):
+        self.model = model
+        self.model_name = model_name
+        self.cache = cache
+        self.dim = dim
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_dense(self.model_name, texts, self.dim)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            # Dedupe repeated texts inside the batch before calling the model
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            computed = dict(zip(unique_texts, self.model.embed_documents(unique_texts)))
+            try:
+                self.cache.put_dense(self.model_name, unique_texts, [computed[t] for t in unique_texts])
+            except Exception as e:
+                logging.warning(f"Embedding cache write failed: {e}")
+            for i in missing:
+                vectors[i] = computed[texts[i]]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+class CachedSparseEmbedding:
+    """Drop-in wrapper for fastembed's `SparseTextEmbedding.embed` backed by the cache."""
+
+    def __init__(self, model, model_name: str, cache: EmbeddingCache):
+        self.model = model
+        self.model_name = model_name
+        self.cache = cache
+
+    def embed(self, documents, batch_size: int = 256, **kwargs):
+        texts = [documents] if isinstance(documents, str) else list(documents)
+        embeddings = self.cache.get_sparse(self.model_name, texts)
+        missing = [i for i, e in enumerate(embeddings) if e is None]
+        if missing:
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            computed = dict(zip(unique_texts, self.model.embed(unique_texts, batch_size=batch_size, **kwargs)))
+            try:
+                self.cache.put_sparse(self.model_name, unique_texts, [computed[t] for t in unique_texts])
+            except Exception as e:
+                logging.warning(f"Embedding cache write failed: {e}")
+            for i in missing:
+                embeddings[i] = computed[texts[i]]
+        return iter(embeddings)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
@@ -0,0 +1,77 @@
+import re
+import time
+import asyncio
+from types import SimpleNamespace
+from typing import Iterator
+
+
+class _FakeModels:
+    """Mimics the `client.models` surface of google-genai used by rag_query."""
+
+    def __init__(self, token_delay_s: float):
+        self.token_delay_s = token_delay_s
+
+    @staticmethod
+    def _respond(contents: str, config) -> str:
+        system_instruction = getattr(config, "system_instruction", None)
+        question_match = re.search(r"(?:User Question|USER QUESTION):\s*(.*)", contents, re.DOTALL)
+        question = question_match.group(1).strip() if question_match else contents.strip()[:200]
+
+        # Query refinement calls carry no system instruction
+        if not system_instruction:
+            count_match = re.search(r"EXACTLY (\d+)", contents)
+            count = int(count_match.group(1)) if count_match else 3
+            variants = [
+                f"legal provisions on {question}",
+                f"why and how the law regulates {question}",
+                f"the act states that {question}",
+            ]
+            return "\n".join(variants[:count])
+
+        sources = re.findall(r"\[Source: ([^\]]+)\]", contents)
+        cited = ", ".join(dict.fromkeys(sources[:3])) or "no sources"
+        return (
+            "### 1. 🔍 Detailed Analysis & Legal Interpretation\n\n"
+            f"This is an offline answer from the fake LLM backend for: {question}\n\n"
+            f"It was generated from {len(sources)} context chunk(s) [Source: {cited}].\n\n"
+            "### 2. 📝 Summary/Key Takeaway\n\n"
+            "Set LLM_BACKEND=gemini to get real answers."
+        )
+
+    def generate_content(self, model: str, contents: str, config=None):
+        return SimpleNamespace(text=self._respond(contents, config))
+
+    def generate_content_stream(self, model: str, contents: str, config=None) -> Iterator[SimpleNamespace]:
+        for token in re.findall(r"\S+\s*", self._respond(contents, config)):
+            if self.token_delay_s:
+                time.sleep(self.token_delay_s)
+            yield SimpleNamespace(text=token)
+
+
+class _FakeAsyncModels:
+    """Mimics `client.aio.models` (async generate_content / generate_content_stream)."""
+
+    def __init__(self, models: _FakeModels):
+        self._models = models
+
+    async def generate_content(self, model: str, contents: str, config=None):
+        return self._models.generate_content(model, contents, config)
+
+    async def generate_content_stream(self, model: str, contents: str, config=None):
+        async def _chunks():
+            for token in re.findall(r"\S+\s*", self._models._respond(contents, config)):
+                if self._models.token_delay_s:
+                    await asyncio.sleep(self._models.token_delay_s)
+                yield SimpleNamespace(text=token)
+        return _chunks()
+
+
+class FakeGenAIClient:
+    """
+    Deterministic stand-in for `genai.Client` (LLM_BACKEND="fake"), so the
+    app and the streaming path can run offline and without an API key.
+    """
+
+    def __init__(self, token_delay_s: float = 0.02):
+        self.models = _FakeModels(token_delay_s)
+        self.aio = SimpleNamespace(models=_FakeAsyncModels(self.models))
@@ -0,0 +1,80 @@
+from typing import List, Dict, Sequence
+
+import numpy as np
+
+FUSION_METHODS = ("rrf", "dbsf", "minmax")
+
+
+def _normalize(scores: np.ndarray, method: str) -> np.ndarray:
+    """Maps one source's raw scores to [0, 1]."""
+    if method == "dbsf":
+        # Distribution-based: mean +/- 3 standard deviations as the bounds
+        mean, std = scores.mean(), scores.std()
+        low, high = mean - 3 * std, mean + 3 * std
+    else:
+        low, high = scores.min(), scores.max()
+    if high <= low:
+        return np.ones_like(scores)
+    return np.clip((scores - low) / (high - low), 0.0, 1.0)
+
+
+def fuse(
+    results_list: Sequence[List[Dict]],
+    method: str = "rrf",
+    weights: Sequence[float] = None,
+    k: int = 60,
+) -> List[Dict]:
+    """
+    Fuses several ranked result lists into one, keyed by (collection, point ID).
+
+    - "rrf": weighted Reciprocal Rank Fusion, sum of w / (k + rank + 1).
+    - "dbsf": Distribution-Based Score Fusion, each source's scores are
+      normalized with its mean +/- 3 std, then summed with weights.
+    - "minmax": as dbsf, with per-source min-max normalization.
+
+    `weights` (one per list, default 1.0) lets e.g. the original query
+    count more than generated variants. Returns new dicts sorted by fused
+    score; the input lists and dicts are never modified.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method '{method}', expected one of {FUSION_METHODS}")
+    weights = [1.0] * len(results_list) if weights is None else list(weights)
+    if len(weights) != len(results_list):
+        raise ValueError("weights must have one entry per result list")
+
+    # 1. Column per unique point (first occurrence keeps the payload)
+    positions: Dict = {}
+    first_docs: List[Dict] = []
+    columns, contributions = [], []
+    for results, weight in zip(results_list, weights):
+        if not results:
+            continue
+        idx = np.empty(len(results), dtype=np.int64)
+        for i, doc in enumerate(results):
+            # Point IDs are only unique within a collection
+            key = (doc.get("collection"), doc["id"]) if doc.get("id") is not None else doc["chunk"]
+            pos = positions.get(key)
+            if pos is None:
+                pos = positions[key] = len(first_docs)
+                first_docs.append(doc)
+            idx[i] = pos
+
+        # 2. Per-source contribution, computed as one array
+        if method == "rrf":
+            contribution = weight / (k + np.arange(1, len(results) + 1, dtype=np.float64))
+        else:
+            raw = np.fromiter((doc["score"] for doc in results), dtype=np.float64, count=len(results))
+            contribution = weight * _normalize(raw, method)
+
+        columns.append(idx)
+        contributions.append(contribution)
+
+    if not first_docs:
+        return []
+
+    # 3. Accumulate (a point repeated in one list counts every time, as in RRF)
+    fused = np.zeros(len(first_docs), dtype=np.float64)
+    np.add.at(fused, np.concatenate(columns), np.concatenate(contributions))
+
+    order = np.argsort(-fused, kind="stable")
+    return [{**first_docs[i], "score": float(fused[i])} for i in order]
@@ -0,0 +1,141 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional, Sequence
+
+from qdrant_client import models
+
+
+class IdAllocator:
+    """
+    Atomic integer sequences (per collection and sequence name) backed by a
+    local SQLite file. `reserve` hands out whole ID ranges in one
+    transaction, so parallel threads and processes never receive
+    overlapping IDs and no Qdrant probe is needed per file. `lock` uses
+    the same file for named per-collection locks across processes.
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sequences ("
+            "collection TEXT NOT NULL, name TEXT NOT NULL, next_value INTEGER NOT NULL, "
+            "PRIMARY KEY (collection, name))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS locks ("
+            "collection TEXT NOT NULL, name TEXT NOT NULL, owner TEXT NOT NULL, acquired_at REAL NOT NULL, "
+            "PRIMARY KEY (collection, name))"
+        )
+
+    def reserve(self, collection_name: str, sequence: str, count: int, seed: Optional[Callable[[], int]] = None) -> int:
+        """
+        Reserves `count` consecutive IDs and returns the first one.
+        `seed` is called once, when the sequence does not exist yet, to get
+        its starting value (e.g. the current maximum stored in Qdrant + 1).
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT next_value FROM sequences WHERE collection = ? AND name = ?",
+                    (collection_name, sequence),
+                ).fetchone()
+                start = row[0] if row else (seed() if seed else 0)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sequences (collection, name, next_value) VALUES (?, ?, ?)",
+                    (collection_name, sequence, start + count),
+                )
+                self._db.execute("COMMIT")
+                return start
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def peek(self, collection_name: str, sequence: str) -> int:
+        """Returns the next value of a sequence without reserving it (0 if unused)."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT next_value FROM sequences WHERE collection = ? AND name = ?",
+                (collection_name, sequence),
+            ).fetchone()
+        return row[0] if row else 0
+
+    def _try_lock(self, collection_name: str, name: str, owner: str, stale_after_s: float) -> bool:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT acquired_at FROM locks WHERE collection = ? AND name = ?", (collection_name, name)
+                ).fetchone()
+                now = time.time()
+                # A lock older than `stale_after_s` belongs to a crashed holder and is taken over
+                acquired = row is None or now - row[0] > stale_after_s
+                if acquired:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO locks (collection, name, owner, acquired_at) VALUES (?, ?, ?, ?)",
+                        (collection_name, name, owner, now),
+                    )
+                self._db.execute("COMMIT")
+                return acquired
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    @contextmanager
+    def lock(self, collection_name: str, name: str, timeout_s: float = 600.0, stale_after_s: float = 3600.0,
+             poll_s: float = 0.5):
+        """
+        Holds the named lock of a collection for the `with` block, waiting up
+        to `timeout_s` for another thread or process to release it (raises
+        TimeoutError). Serializes read-modify-write work such as rebuilding
+        a collection's routing index.
+        """
+        owner = f"{os.getpid()}:{threading.get_ident()}:{uuid.uuid4().hex}"
+        deadline = time.time() + timeout_s
+        while not self._try_lock(collection_name, name, owner, stale_after_s):
+            if time.time() >= deadline:
+                raise TimeoutError(f"Timed out waiting for lock '{name}' of {collection_name}")
+            time.sleep(poll_s)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._db.execute(
+                    "DELETE FROM locks WHERE collection = ? AND name = ? AND owner = ?", (collection_name, name, owner)
+                )
+
+    def reset(self, collection_name: str, keep: Sequence[str] = ("generation",)):
+        """
+        Forgets the sequences of a collection (e.g. after it was deleted),
+        except those in `keep`: the ingestion generation must keep counting
+        up, or answers cached for the deleted data would match it again.
+        """
+        with self._lock:
+            self._db.execute(
+                f"DELETE FROM sequences WHERE collection = ? AND name NOT IN ({','.join('?' * len(keep))})",
+                (collection_name, *keep),
+            )
+
+
+def next_id_from_qdrant(client, collection_name: str, key: str) -> int:
+    """
+    Returns max(`key`) + 1 over the collection using an `order_by` scroll on
+    the integer payload index (0 for an empty collection).
+    """
+    records, _ = client.scroll(
+        collection_name=collection_name,
+        limit=1,
+        with_payload=[key],
+        with_vectors=False,
+        order_by=models.OrderBy(key=key, direction=models.Direction.DESC),
+    )
+    if not records:
+        return 0
+    return int((records[0].payload or {}).get(key, -1)) + 1
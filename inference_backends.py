@@ -0,0 +1,155 @@
+import sys
+import logging
+import argparse
+from itertools import groupby
+from typing import List, Sequence
+
+import numpy as np
+
+# int8 (dynamically quantized) exports of the app's models, which fastembed
+# does not list itself: name -> (Hugging Face repo, ONNX file, dense dim or None for cross-encoders)
+QUANTIZED_MODELS = {
+    "Xenova/all-MiniLM-L6-v2-int8": ("Xenova/all-MiniLM-L6-v2", "onnx/model_quantized.onnx", 384),
+    "Xenova/ms-marco-MiniLM-L-6-v2-int8": ("Xenova/ms-marco-MiniLM-L-6-v2", "onnx/model_quantized.onnx", None),
+}
+
+
+def _register_quantized(model_name: str, registry) -> None:
+    """Registers `model_name` with fastembed if it is one of QUANTIZED_MODELS (once per process)."""
+    if model_name not in QUANTIZED_MODELS:
+        return
+    if any(m["model"] == model_name for m in registry.list_supported_models()):
+        return
+    from fastembed.common.model_description import ModelSource, PoolingType
+
+    repo, model_file, dim = QUANTIZED_MODELS[model_name]
+    if dim is None:
+        registry.add_custom_model(model=model_name, sources=ModelSource(hf=repo), model_file=model_file)
+    else:
+        registry.add_custom_model(
+            model=model_name, pooling=PoolingType.MEAN, normalization=True,
+            sources=ModelSource(hf=repo), dim=dim, model_file=model_file,
+        )
+
+
+class FastEmbedDenseEmbeddings:
+    """
+    ONNX Runtime (fastembed) dense embedder with the LangChain
+    `embed_documents` / `embed_query` interface used across the app.
+    Accepts fastembed's own models and the int8 QUANTIZED_MODELS.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 64, threads: int = None):
+        from fastembed import TextEmbedding
+
+        _register_quantized(model_name, TextEmbedding)
+        self.model = TextEmbedding(model_name=model_name, threads=threads)
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [vector.tolist() for vector in self.model.embed(texts, batch_size=self.batch_size)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class FastEmbedCrossEncoder:
+    """
+    ONNX Runtime (fastembed) cross-encoder exposing the
+    `CrossEncoder.predict(pairs, batch_size)` interface used by the rerank engine.
+    `max_length` truncates each (query, document) pair to that many tokens,
+    as `CrossEncoder(max_length=...)` does. Accepts the int8 QUANTIZED_MODELS.
+    """
+
+    def __init__(self, model_name: str, threads: int = None, max_length: int = None):
+        from fastembed.rerank.cross_encoder import TextCrossEncoder
+
+        _register_quantized(model_name, TextCrossEncoder)
+        self.model = TextCrossEncoder(model_name=model_name, threads=threads)
+        tokenizer = getattr(self.model.model, "tokenizer", None)
+        if max_length and tokenizer is not None:
+            # Only ever lowers the model's own limit; keeps its truncation side
+            truncation = tokenizer.truncation or {}
+            tokenizer.enable_truncation(
+                max_length=min(truncation.get("max_length") or max_length, max_length),
+                direction=truncation.get("direction", "right"),
+            )
+
+    def predict(self, pairs: Sequence[Sequence[str]], batch_size: int = 32) -> np.ndarray:
+        scores = []
+        # fastembed scores one query against many documents; pairs sharing a query are grouped
+        for query, group in groupby(pairs, key=lambda pair: pair[0]):
+            documents = [document for _, document in group]
+            scores.extend(self.model.rerank(query, documents, batch_size=batch_size))
+        return np.asarray(scores, dtype=np.float32)
+
+
+# -------------------- PARITY CHECK --------------------
+
+PARITY_QUERY = "What are the penalties for hacking a computer system?"
+PARITY_TEXTS = [
+    "Any person who accesses a computer system without authorization shall be punished with a fine or imprisonment.",
+    "The Electronic Transactions Act recognizes digital signatures as legally valid.",
+    "A bank shall verify the identity of its customers before opening an account.",
+    "Whoever alters source code with malicious intent shall be liable to imprisonment of up to three years.",
+    "The Social Welfare Council approves projects of non-governmental organizations.",
+    "Personal data shall not be collected without the consent of the individual concerned.",
+    "Hospitals shall manage biohazardous waste according to the prescribed standards.",
+    "The teacher-student ratio shall comply with the norms set by the Ministry of Education.",
+]
+
+
+def _kendall_tau(a: Sequence[float], b: Sequence[float]) -> float:
+    n = len(a)
+    concordant = discordant = 0
+    for i in range(n):
+        for j in range(i + 1, n):
+            sign = np.sign(a[i] - a[j]) * np.sign(b[i] - b[j])
+            concordant += sign > 0
+            discordant += sign < 0
+    pairs = n * (n - 1) / 2
+    return float((concordant - discordant) / pairs) if pairs else 1.0
+
+
+def check_parity(dense_min_cosine: float = 0.98, rerank_min_tau: float = 0.8, top_k: int = 3) -> bool:
+    """
+    Compares the ONNX backends against the PyTorch reference models on a
+    small legal-text sample: dense vectors must have cosine similarity >=
+    `dense_min_cosine` (int8 weights move vectors slightly), and reranker orderings must agree on the top-k and
+    have Kendall tau >= `rerank_min_tau`.
+    """
+    import config
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from sentence_transformers import CrossEncoder
+
+    ok = True
+
+    reference = np.asarray(HuggingFaceEmbeddings(model_name=config.DENSE_MODEL_NAME).embed_documents(PARITY_TEXTS))
+    candidate = np.asarray(FastEmbedDenseEmbeddings(config.DENSE_ONNX_MODEL_NAME).embed_documents(PARITY_TEXTS))
+    cosines = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    print(f"Dense  min cosine: {cosines.min():.5f} (>= {dense_min_cosine})")
+    ok &= bool(cosines.min() >= dense_min_cosine)
+
+    pairs = [[PARITY_QUERY, text] for text in PARITY_TEXTS]
+    reference_scores = CrossEncoder(config.RERANK_MODEL_NAME, max_length=config.RERANK_MAX_LENGTH).predict(pairs)
+    candidate_scores = FastEmbedCrossEncoder(
+        config.RERANK_ONNX_MODEL_NAME, max_length=config.RERANK_MAX_LENGTH
+    ).predict(pairs)
+    tau = _kendall_tau(reference_scores, candidate_scores)
+    same_top = list(np.argsort(-reference_scores)[:top_k]) == list(np.argsort(-candidate_scores)[:top_k])
+    print(f"Rerank kendall tau: {tau:.3f} (>= {rerank_min_tau}), same top-{top_k}: {same_top}")
+    ok &= tau >= rerank_min_tau and same_top
+
+    print("PARITY OK" if ok else "PARITY FAILED")
+    return ok
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Check ONNX backends against the PyTorch models.")
+    parser.add_argument("--dense-min-cosine", type=float, default=0.98)
+    parser.add_argument("--rerank-min-tau", type=float, default=0.8)
+    args = parser.parse_args()
+    sys.exit(0 if check_parity(args.dense_min_cosine, args.rerank_min_tau) else 1)
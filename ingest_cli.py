@@ -0,0 +1,160 @@
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import argparse
+from typing import List, Dict, Tuple
+
+import config
+from ingestion_pipeline import run_ingestion, file_sha256
+
+
+def _input_root(item: str) -> str:
+    """The directory an input is rooted at: the directory itself, or the non-wildcard prefix of a glob."""
+    if os.path.isdir(item):
+        return item
+    parts = []
+    for part in os.path.dirname(item).split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or "."
+
+
+def collect_pdf_paths(inputs: List[str]) -> List[Tuple[str, str]]:
+    """
+    Expands directories (recursively) and glob patterns into a sorted list
+    of (absolute path, source name) pairs. The source name is the path
+    relative to its input root, so same-named files in different folders
+    stay distinct.
+    """
+    names = {}
+    for item in inputs:
+        if os.path.isdir(item):
+            found = glob.glob(os.path.join(item, "**", "*.pdf"), recursive=True)
+            found += glob.glob(os.path.join(item, "**", "*.PDF"), recursive=True)
+        else:
+            found = [p for p in glob.glob(item, recursive=True) if p.lower().endswith(".pdf")]
+        root = os.path.abspath(_input_root(item))
+        for p in found:
+            path = os.path.abspath(p)
+            names.setdefault(path, os.path.relpath(path, root).replace(os.sep, "/"))
+    return sorted(names.items())
+
+
+def load_checkpoint(path: str) -> Dict:
+    """
+    Checkpoint format: {"completed": {source_name: file_hash},
+    "in_progress": {source_name: committed page batches}}.
+    """
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {"completed": {}, "in_progress": {}}
+
+
+def save_checkpoint(path: str, checkpoint: Dict):
+    """Writes the checkpoint atomically so an interrupted run never leaves it half-written."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory or glob of PDFs into Qdrant.")
+    parser.add_argument("inputs", nargs="+", help="Directories and/or glob patterns of PDF files")
+    parser.add_argument("--collection", default=config.COLLECTION_NAME, help="Target Qdrant collection")
+    parser.add_argument("--tenant", default=None, help="Tenant id (required for organization collections)")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: one per collection and tenant in DATA_DIR)")
+    parser.add_argument("--files-per-run", type=int, default=16, help="Files per pipeline run between checkpoints")
+    parser.add_argument("--parse-workers", type=int, default=None, help="Override PARSE_WORKERS")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    args = parser.parse_args(argv)
+
+    checkpoint_name = f"{args.collection}_{args.tenant}" if args.tenant else args.collection
+    checkpoint_path = args.checkpoint or os.path.join(config.DATA_DIR, f"ingest_checkpoint_{checkpoint_name}.json")
+    checkpoint = {"completed": {}, "in_progress": {}} if args.restart else load_checkpoint(checkpoint_path)
+
+    pdf_paths = collect_pdf_paths(args.inputs)
+    if not pdf_paths:
+        logging.error("No PDF files found.")
+        return 1
+    paths_by_source = {}
+    for path, name in pdf_paths:
+        paths_by_source.setdefault(name, []).append(path)
+    clashes = {name: paths for name, paths in paths_by_source.items() if len(paths) > 1}
+    if clashes:
+        for name, paths in clashes.items():
+            logging.error(f"Several inputs map to the source name '{name}': {', '.join(paths)}")
+        return 1
+
+    # Files finished by an earlier run (same name and content) are skipped locally
+    todo = []
+    for path, name in pdf_paths:
+        if checkpoint["completed"].get(name) == file_sha256(path):
+            continue
+        todo.append((path, name))
+    logging.info(f"{len(pdf_paths)} PDF(s) found, {len(pdf_paths) - len(todo)} already done, {len(todo)} to ingest.")
+
+    totals = {"files": 0, "skipped": 0, "chunks": 0, "embedded": 0, "reused": 0, "deleted": 0, "duplicates": 0, "errors": {}}
+    stage_seconds = {}
+    started = time.perf_counter()
+
+    for start in range(0, len(todo), args.files_per_run):
+        group = todo[start:start + args.files_per_run]
+        paths_by_name = {name: path for path, name in group}
+        names = list(paths_by_name)
+
+        def _on_progress(event: Dict):
+            name = event["source_file"]
+            if event["type"] == "batch":
+                checkpoint["in_progress"][name] = event["batch"] + 1
+                save_checkpoint(checkpoint_path, checkpoint)
+            elif event["type"] in ("file_done", "file_skipped"):
+                checkpoint["in_progress"].pop(name, None)
+                checkpoint["completed"][name] = file_sha256(paths_by_name[name])
+                save_checkpoint(checkpoint_path, checkpoint)
+                logging.info(f"Done: {name}")
+            elif event["type"] == "file_error":
+                logging.error(f"Failed: {name}: {event['error']}")
+
+        summary = run_ingestion(
+            list(paths_by_name.values()),
+            args.collection,
+            source_names=names,
+            progress_callback=_on_progress,
+            resume_batches={n: checkpoint["in_progress"][n] for n in names if n in checkpoint["in_progress"]},
+            parse_workers=args.parse_workers,
+            tenant_id=args.tenant,
+        )
+        for key in ("files", "skipped", "chunks", "embedded", "reused", "deleted", "duplicates"):
+            totals[key] += summary[key]
+        totals["errors"].update(summary["errors"])
+        for stage, seconds in summary["stage_seconds"].items():
+            stage_seconds[stage] = stage_seconds.get(stage, 0.0) + seconds
+
+    elapsed = time.perf_counter() - started
+    cache_stats = config.get_embedding_cache_stats()
+    print("\n---------------- INGESTION SUMMARY ----------------")
+    print(f"Collection:      {args.collection}")
+    print(f"Files:           {totals['files']} ({totals['skipped']} unchanged, {len(totals['errors'])} failed)")
+    print(f"Chunks:          {totals['chunks']} ({totals['embedded']} embedded, {totals['reused']} reused, {totals['deleted']} stale removed, {totals['duplicates']} near-duplicates dropped)")
+    print(f"Wall time:       {elapsed:.1f}s")
+    if elapsed > 0:
+        print(f"Throughput:      {totals['files'] / elapsed:.2f} files/s, {totals['chunks'] / elapsed:.1f} chunks/s")
+    print(f"Embedding cache: {cache_stats['hit_rate']:.0%} hit rate")
+    print("Time per stage (stages overlap):")
+    for stage, seconds in stage_seconds.items():
+        print(f"  {stage:<12} {seconds:8.1f}s")
+    for name, error in totals["errors"].items():
+        print(f"FAILED {name}: {error}")
+
+    return 1 if totals["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
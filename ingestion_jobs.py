@@ -0,0 +1,283 @@
+import os
+import time
+import uuid
+import atexit
+import sqlite3
+import logging
+import threading
+import argparse
+import multiprocessing
+from typing import List, Dict, Optional
+
+import config
+
+# Worker processes started by this (Streamlit) process; several sessions
+# call ensure_workers concurrently
+_WORKERS: List[multiprocessing.Process] = []
+_WORKERS_LOCK = threading.Lock()
+_STOP_WORKERS = None  # multiprocessing.Event shared with the workers, created with the first one
+
+
+def _connect() -> sqlite3.Connection:
+    """Opens the job queue database (created on first use)."""
+    os.makedirs(os.path.dirname(config.JOBS_DB) or ".", exist_ok=True)
+    conn = sqlite3.connect(config.JOBS_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            collection TEXT NOT NULL,
+            tenant_id TEXT,
+            path TEXT NOT NULL,
+            source_name TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',  -- queued | running | done | failed
+            worker TEXT,
+            batches_total INTEGER NOT NULL DEFAULT 0,
+            batches_done INTEGER NOT NULL DEFAULT 0,  -- last committed page batch + 1
+            chunks_done INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            heartbeat_at REAL,
+            finished_at REAL
+        )
+        """
+    )
+    # Queues created before multi-tenancy lack the tenant column
+    if "tenant_id" not in {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}:
+        conn.execute("ALTER TABLE jobs ADD COLUMN tenant_id TEXT")
+    return conn
+
+
+def submit_job(file_bytes: bytes, source_name: str, collection_name: str, tenant_id: str = None) -> int:
+    """
+    Spools an uploaded PDF to disk and queues it for ingestion (into the
+    tenant's partition for organization collections).
+    Returns the job id.
+    """
+    os.makedirs(config.JOBS_SPOOL_DIR, exist_ok=True)
+    path = os.path.join(config.JOBS_SPOOL_DIR, f"{uuid.uuid4().hex}.pdf")
+    with open(path, "wb") as f:
+        f.write(file_bytes)
+
+    conn = _connect()
+    try:
+        cursor = conn.execute(
+            "INSERT INTO jobs (collection, tenant_id, path, source_name, created_at) VALUES (?, ?, ?, ?, ?)",
+            (collection_name, tenant_id, path, source_name, time.time()),
+        )
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def list_jobs(limit: int = 50) -> List[Dict]:
+    """Most recent jobs with progress, throughput and errors."""
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    finally:
+        conn.close()
+
+    jobs = []
+    now = time.time()
+    for row in rows:
+        job = dict(row)
+        elapsed = ((job["finished_at"] or now) - job["started_at"]) if job["started_at"] else 0.0
+        job["progress"] = (job["batches_done"] / job["batches_total"]) if job["batches_total"] else 0.0
+        job["chunks_per_sec"] = (job["chunks_done"] / elapsed) if elapsed > 0 else 0.0
+        jobs.append(job)
+    return jobs
+
+
+def _claim_next_job(worker_name: str) -> Optional[Dict]:
+    """
+    Atomically claims the oldest queued job, or a running job whose worker
+    stopped sending heartbeats (crashed), which is then resumed. Jobs of a
+    file (collection, tenant and source name) that another worker is
+    running are left queued until it finishes, so the same file is never
+    ingested twice at once.
+    """
+    conn = _connect()
+    try:
+        now = time.time()
+        stale_before = now - config.JOB_STALE_AFTER_S
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT * FROM jobs AS j WHERE (j.status = 'queued' OR (j.status = 'running' AND j.heartbeat_at < ?)) "
+            "AND NOT EXISTS (SELECT 1 FROM jobs AS r WHERE r.status = 'running' AND r.heartbeat_at >= ? "
+            "AND r.id != j.id AND r.collection = j.collection AND r.source_name = j.source_name "
+            "AND COALESCE(r.tenant_id, '') = COALESCE(j.tenant_id, '')) "
+            "ORDER BY j.id LIMIT 1",
+            (stale_before, stale_before),
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', worker = ?, error = NULL, "
+            "started_at = COALESCE(started_at, ?), heartbeat_at = ? WHERE id = ?",
+            (worker_name, now, now, row["id"]),
+        )
+        conn.execute("COMMIT")
+        return dict(row)
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def _update_job(job_id: int, **fields):
+    fields["heartbeat_at"] = time.time()
+    conn = _connect()
+    try:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+    finally:
+        conn.close()
+
+
+def _heartbeat(job_id: int, stop: threading.Event):
+    """
+    Keeps a job's heartbeat fresh while its worker process is alive, however
+    long a single parse or page batch takes; only a dead worker's job goes stale.
+    """
+    while not stop.wait(config.JOB_STALE_AFTER_S / 3):
+        try:
+            _update_job(job_id)
+        except Exception as e:
+            logging.warning(f"Heartbeat of job {job_id} failed: {e}")
+
+
+def run_job(job: Dict, parse_workers: int = None):
+    """Runs one job, committing progress after every uploaded page batch."""
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job["id"], stop), daemon=True)
+    heartbeat.start()
+    try:
+        _run_job(job, parse_workers)
+    finally:
+        stop.set()
+        heartbeat.join()
+
+
+def _run_job(job: Dict, parse_workers: int = None):
+    # Imported here so the page can enqueue jobs without loading the models
+    from ingestion_pipeline import run_ingestion
+
+    resumed = job["batches_done"] > 0
+    if resumed:
+        logging.info(f"Resuming job {job['id']} ({job['source_name']}) from batch {job['batches_done']}")
+    chunks_done = job["chunks_done"]
+
+    def _on_progress(event: Dict):
+        nonlocal chunks_done
+        if event["type"] == "file_start":
+            _update_job(job["id"], batches_total=event["batches_total"])
+        elif event["type"] == "batch":
+            chunks_done += event["chunks"]
+            _update_job(job["id"], batches_done=event["batch"] + 1, chunks_done=chunks_done)
+        elif event["type"] == "file_error":
+            _update_job(job["id"], error=event["error"])
+
+    try:
+        summary = run_ingestion(
+            [job["path"]],
+            job["collection"],
+            source_names=[job["source_name"]],
+            progress_callback=_on_progress,
+            resume_batches={job["source_name"]: job["batches_done"]} if resumed else None,
+            parse_workers=parse_workers,
+            tenant_id=job.get("tenant_id"),
+        )
+    except Exception as e:
+        logging.error(f"Ingestion job {job['id']} failed: {e}")
+        _update_job(job["id"], status="failed", error=str(e), finished_at=time.time())
+        return
+
+    if summary["errors"]:
+        _update_job(job["id"], status="failed", error="; ".join(summary["errors"].values()), finished_at=time.time())
+        return
+
+    _update_job(job["id"], status="done", finished_at=time.time())
+    if os.path.exists(job["path"]):
+        os.remove(job["path"])
+
+
+def worker_main(worker_name: str, parse_workers: int = None, stop=None):
+    """Worker process loop: claims and runs jobs until `stop` (an Event) is set."""
+    logging.info(f"Ingestion worker {worker_name} started (pid {os.getpid()})")
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            job = _claim_next_job(worker_name)
+        except Exception as e:
+            logging.error(f"Worker {worker_name} could not claim a job: {e}")
+            job = None
+        if job is None:
+            stop.wait(config.JOB_POLL_INTERVAL_S)
+            continue
+        run_job(job, parse_workers=parse_workers)
+    logging.info(f"Ingestion worker {worker_name} stopped")
+
+
+def stop_workers(timeout_s: float = None):
+    """
+    Asks the workers to stop after their current job and waits up to
+    `timeout_s`. A worker still busy then is terminated. Its job keeps
+    status 'running' and is resumed by the next worker once its heartbeat
+    is stale. Runs at interpreter exit, so Streamlit shutting down
+    (Ctrl-C / SIGTERM) does not hang waiting for the worker loops.
+    """
+    timeout_s = config.JOB_SHUTDOWN_TIMEOUT_S if timeout_s is None else timeout_s
+    with _WORKERS_LOCK:
+        if _STOP_WORKERS is not None:
+            _STOP_WORKERS.set()
+        deadline = time.time() + timeout_s
+        for process in _WORKERS:
+            process.join(max(0.0, deadline - time.time()))
+        for process in _WORKERS:
+            if process.is_alive():
+                logging.warning(f"Terminating ingestion worker {process.name}; its job will be resumed")
+                process.terminate()
+                process.join()
+        _WORKERS.clear()
+
+
+def ensure_workers(count: int = None):
+    """
+    Starts worker processes from this process if they are not running.
+    Workers are not daemonic: they need their own parsing process pools.
+    They are stopped by stop_workers when this process exits.
+    """
+    global _STOP_WORKERS
+    count = count or config.INGEST_JOB_WORKERS
+    # Share the CPU between workers instead of each one using every core
+    parse_workers = max(1, config.PARSE_WORKERS // count)
+    ctx = multiprocessing.get_context("spawn")
+    with _WORKERS_LOCK:
+        if _STOP_WORKERS is None:
+            _STOP_WORKERS = ctx.Event()
+            atexit.register(stop_workers)
+        _WORKERS[:] = [p for p in _WORKERS if p.is_alive()]
+        while len(_WORKERS) < count:
+            name = f"worker-{os.getpid()}-{len(_WORKERS)}-{uuid.uuid4().hex[:6]}"
+            process = ctx.Process(target=worker_main, args=(name, parse_workers, _STOP_WORKERS), name=name)
+            process.start()
+            _WORKERS.append(process)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background ingestion workers in the foreground.")
+    parser.add_argument("--workers", type=int, default=config.INGEST_JOB_WORKERS)
+    args = parser.parse_args()
+
+    ensure_workers(args.workers)
+    try:
+        for process in list(_WORKERS):
+            process.join()
+    except KeyboardInterrupt:
+        stop_workers()
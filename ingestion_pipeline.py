@@ -128,11 +128,26 @@
 #         st.error(f"Error uploading points to Qdrant: {e}")
 
 import streamlit as st
+import hashlib
+import os
+import queue
+import threading
+import time
 import uuid
+import pymupdf
 import pymupdf4llm
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from langchain_text_splitters import RecursiveCharacterTextSplitter, MarkdownHeaderTextSplitter
 from qdrant_client import models
 import config
+import logging
+from id_allocator import next_id_from_qdrant
+from dedup import MinHashLSH, normalize_text
+from query_understanding import act_years, section_number
+from routing_index import rebuild_routing_entries
+import tenants
 import re
 
 def extract_filename_from_markdown(md_content: str, fallback_name: str) -> str:
@@ -151,12 +166,677 @@ def extract_filename_from_markdown(md_content: str, fallback_name: str) -> str:
     return fallback_name
 
 
-def ingest_documents_to_qdrant(pdf_files, user_role="user"):
-    # 1. Determine Collection Name based on Role
+def _resolve_pdf_source(pdffile_obj) -> tuple[str, str]:
+    """Returns (path, display_name) for a path string or an object with a `.name` path."""
+    if isinstance(pdffile_obj, (str, os.PathLike)):
+        path = os.fspath(pdffile_obj)
+        return path, os.path.basename(path) or "document.pdf"
+    path = getattr(pdffile_obj, "name", None) or "document.pdf"
+    return path, os.path.basename(path)
+
+
+def _page_ranges(pdf_path: str) -> list:
+    """
+    Splits a PDF into page ranges of PARSE_PAGES_PER_TASK pages.
+    Returns [None] (whole document) if the page count cannot be read.
+    """
+    try:
+        with pymupdf.open(pdf_path) as pdf:
+            page_count = pdf.page_count
+    except Exception as e:
+        logging.warning(f"Could not read page count of {pdf_path}: {e}")
+        return [None]
+
+    size = max(1, config.PARSE_PAGES_PER_TASK)
+    return [list(range(start, min(start + size, page_count))) for start in range(0, page_count, size)] or [None]
+
+
+def _parse_page_range(pdf_path: str, pages) -> list:
+    """
+    Process-pool worker: converts one page range of a PDF to markdown.
+    Returns [(page_number, markdown)] per page (1-based page numbers).
+    """
+    page_chunks = pymupdf4llm.to_markdown(pdf_path, pages=pages, page_chunks=True)
+    return [(chunk["metadata"].get("page"), chunk["text"]) for chunk in page_chunks]
+
+
+def iter_parsed_batches(executor, pdf_paths: list):
+    """
+    Parsing stage. Fans page ranges of every file out to the process pool and
+    yields (file_idx, markdown_or_exception, batch_no, batches_total) in
+    document order.
+    At most PARSE_MAX_IN_FLIGHT ranges are queued at once, so memory stays
+    bounded no matter how large the documents are.
+    """
+    def _tasks():
+        for file_idx, path in enumerate(pdf_paths):
+            ranges = _page_ranges(path)
+            for batch_no, pages in enumerate(ranges):
+                yield file_idx, path, pages, batch_no, len(ranges)
+
+    in_flight = deque()
+
+    def _pop():
+        file_idx, future, batch_no, batches_total = in_flight.popleft()
+        try:
+            return file_idx, future.result(), batch_no, batches_total
+        except Exception as e:
+            return file_idx, e, batch_no, batches_total
+
+    for file_idx, path, pages, batch_no, batches_total in _tasks():
+        in_flight.append((file_idx, executor.submit(_parse_page_range, path, pages), batch_no, batches_total))
+        if len(in_flight) >= config.PARSE_MAX_IN_FLIGHT:
+            yield _pop()
+    while in_flight:
+        yield _pop()
+
+
+def split_markdown_batch(md_content, carry: dict):
+    """
+    Splitting stage for one page batch. Header metadata is carried across
+    pages and batches so chunks keep their act/section when the header sits
+    earlier in the document. `md_content` is either markdown or the
+    [(page_number, markdown)] list from _parse_page_range; pages are split
+    separately so every chunk keeps its real page number.
+    Returns (chunks, carry for the next batch).
+    """
+    md_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=[("#", "legal_act_name"), ("##", "section_name")])
+    pages = [(None, md_content)] if isinstance(md_content, str) else md_content
+
+    md_header_splits = []
+    for page_number, page_md in pages:
+        for split in md_splitter.split_text(page_md):
+            if "legal_act_name" not in split.metadata and carry:
+                inherited = dict(carry) if "section_name" not in split.metadata else {
+                    k: v for k, v in carry.items() if k == "legal_act_name"
+                }
+                split.metadata = {**inherited, **split.metadata}
+            carry = {k: v for k, v in split.metadata.items() if k in ("legal_act_name", "section_name")}
+            if page_number is not None:
+                split.metadata["page_number"] = int(page_number)
+            md_header_splits.append(split)
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=600, chunk_overlap=60)
+    return text_splitter.split_documents(md_header_splits), carry
+
+
+# Namespace for deterministic point IDs (uuid5 of source file + chunk hash)
+POINT_ID_NAMESPACE = uuid.UUID("6f1c2d8e-4b7a-5c3e-9f10-2a6b8d4e7c51")
+
+
+def file_sha256(path: str) -> str:
+    """Fingerprints a file by streaming its bytes through SHA-256."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_sha256(doc) -> str:
+    """Fingerprints a chunk by its text and the header metadata stored with it."""
+    key = f"{doc.metadata.get('legal_act_name', '')}\x1f{doc.page_content}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def chunk_point_id(source_file: str, chunk_hash: str, occurrence: int = 0, tenant_id: str = None) -> str:
+    """
+    Deterministic point ID derived from the chunk's content hash, so re-running
+    ingestion overwrites points instead of duplicating them. `occurrence`
+    separates identical chunks repeated within the same file; `tenant_id`
+    keeps two tenants' copies of the same file apart.
+    """
+    key = f"{source_file}:{chunk_hash}:{occurrence}"
+    if tenant_id:
+        key = f"{tenant_id}:{key}"
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, key))
+
+
+def load_source_points(client, collection_name: str, source_file: str, tenant_id: str = None) -> dict:
+    """Returns {point_id: payload} (hash fields only) for every stored point of `source_file` (of the tenant)."""
+    source_filter = tenants.scope_filter(collection_name, tenant_id, models.Filter(
+        must=[models.FieldCondition(key="source_file", match=models.MatchValue(value=source_file))]
+    ))
+    existing = {}
+    next_offset = None
+    while True:
+        records, next_offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=source_filter,
+            limit=1000,
+            offset=next_offset,
+            with_payload=["file_hash", "chunk_hash", "file_complete", "global_chunk_id"],
+            with_vectors=False,
+        )
+        for record in records:
+            existing[str(record.id)] = record.payload or {}
+        if next_offset is None:
+            return existing
+
+
+def fetch_stored_vectors(client, collection_name: str, point_ids: list) -> dict:
+    """Returns {point_id: vector} for points whose vectors can be reused as-is."""
+    vectors = {}
+    for batch in _batched(point_ids, config.UPSERT_BATCH_SIZE):
+        for record in client.retrieve(collection_name, ids=batch, with_payload=False, with_vectors=True):
+            vectors[str(record.id)] = record.vector
+    return vectors
+
+
+def _batched(items: list, size: int):
+    """Yields successive slices of `items` with at most `size` elements."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def embed_chunk_batch(chunks: list, dense_model, sparse_model):
+    """
+    Embeds a batch of chunks with one dense and one sparse model call.
+    Returns (dense_vectors, sparse_vectors) aligned with `chunks`.
+    """
+    texts = [doc.page_content for doc in chunks]
+    dense_vectors = dense_model.embed_documents(texts)
+    sparse_vectors = [
+        models.SparseVector(indices=emb.indices.tolist(), values=emb.values.tolist())
+        for emb in sparse_model.embed(texts, batch_size=config.EMBED_BATCH_SIZE)
+    ]
+    return dense_vectors, sparse_vectors
+
+
+def upload_point_batch(client, collection_name: str, points: list):
+    """
+    Writes one batch of points in the upload thread. `parallel=1`: the batch
+    is already UPSERT_BATCH_SIZE points, and a parallel upload would start a
+    fresh worker-process pool for every call. `wait=True` so the batch is
+    committed before its commit marker is reported.
+    """
+    client.upload_points(
+        collection_name=collection_name,
+        points=points,
+        batch_size=config.UPSERT_BATCH_SIZE,
+        parallel=1,
+        wait=True,
+    )
+
+
+@dataclass
+class _FileState:
+    """Per-file bookkeeping while its batches stream through the pipeline."""
+    source_file: str
+    file_hash: str
+    existing: dict
+    global_chunk_id: int
+    tenant_id: str | None = None
+    resume_from: int = 0  # Page batches already committed by an earlier run
+    carry: dict = field(default_factory=dict)
+    occurrences: dict = field(default_factory=dict)
+    seen_ids: set = field(default_factory=set)
+    chunks: int = 0
+    kept: int = 0  # Chunks left after near-duplicate suppression (next file_chunk_id)
+    embedded: int = 0
+    reused: int = 0
+    deleted: int = 0
+    duplicates: int = 0
+    # Near-duplicate index of this file only: a dropped chunk's survivor is
+    # always a point of the same file, so stale deletion of another file can
+    # never take it away
+    dedup_index: MinHashLSH | None = None
+    error: Exception | None = None
+
+
+_STOP = object()
+
+
+def _upload_stage(client, collection_name: str, upload_queue: queue.Queue, events: queue.SimpleQueue, stage_seconds: dict):
+    """
+    Upload stage (runs in its own thread). Consumes point batches, batch
+    commit markers and end-of-file markers from a bounded queue, so network
+    upload overlaps with parsing and embedding. Stale points of a file are
+    deleted only after all its new points are written. Progress events go to
+    `events` and are reported from the calling thread.
+    """
+    while True:
+        item = upload_queue.get()
+        if item is _STOP:
+            return
+        state, kind, data = item
+        if state.error is not None:
+            continue
+        start = time.perf_counter()
+        try:
+            if kind == "points":
+                upload_point_batch(client, collection_name, data)
+            elif kind == "commit":
+                # Every point of this page batch is written
+                events.put({"type": "batch", "source_file": state.source_file, **data})
+            else:
+                # End-of-file marker: drop points that no longer exist in this version
+                stale_ids = list(state.existing.keys() - state.seen_ids)
+                if stale_ids:
+                    client.delete(
+                        collection_name=collection_name,
+                        points_selector=models.PointIdsList(points=stale_ids),
+                        wait=True,
+                    )
+                state.deleted = len(stale_ids)
+                _mark_file_complete(client, collection_name, state)
+                events.put({"type": "file_done", "source_file": state.source_file})
+        except Exception as e:
+            state.error = e
+            events.put({"type": "file_error", "source_file": state.source_file, "error": str(e)})
+        stage_seconds["upload"] += time.perf_counter() - start
+
+
+def _mark_file_complete(client, collection_name: str, state: "_FileState"):
+    """Completion marker: only files whose points all carry it can be skipped as unchanged."""
+    client.set_payload(
+        collection_name=collection_name,
+        payload={"file_complete": True},
+        points=tenants.scope_filter(collection_name, state.tenant_id, models.Filter(must=[
+            models.FieldCondition(key="source_file", match=models.MatchValue(value=state.source_file)),
+            models.FieldCondition(key="file_hash", match=models.MatchValue(value=state.file_hash)),
+        ])),
+        wait=True,
+    )
+
+
+def _page_number(doc) -> int:
+    """1-based page of a chunk, 0 when the splitter did not keep page metadata."""
+    if doc.metadata.get("page_number") is not None:
+        return int(doc.metadata["page_number"])
+    original_page = doc.metadata.get("page")
+    if original_page is not None:
+        return int(original_page) + 1
+    return 0
+
+
+def _assign_point_ids(state: _FileState, chunks: list, provenance: dict = None) -> list:
+    """
+    Returns (point_id, chunk_hash, doc) per chunk and records the IDs as seen.
+
+    With the file's `dedup_index`, repeats of an already kept chunk of the
+    same file (preambles, headers/footers) are dropped before embedding;
+    their page is added to the survivor's entry in `provenance`. MinHash only
+    proposes the candidate: a chunk is dropped when its normalized text is
+    identical, so clauses differing in a single word ("three years" vs
+    "five years") are both kept.
+    """
+    assigned = []
+    for doc in chunks:
+        chunk_hash = chunk_sha256(doc)
+        occurrence = state.occurrences.get(chunk_hash, 0)
+        state.occurrences[chunk_hash] = occurrence + 1
+        point_id = chunk_point_id(state.source_file, chunk_hash, occurrence, state.tenant_id)
+
+        if state.dedup_index is not None:
+            signature = state.dedup_index.signature(doc.page_content)
+            text_hash = hashlib.sha256(normalize_text(doc.page_content).encode("utf-8")).digest()
+            survivor_id = state.dedup_index.query(signature)
+            if survivor_id is not None and provenance[survivor_id]["text_hash"] == text_hash:
+                entry = provenance[survivor_id]
+                entry["pages"].add(_page_number(doc))
+                entry["duplicate_count"] += 1
+                state.duplicates += 1
+                continue
+            state.dedup_index.insert(point_id, signature)
+            provenance[point_id] = {
+                "state": state, "pages": {_page_number(doc)}, "duplicate_count": 0, "text_hash": text_hash,
+            }
+
+        # Position among the file's kept chunks: contiguous even when
+        # duplicates were dropped; re-split (resumed) batches get the same numbers
+        doc.metadata["file_chunk_id"] = state.kept
+        state.kept += 1
+        state.seen_ids.add(point_id)
+        assigned.append((point_id, chunk_hash, doc))
+    return assigned
+
+
+def _write_provenance(client, collection_name: str, provenance: dict):
+    """Stores the pages of dropped near-duplicates on their surviving points."""
+    operations = [
+        models.SetPayloadOperation(
+            set_payload=models.SetPayload(
+                payload={
+                    "pages": sorted(entry["pages"]),
+                    "duplicate_count": entry["duplicate_count"],
+                },
+                points=[point_id],
+            )
+        )
+        for point_id, entry in provenance.items()
+        if entry["duplicate_count"] and entry["state"].error is None
+    ]
+    for batch in _batched(operations, config.UPSERT_BATCH_SIZE):
+        client.batch_update_points(collection_name=collection_name, update_operations=batch, wait=True)
+
+
+def _build_points(client, collection_name: str, state: _FileState, assigned: list, first_chunk_seq: int, dense_model, sparse_model):
+    """
+    Embedding stage for one page batch. Builds sequence payloads (collection
+    sequence from the reserved range starting at `first_chunk_seq`), reuses
+    stored vectors for unchanged chunks and embeds the rest.
+    """
+    to_embed, to_reuse = [], []
+    for chunk_seq, (point_id, chunk_hash, doc) in enumerate(assigned, start=first_chunk_seq):
+        payload = {
+            "global_chunk_id": state.global_chunk_id, # Document Index (Per PDF)
+            # Position among the file's kept chunks: contiguous (dropped
+            # duplicates leave no gap), so adjacent chunks are found by +/-1
+            # (context merging, neighbor expansion)
+            "file_chunk_id": doc.metadata["file_chunk_id"],
+            "chunk_seq": chunk_seq,   # Collection-wide sequence (unique, may have gaps within a file)
+            "chunk": doc.page_content,
+            "page_number": _page_number(doc),
+            "source_file": state.source_file,
+            "legal_act_name": doc.metadata.get("legal_act_name", "General Document"),
+            "section_name": doc.metadata.get("section_name"),
+            # Filter fields for query pushdown (see query_understanding.py)
+            "section_number": section_number(doc.metadata.get("section_name")),
+            "act_years": act_years(doc.metadata.get("legal_act_name")),
+            "file_hash": state.file_hash,
+            "chunk_hash": chunk_hash,
+            # Set to True once every batch of the file is written (see _mark_file_complete)
+            "file_complete": False,
+        }
+        if state.tenant_id:
+            payload[config.TENANT_FIELD] = state.tenant_id
+        # Unchanged chunks keep their stored vectors; only changed ones are embedded
+        (to_reuse if point_id in state.existing else to_embed).append((point_id, doc, payload))
+
+    points = []
+    for batch in _batched(to_embed, config.EMBED_BATCH_SIZE):
+        dense_vectors, sparse_vectors = embed_chunk_batch([doc for _, doc, _ in batch], dense_model, sparse_model)
+        for (point_id, _, payload), dense_vector, sparse_vector in zip(batch, dense_vectors, sparse_vectors):
+            points.append(
+                models.PointStruct(
+                    id=point_id,
+                    vector={
+                        config.DENSE_VECTOR_NAME: dense_vector,
+                        config.SPARSE_VECTOR_NAME: sparse_vector
+                    },
+                    payload=payload
+                )
+            )
+
+    if to_reuse:
+        stored_vectors = fetch_stored_vectors(client, collection_name, [point_id for point_id, _, _ in to_reuse])
+        for point_id, _, payload in to_reuse:
+            points.append(models.PointStruct(id=point_id, vector=stored_vectors[point_id], payload=payload))
+
+    state.embedded += len(to_embed)
+    state.reused += len(to_reuse)
+    return points
+
+
+def collection_for_role(user_role: str) -> str:
+    """Admins ingest into the organization collection, everyone else into the legal one."""
     if user_role == "admin":
-        target_collection = config.ORGANIZATION_COLLECTION_NAME
-    else:
-        target_collection = config.COLLECTION_NAME
+        return config.ORGANIZATION_COLLECTION_NAME
+    return config.COLLECTION_NAME
+
+
+def ensure_collection(client, collection_name: str):
+    """Creates the hybrid collection and its payload indexes if missing."""
+    if not client.collection_exists(collection_name=collection_name):
+        # Quantization, on-disk storage, HNSW and sparse IDF come from the collection profile
+        client.create_collection(collection_name=collection_name, **config.build_collection_params(collection_name))
+        client.create_payload_index(collection_name, "file_chunk_id", models.PayloadSchemaType.INTEGER)
+        client.create_payload_index(collection_name, "global_chunk_id", models.PayloadSchemaType.INTEGER)
+        # A new collection starts its ID sequences from scratch; answers
+        # cached for an earlier collection of that name are invalid
+        config.get_id_allocator().reset(collection_name)
+        config.bump_collection_generation(collection_name)
+
+    # Keyword indexes backing skip/replace of re-uploaded files (no-op if present)
+    for field_name in ("source_file", "file_hash", "chunk_hash"):
+        client.create_payload_index(collection_name, field_name, models.PayloadSchemaType.KEYWORD)
+    # Indexes for filters pushed down from the question (acts, sections, years, pages)
+    for field_name in ("legal_act_name", "section_number"):
+        client.create_payload_index(collection_name, field_name, models.PayloadSchemaType.KEYWORD)
+    for field_name in ("act_years", "page_number", "chunk_seq"):
+        client.create_payload_index(collection_name, field_name, models.PayloadSchemaType.INTEGER)
+    if tenants.requires_tenant(collection_name):
+        tenants.ensure_tenant_index(client, collection_name)
+
+
+def run_ingestion(
+    pdf_files,
+    target_collection: str,
+    source_names: list = None,
+    progress_callback=None,
+    resume_batches: dict = None,
+    skip_unchanged: bool = True,
+    parse_workers: int = None,
+    tenant_id: str = None,
+) -> dict:
+    """
+    Headless ingestion pipeline (no Streamlit calls).
+
+    Streams every file through parse (process pool) -> split/embed (calling
+    thread) -> upload (background thread). `progress_callback(event)` is
+    called from the calling thread with "file_start", "batch" (a page batch
+    is committed), "file_done" and "file_error" events. `resume_batches`
+    maps source_file -> page batches already committed by an interrupted
+    run; those batches are re-split (to keep header and ID state) but not
+    embedded or uploaded again (and are never skipped as unchanged).
+    `parse_workers` overrides PARSE_WORKERS for this run. On a
+    tenant-partitioned collection every point is tagged with `tenant_id`
+    (required), and a tenant moved to a dedicated collection is written there.
+
+    Returns a summary dict of counts, per-file errors and `stage_seconds`
+    (time spent fingerprinting, waiting on the parser pool, splitting,
+    embedding and uploading; stages overlap, so they do not add up to the
+    wall time).
+    """
+    if not isinstance(pdf_files, list):
+        pdf_files = [pdf_files]
+    resume_batches = resume_batches or {}
+    target_collection = tenants.resolve_collection(target_collection, tenant_id)
+    if not tenants.requires_tenant(target_collection):
+        tenant_id = None  # Shared corpora (e.g. the legal collection) are not partitioned
+    elif not tenant_id:
+        raise ValueError(f"Collection '{target_collection}' is partitioned by tenant; a tenant_id is required.")
+    summary = {
+        "collection": target_collection, "files": len(pdf_files), "skipped": 0, "ingested": 0,
+        "chunks": 0, "embedded": 0, "reused": 0, "deleted": 0, "duplicates": 0, "errors": {},
+        "last_global_id": None, "last_chunk_id": None,
+        "stage_seconds": {"fingerprint": 0.0, "parse_wait": 0.0, "split": 0.0, "embed": 0.0, "upload": 0.0},
+    }
+    stage_seconds = summary["stage_seconds"]
+
+    def _emit(event: dict):
+        if event["type"] == "file_error":
+            summary["errors"][event["source_file"]] = event["error"]
+        if progress_callback:
+            progress_callback(event)
+
+    dense_model = config.get_dense_model()
+    sparse_model = config.get_sparse_model()
+    client = config.get_qdrant_client()
+    if not dense_model or not sparse_model or not client:
+        raise RuntimeError("Resources not loaded. Ingestion cannot proceed.")
+
+    ensure_collection(client, target_collection)
+
+    # IDs come from the atomic allocator: ranges are reserved per file
+    # (global_chunk_id) and per page batch (chunk_seq), seeded once from
+    # the collection's current maximum via an order_by query.
+    allocator = config.get_id_allocator()
+
+    def _reserve(sequence: str, count: int) -> int:
+        return allocator.reserve(
+            target_collection, sequence, count,
+            seed=lambda: next_id_from_qdrant(client, target_collection, sequence),
+        )
+
+    sources = [_resolve_pdf_source(pdffile_obj) for pdffile_obj in pdf_files]
+    if source_names:
+        sources = [(path, name) for (path, _), name in zip(sources, source_names)]
+
+    # Fingerprint files and skip those whose stored points carry the same hash
+    pending = []  # (path, source_file, file_hash, existing points)
+    start = time.perf_counter()
+    for path, actual_filename in sources:
+        try:
+            file_hash = file_sha256(path)
+            existing = load_source_points(client, target_collection, actual_filename, tenant_id)
+        except Exception as e:
+            _emit({"type": "file_error", "source_file": actual_filename, "error": str(e)})
+            continue
+        # A partial earlier ingest of this version lacks the completion marker
+        # (points written before the marker existed count as complete)
+        unchanged = existing and all(
+            p.get("file_hash") == file_hash and p.get("file_complete", True) for p in existing.values()
+        )
+        # Points of a partially ingested file already carry its hash, so resumed files are never skipped
+        if skip_unchanged and unchanged and actual_filename not in resume_batches:
+            summary["skipped"] += 1
+            _emit({"type": "file_skipped", "source_file": actual_filename})
+            continue
+        pending.append((path, actual_filename, file_hash, existing))
+    stage_seconds["fingerprint"] += time.perf_counter() - start
+
+    if not pending:
+        return summary
+
+    # A resumed file keeps the document ID its committed batches already carry;
+    # every other file gets a new one
+    global_ids = {}
+    for _, name, file_hash, existing in pending:
+        if resume_batches.get(name):
+            stored = [
+                p["global_chunk_id"] for p in existing.values()
+                if p.get("file_hash") == file_hash and p.get("global_chunk_id") is not None
+            ]
+            if stored:
+                global_ids[name] = max(stored)
+    new_files = [name for _, name, _, _ in pending if name not in global_ids]
+    if new_files:
+        first_global_id = _reserve("global_chunk_id", len(new_files))
+        global_ids.update({name: first_global_id + n for n, name in enumerate(new_files)})
+
+    states = [
+        _FileState(
+            source_file=name, file_hash=file_hash, existing=existing,
+            global_chunk_id=global_ids[name], tenant_id=tenant_id, resume_from=resume_batches.get(name, 0),
+            dedup_index=MinHashLSH(
+                threshold=config.DEDUP_THRESHOLD, num_perm=config.DEDUP_NUM_PERM,
+                bands=config.DEDUP_BANDS, shingle_size=config.DEDUP_SHINGLE_SIZE,
+            ) if config.DEDUP_ENABLED else None,
+        )
+        for _, name, file_hash, existing in pending
+    ]
+    summary["last_global_id"] = max(global_ids.values())
+
+    # Page batches flow through bounded queues, so peak memory does not grow
+    # with document size.
+    provenance = {}
+
+    events = queue.SimpleQueue()
+    upload_queue = queue.Queue(maxsize=config.INGEST_QUEUE_SIZE)
+    uploader = threading.Thread(
+        target=_upload_stage, args=(client, target_collection, upload_queue, events, stage_seconds), daemon=True
+    )
+
+    def _drain_events():
+        while not events.empty():
+            _emit(events.get())
+
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, parse_workers or config.PARSE_WORKERS)) as executor:
+            # Parser processes are started before the upload thread exists
+            # (forking a process while other threads run can deadlock it)
+            executor.submit(int).result()
+            uploader.start()
+            parsed_batches = iter_parsed_batches(executor, [path for path, _, _, _ in pending])
+            while True:
+                start = time.perf_counter()
+                parsed = next(parsed_batches, None)
+                stage_seconds["parse_wait"] += time.perf_counter() - start
+                if parsed is None:
+                    break
+                file_idx, md_content, batch_no, batches_total = parsed
+                state = states[file_idx]
+                if batch_no == 0:
+                    _emit({"type": "file_start", "source_file": state.source_file, "batches_total": batches_total})
+                if state.error is None:
+                    try:
+                        if isinstance(md_content, Exception):
+                            raise md_content
+                        start = time.perf_counter()
+                        chunks, state.carry = split_markdown_batch(md_content, state.carry)
+                        assigned = _assign_point_ids(state, chunks, provenance)
+                        state.chunks += len(chunks)
+                        stage_seconds["split"] += time.perf_counter() - start
+                        if batch_no >= state.resume_from:
+                            start = time.perf_counter()
+                            first_chunk_seq = _reserve("chunk_seq", len(assigned))
+                            points = _build_points(
+                                client, target_collection, state, assigned, first_chunk_seq, dense_model, sparse_model
+                            )
+                            stage_seconds["embed"] += time.perf_counter() - start
+                            if assigned:
+                                summary["last_chunk_id"] = first_chunk_seq + len(assigned) - 1
+                            for batch in _batched(points, config.UPSERT_BATCH_SIZE):
+                                upload_queue.put((state, "points", batch))
+                            upload_queue.put((state, "commit", {
+                                "batch": batch_no, "batches_total": batches_total, "chunks": len(chunks),
+                            }))
+                    except Exception as e:
+                        state.error = e
+                        _emit({"type": "file_error", "source_file": state.source_file, "error": str(e)})
+
+                if batch_no == batches_total - 1:
+                    upload_queue.put((state, "finish", None))
+                _drain_events()
+    finally:
+        if uploader.is_alive():
+            upload_queue.put(_STOP)
+            uploader.join()
+        _drain_events()
+
+    if provenance:
+        try:
+            _write_provenance(client, target_collection, provenance)
+        except Exception as e:
+            logging.error(f"Failed to write duplicate provenance to {target_collection}: {e}")
+
+    # Act/section summary vectors for query routing (legal corpora; tenant
+    # collections are already narrowed down by the tenant filter)
+    if config.ROUTING_ENABLED and not tenants.requires_tenant(target_collection):
+        start = time.perf_counter()
+        try:
+            summary["routing_points"] = rebuild_routing_entries(
+                client, target_collection, [state.source_file for state in states if state.error is None]
+            )
+        except Exception as e:
+            logging.error(f"Failed to update the routing index of {target_collection}: {e}")
+        stage_seconds["routing"] = time.perf_counter() - start
+
+    # The collection changed: answers cached for it are no longer valid
+    config.bump_collection_generation(target_collection)
+
+    for state in states:
+        if state.error is None:
+            summary["ingested"] += 1
+        summary["chunks"] += state.chunks
+        summary["embedded"] += state.embedded
+        summary["reused"] += state.reused
+        summary["deleted"] += state.deleted
+        summary["duplicates"] += state.duplicates
+    return summary
+
+
+def ingest_documents_to_qdrant(pdf_files, user_role="user", source_names=None, tenant_id=None):
+    """
+    Streamlit entry point: ingests PDFs incrementally into the role's
+    collection. `source_names` optionally gives the original filenames (e.g.
+    for uploaded temp files); they key skip/replace of files that were
+    ingested before. `tenant_id` scopes uploads to organization collections.
+    """
+    # 1. Determine Collection Name based on Role
+    target_collection = collection_for_role(user_role)
 
     # 2. Setup Resources
     if not pdf_files:
@@ -165,91 +845,33 @@ def ingest_documents_to_qdrant(pdf_files, user_role="user"):
     if not isinstance(pdf_files, list):
         pdf_files = [pdf_files]
 
-    dense_model = config.get_dense_model()  
-    sparse_model = config.get_sparse_model()
-    client = config.get_qdrant_client() 
+    load_progress = st.progress(0)
+    files_done = 0
 
-    # 2. Initialization using your "Scroll" technique
-    offset = 0          # This will be your file_chunk_id (Continuous)
-    product_offset = 0  # This will be your global_chunk_id (Per PDF)
+    def _on_progress(event: dict):
+        nonlocal files_done
+        if event["type"] in ("file_done", "file_skipped"):
+            files_done += 1
+            load_progress.progress(min(1.0, files_done / len(pdf_files)))
 
     try:
-        if not client.collection_exists(collection_name=target_collection):
-            client.create_collection(
-                collection_name=target_collection,
-                vectors_config={config.DENSE_VECTOR_NAME: models.VectorParams(size=config.VECTOR_SIZE, distance=models.Distance.COSINE)},
-                sparse_vectors_config={config.SPARSE_VECTOR_NAME: models.SparseVectorParams(index=models.SparseIndexParams(on_disk=False))}
-            )
-            client.create_payload_index(target_collection, "file_chunk_id", models.PayloadSchemaType.INTEGER)
-            client.create_payload_index(target_collection, "global_chunk_id", models.PayloadSchemaType.INTEGER)
-            client.create_payload_index(target_collection, "page_number", models.PayloadSchemaType.INTEGER)
-        
-        info = client.get_collection(collection_name=target_collection)
-        if info.points_count != 0:
-            res, _ = client.scroll(
-                collection_name=target_collection,
-                limit=1,
-                with_payload=True,
-                # order_by={"key": "file_chunk_id", "direction": "desc"} # Following your snippet logic
-            )
-            if res:
-                product_offset = res[0].payload.get("global_chunk_id", 0) + 1
-                offset = res[0].payload.get("file_chunk_id", 0) + 1
+        summary = run_ingestion(
+            pdf_files, target_collection, source_names=source_names, progress_callback=_on_progress, tenant_id=tenant_id
+        )
     except Exception as e:
-        st.error(f"Error initializing offsets for {target_collection}: {e}")
+        st.error(f"Error initializing {target_collection}: {e}")
         return
 
-    load_progress = st.progress(0)
-    
-    for i, pdffile_obj in enumerate(pdf_files):
-        actual_filename =pdffile_obj.name if hasattr(pdffile_obj, 'name') else "document.pdf"
-        try:
-            md_content = pymupdf4llm.to_markdown(pdffile_obj)
-            # actual_filename = extract_filename_from_markdown(
-            # md_content=md_content,
-            # fallback_name=pdffile_obj.name
-            # )
-            md_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=[("#", "legal_act_name"), ("##", "section_name")])
-            md_header_splits = md_splitter.split_text(md_content)
-            
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=600, chunk_overlap=60)
-            chunks = text_splitter.split_documents(md_header_splits)
-
-            # Inner loop: Each chunk (idx)
-            for doc in chunks:
-                content = doc.page_content
-                original_page = doc.metadata.get("page")
-                if original_page is not None:
-                    page_num = int(original_page) + 1 
-                else:
-                    page_num = 0
-                
-                client.upsert(
-                    collection_name=target_collection,
-                    points=[
-                        models.PointStruct(
-                            id=str(uuid.uuid4()), 
-                            vector={
-                                config.DENSE_VECTOR_NAME: dense_model.embed_query(content),
-                                config.SPARSE_VECTOR_NAME: list(sparse_model.embed([content]))[0].as_object()
-                            },
-                            payload={
-                                "global_chunk_id": product_offset, # Document Index (Per PDF)
-                                "file_chunk_id": offset,          # Sequence Index (Continuous)
-                                "chunk": content,
-                                "page_number": page_num,
-                                "source_file": actual_filename,
-                                "legal_act_name": doc.metadata.get("legal_act_name", "General Document"),
-                            }
-                        )
-                    ]
-                )
-                offset += 1 
-            
-            product_offset += 1
-            load_progress.progress((i + 1) / len(pdf_files))
-
-        except Exception as e:
-            st.error(f"Error on {actual_filename}: {e}")
+    for source_file, error in summary["errors"].items():
+        st.error(f"Error on {source_file}: {error}")
+    if summary["skipped"]:
+        st.info(f"Skipped {summary['skipped']} unchanged file(s).")
 
-    st.success(f"Ingested into **{target_collection}**. Final Global ID: {product_offset}, Final Chunk ID: {offset}")
\ No newline at end of file
+    cache_stats = config.get_embedding_cache_stats()
+    st.success(
+        f"Ingested into **{target_collection}**. Embedded {summary['embedded']} new chunk(s), reused {summary['reused']}, "
+        f"removed {summary['deleted']} stale, dropped {summary['duplicates']} near-duplicate(s). Final Global ID: {summary['last_global_id']}, "
+        f"Final Chunk ID: {summary['last_chunk_id']}. "
+        f"Embedding cache hit rate: {cache_stats['hit_rate']:.0%}"
+    )
+    return summary
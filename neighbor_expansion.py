@@ -0,0 +1,109 @@
+import logging
+from typing import List, Dict, Optional
+
+from qdrant_client import models
+
+import config
+import tenants
+
+# Neighbors rank just below their winner (tie-breaker for packing order)
+NEIGHBOR_SCORE_STEP = 1e-3
+
+
+def _window_condition(doc: Dict, window: int) -> models.Filter:
+    """Chunks within `window` positions of `doc` in the same file (and section, when known)."""
+    must = [
+        models.FieldCondition(key="global_chunk_id", match=models.MatchValue(value=doc["global_chunk_id"])),
+        models.FieldCondition(
+            key="file_chunk_id",
+            range=models.Range(gte=doc["file_chunk_id"] - window, lte=doc["file_chunk_id"] + window),
+        ),
+    ]
+    if doc.get("section_name"):
+        must.append(models.FieldCondition(key="section_name", match=models.MatchValue(value=doc["section_name"])))
+    return models.Filter(must=must)
+
+
+def fetch_neighbors(client, collection_name: str, winners: List[Dict], window: int,
+                    tenant_id: Optional[str] = None) -> List[Dict]:
+    """
+    One filtered scroll returning the chunks around every winner of a
+    collection (tenant-scoped on tenant collections), as result dicts.
+    """
+    scroll_filter = tenants.scope_filter(
+        collection_name, tenant_id, models.Filter(should=[_window_condition(d, window) for d in winners])
+    )
+    records, _ = client.scroll(
+        collection_name=collection_name,
+        scroll_filter=scroll_filter,
+        limit=len(winners) * (2 * window + 1),
+        with_payload=[
+            "chunk", "legal_act_name", "page_number", "source_file", "global_chunk_id", "file_chunk_id", "section_name",
+        ],
+        with_vectors=False,
+    )
+    return [
+        {
+            "chunk": r.payload.get("chunk", ""),
+            "legal_act_name": r.payload.get("legal_act_name", "Nepal Act"),
+            "page_number": r.payload.get("page_number", "?"),
+            "source_file": r.payload.get("source_file"),
+            "global_chunk_id": r.payload.get("global_chunk_id"),
+            "file_chunk_id": r.payload.get("file_chunk_id"),
+            "section_name": r.payload.get("section_name"),
+            "id": r.id,
+            "collection": collection_name,
+        }
+        for r in records
+    ]
+
+
+def expand_neighbors(client, docs: List[Dict], window: int, tenant_id: Optional[str] = None) -> List[Dict]:
+    """
+    Small-to-big expansion of re-ranked docs: adds the chunks up to `window`
+    positions before and after each winner (same file and section), fetched
+    with one scroll per collection. Chunks already present are not repeated.
+    Each neighbor takes its winner's score and collection label and is
+    marked with `neighbor_of`, so the context packer merges it into the
+    winner's span. Winners come first, followed by their neighbors.
+    """
+    winners_by_collection: Dict[str, List[Dict]] = {}
+    for d in docs:
+        if d.get("global_chunk_id") is not None and d.get("file_chunk_id") is not None:
+            winners_by_collection.setdefault(d.get("collection") or config.COLLECTION_NAME, []).append(d)
+    if window <= 0 or not winners_by_collection:
+        return docs
+
+    seen = {(d.get("collection"), d.get("id")) for d in docs}
+    neighbors: List[Dict] = []
+    for collection_name, winners in winners_by_collection.items():
+        try:
+            fetched = fetch_neighbors(client, collection_name, winners, window, tenant_id)
+        except Exception as e:
+            logging.warning(f"Neighbor expansion failed on {collection_name}: {e}")
+            continue
+
+        for n in sorted(fetched, key=lambda x: x["file_chunk_id"]):
+            if (collection_name, n["id"]) in seen:
+                continue
+            # The best winner whose window contains this chunk
+            owners = [
+                w for w in winners
+                if w["global_chunk_id"] == n["global_chunk_id"]
+                and abs(w["file_chunk_id"] - n["file_chunk_id"]) <= window
+                and (not w.get("section_name") or w.get("section_name") == n["section_name"])
+            ]
+            if not owners:
+                continue
+            owner = max(owners, key=lambda w: float(w.get("score") or 0.0))
+            seen.add((collection_name, n["id"]))
+            distance = abs(owner["file_chunk_id"] - n["file_chunk_id"])
+            neighbor = {
+                **n,
+                "score": float(owner.get("score") or 0.0) - NEIGHBOR_SCORE_STEP * distance,
+                "neighbor_of": owner["id"],
+            }
+            if owner.get("collection_label"):
+                neighbor["collection_label"] = owner["collection_label"]
+            neighbors.append(neighbor)
+    return docs + neighbors
@@ -1,8 +1,8 @@
 import streamlit as st
-import tempfile
-import os
-from ingestion_pipeline import ingest_documents_to_qdrant
+from ingestion_jobs import submit_job, list_jobs, ensure_workers
+from ingestion_pipeline import collection_for_role
 from utils.ui_components import init_page
+import config
 
 user_info = init_page("Document Ingestion")
 
@@ -26,27 +26,39 @@ st.write("Upload PDF laws or company documents to add them to the AI knowledge b
 uploaded_files = st.file_uploader("Choose a PDF file", type=["pdf"],accept_multiple_files=True)
 if uploaded_files: 
     if st.button("Process Documents"):
-        with st.spinner("Ingesting documents..."):
-            # Pass the user role to the ingestion function
-            user_role = user_info.get("role", "user").lower()
-            
-            # Note: Your ingestion_pipeline expects a list of file objects or paths
-            # In your current script, you are looping and sending paths. 
-            # I will keep your loop logic but pass the role.
-            
-            for uploaded_file in uploaded_files:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                    tmp.write(uploaded_file.getvalue())
-                    tmp_path = tmp.name
-                
-                try:
-                    # Added user_role argument
-                    ingest_documents_to_qdrant(tmp_path, user_role=user_role)
-                finally:
-                    if os.path.exists(tmp_path):
-                        os.remove(tmp_path)
-            
-            st.success(f"Processed {len(uploaded_files)} files!")
+        # Pass the user role to pick the target collection
+        user_role = user_info.get("role", "user").lower()
+        target_collection = collection_for_role(user_role)
+        tenant_id = user_info.get("tenant_id", config.DEFAULT_TENANT_ID)
+
+        # Files are queued as background jobs so ingestion survives reruns
+        # and browser disconnects; worker processes pick them up concurrently.
+        for uploaded_file in uploaded_files:
+            submit_job(uploaded_file.getvalue(), uploaded_file.name, target_collection, tenant_id)
+        ensure_workers()
+        st.success(f"Queued {len(uploaded_files)} file(s) for ingestion.")
+
+
+@st.fragment(run_every=config.JOB_POLL_INTERVAL_S)
+def show_ingestion_jobs():
+    jobs = list_jobs()
+    if not jobs:
+        return
+    # Restart workers (e.g. after a server restart) so unfinished jobs resume
+    if any(job["status"] in ("queued", "running") for job in jobs):
+        ensure_workers()
+    st.subheader("Ingestion Jobs")
+    for job in jobs:
+        label = f"**{job['source_name']}** → `{job['collection']}` · {job['status']}"
+        if job["status"] == "running":
+            st.progress(job["progress"], text=f"{label} · {job['chunks_done']} chunks · {job['chunks_per_sec']:.1f} chunks/s")
+        else:
+            st.markdown(f"{label} · {job['chunks_done']} chunks")
+        if job["error"]:
+            st.error(job["error"])
+
+
+show_ingestion_jobs()
             
 # if uploaded_file:
     
@@ -1,9 +1,10 @@
 import streamlit as st
 from rag_graph import run_rag_with_graph
-from utils.ui_components import init_page
+from utils.ui_components import init_page, select_collections
 import config
 
 user_info = init_page("Legal Assistant")
+collections = select_collections(user_info, config.COLLECTION_NAME)
 
 # st.set_page_config(page_title="Legal Assistant", layout="wide")
 
@@ -38,18 +39,30 @@ if user_query := st.chat_input("Ask a legal question..."):
     with st.chat_message("assistant"):
         with st.spinner("Analyzing legal context..."):
             answer, docs, timings, refined_queries = run_rag_with_graph(
-                user_query, st.session_state.messages[:-1], collection_name=config.COLLECTION_NAME
+                user_query, st.session_state.messages[:-1], collection_name=collections,
+                stream=config.STREAM_ANSWERS, tenant_id=user_info.get("tenant_id", config.DEFAULT_TENANT_ID)
             )
+
+        # Sources and timings are shown as soon as retrieval is done
+        with st.expander("Search Transparency"):
+            st.write("**Refined Queries:**", refined_queries)
+            timings_placeholder = st.empty()
+            timings_placeholder.json(timings)
+            st.write("**Embedding Cache:**", config.get_embedding_cache_stats())
+
+        if docs:
+            with st.expander("Source Context"):
+                for d in docs:
+                    label = f"{d['collection_label']} · " if d.get("collection_label") else ""
+                    neighbor = " · adjacent chunk" if d.get("neighbor_of") is not None else ""
+                    st.markdown(f"**{label}Page {d['page_number']}**{neighbor} (Score: {d['score']:.2f})")
+                    st.caption(d["chunk"])
+
+        if isinstance(answer, str):
             st.markdown(answer)
-            
-            with st.expander("Search Transparency"):
-                st.write("**Refined Queries:**", refined_queries)
-                st.json(timings)
-            
-            if docs:
-                with st.expander("Source Context"):
-                    for d in docs:
-                        st.markdown(f"**Page {d['page_number']}** (Score: {d['score']:.2f})")
-                        st.caption(d["chunk"])
+        else:
+            answer = st.write_stream(answer)
+            # Time to first token / total time are known once the stream ends
+            timings_placeholder.json(timings)
 
     st.session_state.messages.append({"role": "assistant", "content": answer})
\ No newline at end of file
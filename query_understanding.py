@@ -0,0 +1,132 @@
+import re
+import logging
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Optional
+
+from qdrant_client import models
+
+_PAGE_PATTERN = re.compile(r"\bpages?\s+(\d+)(?:\s*(?:-|to|–)\s*(\d+))?", re.IGNORECASE)
+_SECTION_PATTERN = re.compile(r"\b(?:section|sec\.?|dafa|clause|article)\s+(\d+[A-Za-z]?)", re.IGNORECASE)
+_YEAR_PATTERN = re.compile(r"\b(19\d{2}|20\d{2})\b")
+MAX_PAGE_RANGE = 50  # Wider page ranges are ignored rather than expanded
+ACT_NAMES_TTL_S = 300  # Act name lists (and failed facet calls) are re-fetched after this long
+
+# (collection, generation, tenant) -> (fetched at, act names), refreshed after
+# re-ingestion or ACT_NAMES_TTL_S
+_ACT_NAMES: Dict[tuple, tuple] = {}
+_ACT_NAMES_LOCK = threading.Lock()
+
+
+@dataclass
+class QueryFilters:
+    """Structured constraints pulled from a question."""
+    act_names: List[str] = field(default_factory=list)
+    section_numbers: List[str] = field(default_factory=list)
+    years: List[int] = field(default_factory=list)
+    pages: List[int] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not (self.act_names or self.section_numbers or self.years or self.pages)
+
+    def describe(self) -> Dict:
+        return {k: v for k, v in asdict(self).items() if v}
+
+
+def act_years(act_name: str) -> List[int]:
+    """Years in an act's title, e.g. [2074, 2017] for "Muluki Civil Code, 2074 (2017)" (BS and AD)."""
+    return [int(y) for y in dict.fromkeys(_YEAR_PATTERN.findall(act_name or ""))]
+
+
+def section_number(section_name: str) -> Optional[str]:
+    """Leading section number of a section header, e.g. "5" for "5. Punishment for hacking"."""
+    match = re.match(r"\s*(?:section|sec\.?|dafa|clause|article)?\s*(\d+[A-Za-z]?)\b", section_name or "", re.IGNORECASE)
+    return match.group(1).upper() if match else None
+
+
+def _act_core(act_name: str) -> str:
+    """Lowercase act title without its year and punctuation."""
+    core = _YEAR_PATTERN.sub(" ", act_name.lower())
+    core = re.sub(r"\(.*?\)", " ", core)
+    return re.sub(r"[^\w]+", " ", core).strip()
+
+
+def known_act_names(client, collection_name: str, generation: int = 0, tenant_id: Optional[str] = None,
+                    facet_filter: Optional[models.Filter] = None) -> List[str]:
+    """
+    Distinct legal_act_name values of a collection (Qdrant facet on the
+    keyword index), cached per ingestion generation for ACT_NAMES_TTL_S.
+    A failed facet call is cached as [] for the same time, so an unreachable
+    or unindexed collection is not queried on every question. On
+    tenant-partitioned collections pass the tenant's `facet_filter`, so only
+    that tenant's acts are listed (and cached under `tenant_id`).
+    """
+    key = (collection_name, generation, tenant_id)
+    with _ACT_NAMES_LOCK:
+        cached = _ACT_NAMES.get(key)
+        if cached and time.time() - cached[0] < ACT_NAMES_TTL_S:
+            return cached[1]
+    try:
+        response = client.facet(
+            collection_name=collection_name, key="legal_act_name", facet_filter=facet_filter, limit=10_000, exact=False
+        )
+        names = [str(hit.value) for hit in response.hits]
+    except Exception as e:
+        logging.warning(f"Could not list act names of {collection_name}: {e}")
+        names = []
+    with _ACT_NAMES_LOCK:
+        _ACT_NAMES[key] = (time.time(), names)
+    return names
+
+
+def parse_query(query: str, act_names: List[str] = None) -> QueryFilters:
+    """
+    Extracts act names (only acts that exist in the collection), section
+    numbers, years and page references from a question.
+    """
+    filters = QueryFilters()
+
+    for match in _PAGE_PATTERN.finditer(query):
+        first = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) else first
+        if first <= last <= first + MAX_PAGE_RANGE:
+            filters.pages.extend(range(first, last + 1))
+
+    filters.section_numbers = list(dict.fromkeys(m.upper() for m in _SECTION_PATTERN.findall(query)))
+
+    normalized_query = f" {_act_core(query)} "
+    for name in act_names or []:
+        core = _act_core(name)
+        if core and f" {core} " in normalized_query:
+            filters.act_names.append(name)
+
+    # A year narrows acts only when it is not part of a page/section reference
+    stripped = _SECTION_PATTERN.sub(" ", _PAGE_PATTERN.sub(" ", query))
+    filters.years = list(dict.fromkeys(int(y) for y in _YEAR_PATTERN.findall(stripped)))
+    if filters.act_names and filters.years:
+        # Prefer the matching edition of the act; the year is then redundant
+        matching = [n for n in filters.act_names if set(act_years(n)) & set(filters.years)]
+        filters.act_names = matching or filters.act_names
+        filters.years = []
+    return filters
+
+
+def build_filter(filters: QueryFilters) -> Optional[models.Filter]:
+    """Payload filter over the indexed fields (None when nothing was extracted)."""
+    must = []
+    if filters.act_names:
+        must.append(models.FieldCondition(key="legal_act_name", match=models.MatchAny(any=filters.act_names)))
+    if filters.section_numbers:
+        must.append(models.FieldCondition(key="section_number", match=models.MatchAny(any=filters.section_numbers)))
+    if filters.years:
+        must.append(models.FieldCondition(key="act_years", match=models.MatchAny(any=filters.years)))
+    if filters.pages:
+        must.append(models.FieldCondition(key="page_number", match=models.MatchAny(any=filters.pages)))
+    return models.Filter(must=must) if must else None
+
+
+def merge_filters(*filters: Optional[models.Filter]) -> Optional[models.Filter]:
+    """Combines the `must` conditions of several filters (None entries are ignored)."""
+    must = [condition for f in filters if f is not None for condition in (f.must or [])]
+    return models.Filter(must=must) if must else None
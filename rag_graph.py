@@ -1,60 +1,133 @@
 import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from langgraph.graph import StateGraph, END
 from dataclasses import dataclass, field
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Union
 import rag_query
+import rag_query_async
+import config
+import tenants
+from semantic_cache import CachedAnswer
 
 @dataclass
 class RAGState:
     user_query: str
     refined_queries: List[str] = field(default_factory=list)
+    search_results: List[List[Dict[str, Any]]] = field(default_factory=list)
     retrieved_docs: List[Dict[str, Any]] | None = None
     answer: str | None = None
     chat_history: list | None = None
     timings: Dict[str, float] = field(default_factory=dict)
 
 
+# Shared pool: a refinement that misses its deadline finishes in the
+# background (and still lands in the refinement cache)
+_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag")
+
+
+def _timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return result, (time.time() - start) * 1000
+
+
 # -------------------- NODES --------------------
 
-def refine_query_node(state: dict) -> dict:
+def refine_and_retrieve_node(state: dict) -> dict:
     """
-    Generates N parallel queries for better coverage.
+    Speculative retrieval: the original question is searched while the LLM
+    generates refined variants, which are searched (in one batch) and merged
+    in once they arrive. With config.REFINE_DEADLINE_MS set, a slow
+    refinement is abandoned and only the original query's results are used.
+    A list in state["collection_name"] searches those collections in parallel.
     """
     start = time.time()
-    
-    # Returns a List[str] containing original + generated queries
-    refined_list = rag_query.generate_refined_query(state["user_query"])
-    state["refined_queries"] = refined_list
+    user_query = state["user_query"]
+    collection_name = state.get("collection_name")
+
+    # Resources are resolved here, on the calling (Streamlit) thread
+    resources = rag_query.load_search_resources()
+    if not resources:
+        state["answer"] = rag_query.SYSTEM_ERROR_MESSAGE
+        state["retrieved_docs"] = []
+        return state
+    refine_future = _EXECUTOR.submit(_timed, rag_query.generate_refined_query, user_query)
+
+    # Filter pushdown and, for large collections, routing to the best acts
+    tenant_id = state.get("tenant_id")
+    filters = rag_query.plan_collection_filters(
+        user_query, resources, collection_name, state["timings"], tenant_id, state.get("understood")
+    )
+    chunk_start = time.time()
+    original_future = _EXECUTOR.submit(
+        _timed, rag_query.retrieve_for_collections, [user_query], resources, filters, tenant_id
+    )
 
-    state["timings"]["refine_query_ms"] = (time.time() - start) * 1000
+    # 1. Wait for refinement (bounded by the deadline, if any)
+    deadline_ms = config.REFINE_DEADLINE_MS
+    try:
+        refined_list, refine_ms = refine_future.result(
+            timeout=None if deadline_ms is None else deadline_ms / 1000
+        )
+        state["timings"]["refine_deadline_hit"] = False
+    except FuturesTimeout:
+        logging.warning(f"Query refinement missed its {deadline_ms} ms deadline; using the original query only.")
+        refined_list, refine_ms = [user_query], (time.time() - start) * 1000
+        state["timings"]["refine_deadline_hit"] = True
+    state["timings"]["refine_query_ms"] = refine_ms
+
+    # 2. Search the refined variants (the original is already in flight)
+    variants = [q for q in refined_list if q != user_query]
+    variant_results = []
+    if variants:
+        variant_results, state["timings"]["retrieve_refined_ms"] = _timed(
+            rag_query.retrieve_for_collections, variants, resources, filters, tenant_id
+        )
+
+    original_results, state["timings"]["retrieve_original_ms"] = original_future.result()
+    # Chunk stage wall time (overlaps with refinement)
+    state["timings"]["chunk_search_ms"] = (time.time() - chunk_start) * 1000
+
+    state["refined_queries"] = [user_query] + variants
+    state["search_results"] = original_results + variant_results
+    state["timings"]["refine_and_retrieve_ms"] = (time.time() - start) * 1000
     return state
 
 
-def retrieve_docs_node(state: dict) -> dict:
+def generate_answer_node(state: dict) -> dict:
     """
-    Orchestrates Parallel Search -> RRF -> Re-ranking.
+    Orchestrates RRF -> Re-ranking -> Generation over the merged results.
     """
+    if state.get("answer") is not None:
+        return state
     start = time.time()
 
-    answer, docs = rag_query.query_qdrant_rag(
-        user_query=state["user_query"],
-        chat_history=state["chat_history"] or [],
-        refined_queries=state["refined_queries"],
-        collection_name=state.get("collection_name") 
-    )
+    if state.get("stream"):
+        # Generation happens lazily as the caller consumes the stream
+        docs, message = rag_query.select_context_docs(
+            state["user_query"], state.get("search_results") or [], state["timings"], state["refined_queries"],
+            state.get("tenant_id")
+        )
+        answer = message or rag_query.stream_answer(state["user_query"], docs, state["timings"])
+    else:
+        answer, docs = rag_query.rank_and_generate(
+            state["user_query"], state.get("search_results") or [], state["timings"], state["refined_queries"],
+            state.get("tenant_id")
+        )
 
     state["answer"] = answer
     state["retrieved_docs"] = docs
 
-    state["timings"]["retrieve_and_gen_ms"] = (time.time() - start) * 1000
+    state["timings"]["rerank_and_gen_ms"] = (time.time() - start) * 1000
     return state
 
 
 def final_answer_node(state: dict) -> dict:
     # Record total timing
     state["timings"]["total_ms"] = (
-        state["timings"].get("refine_query_ms", 0)
-        + state["timings"].get("retrieve_and_gen_ms", 0)
+        state["timings"].get("refine_and_retrieve_ms", 0)
+        + state["timings"].get("rerank_and_gen_ms", 0)
     )
     return state
 
@@ -64,13 +137,13 @@ def final_answer_node(state: dict) -> dict:
 def build_rag_graph():
     graph = StateGraph(dict) # Using dict as state container for flexibility
 
-    graph.add_node("refine_query", refine_query_node)
-    graph.add_node("retrieve_docs", retrieve_docs_node)
+    graph.add_node("refine_and_retrieve", refine_and_retrieve_node)
+    graph.add_node("generate_answer", generate_answer_node)
     graph.add_node("final_answer", final_answer_node)
 
-    graph.set_entry_point("refine_query")
-    graph.add_edge("refine_query", "retrieve_docs")
-    graph.add_edge("retrieve_docs", "final_answer")
+    graph.set_entry_point("refine_and_retrieve")
+    graph.add_edge("refine_and_retrieve", "generate_answer")
+    graph.add_edge("generate_answer", "final_answer")
     graph.add_edge("final_answer", END)
 
     return graph.compile()
@@ -81,19 +154,22 @@ rag_graph = build_rag_graph()
 
 # -------------------- EXECUTION WRAPPER --------------------
 
-def run_rag_with_graph(user_query: str, chat_history: list, collection_name: str = None):
-    """
-    Main entry point called by app.py.
-    """
+def _invoke_graph(user_query: str, chat_history: list, collection_name, stream: bool, tenant_id: str = None,
+                  understood: dict = None):
+    """Runs the LangGraph pipeline; returns (answer, docs, timings, refined_queries)."""
     # Initial state
     state = {
         "user_query": user_query,
         "refined_queries": [],
+        "search_results": [],
         "answer": None,
         "retrieved_docs": None,
         "chat_history": chat_history,
         "timings": {},
-        "collection_name": collection_name # <--- Initialize in state
+        "collection_name": collection_name, # <--- Initialize in state
+        "tenant_id": tenant_id,
+        "understood": understood, # query understanding already done for the cache key
+        "stream": stream
     }
 
     result_state = rag_graph.invoke(state)
@@ -102,5 +178,108 @@ def run_rag_with_graph(user_query: str, chat_history: list, collection_name: str
         result_state.get("answer"),
         result_state.get("retrieved_docs"),
         result_state.get("timings"),
-        result_state.get("refined_queries") 
+        result_state.get("refined_queries")
+    )
+
+
+def _stream_with_timings(chunks, timings: dict, started: float, on_complete):
+    """Passes a token stream through, recording time to first token and total time."""
+    parts = []
+    for chunk in chunks:
+        if not parts:
+            timings["time_to_first_token_ms"] = (time.time() - started) * 1000
+        parts.append(chunk)
+        yield chunk
+    timings["total_ms"] = (time.time() - started) * 1000
+    on_complete("".join(parts))
+
+
+def run_rag_with_graph(user_query: str, chat_history: list, collection_name: Union[str, List[str]] = None,
+                       stream: bool = False, tenant_id: str = None):
+    """
+    Main entry point called by app.py.
+    A semantic cache in front of the graph answers near-duplicate questions
+    without running refinement, retrieval or generation.
+
+    With stream=True the answer is returned as an iterator of text chunks
+    (for st.write_stream) as soon as retrieval and re-ranking are done; a
+    cache hit or a "no results" message is still returned as a string.
+    Timings gain time_to_first_token_ms and total_ms once the stream ends.
+
+    With config.ASYNC_PIPELINE the same steps run on rag_query_async
+    (AsyncQdrantClient, async GenAI client) instead of the graph.
+
+    A list of collections runs a federated search over all of them; the
+    caller is responsible for passing only collections the user may access.
+    `tenant_id` (the user's organization) scopes tenant-partitioned collections.
+    """
+    started = time.time()
+    collections = rag_query.as_collection_list(collection_name)
+    # Federated answers are cached under the combination of collections;
+    # answers from tenant collections are never shared between tenants
+    target_collection = "+".join(collections)
+    if tenant_id and any(tenants.requires_tenant(c) for c in collections):
+        target_collection = f"{target_collection}@{tenant_id}"
+
+    # Semantic cache lookup (query embedding goes through the embedding cache)
+    cache = config.get_semantic_cache()
+    query_vector = generation = constraints = understood = None
+    if cache:
+        start = time.time()
+        try:
+            query_vector = config.get_dense_model().embed_query(user_query)
+            generation = sum(
+                config.get_collection_generation(tenants.resolve_collection(c, tenant_id)) for c in collections
+            )
+            # Only questions with the same act/section/year/page constraints share answers
+            # (the parse is handed on to the pipeline, which does not redo it)
+            understood = rag_query.understand_collections(user_query, config.get_qdrant_client(), collections, tenant_id)
+            constraints = rag_query.query_filters_key(understood)
+            cached = cache.lookup(target_collection, query_vector, generation, constraints)
+        except Exception as e:
+            logging.warning(f"Semantic cache lookup failed: {e}")
+            query_vector = cached = None
+        lookup_ms = (time.time() - start) * 1000
+
+        if cached:
+            timings = {"semantic_cache_hit": True, "cache_lookup_ms": lookup_ms, "total_ms": lookup_ms}
+            return cached.answer, cached.docs, timings, cached.refined_queries
+
+    if config.ASYNC_PIPELINE:
+        answer, docs, timings, refined_queries = rag_query_async.run_async_rag(
+            user_query, collection_name=collection_name, stream=stream, tenant_id=tenant_id, understood=understood
+        )
+        timings["total_ms"] = (time.time() - started) * 1000
+    else:
+        answer, docs, timings, refined_queries = _invoke_graph(
+            user_query, chat_history, collection_name, stream, tenant_id, understood
+        )
+
+    if cache and query_vector is not None:
+        timings["semantic_cache_hit"] = False
+        timings["cache_lookup_ms"] = lookup_ms
+
+    def _remember(full_answer: str):
+        # Only complete answers grounded in retrieved context are cached
+        # (not degraded ones produced after a missed refinement deadline)
+        if (
+            cache and query_vector is not None
+            and docs and full_answer and rag_query.GENERATION_ERROR_MESSAGE not in full_answer
+            and not timings.get("refine_deadline_hit")
+        ):
+            cache.store(
+                target_collection, query_vector, generation,
+                CachedAnswer(answer=full_answer, docs=docs, refined_queries=refined_queries), constraints,
+            )
+
+    if isinstance(answer, str):
+        _remember(answer)
+    else:
+        answer = _stream_with_timings(answer, timings, started, _remember)
+
+    return (
+        answer,
+        docs,
+        timings,
+        refined_queries
     )
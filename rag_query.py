@@ -3,18 +3,29 @@ import re
 import logging
 import time
 import random
-from typing import List, Dict, Any, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Iterator, Union
 
 from qdrant_client import models
 from google import genai
 from google.genai import types
 
 import config
+import fusion
+from context_packer import pack_context
+from neighbor_expansion import expand_neighbors
+from query_understanding import QueryFilters, known_act_names, parse_query, build_filter, merge_filters
+from routing_index import FALLBACK_ACT_NAME, route_acts
+import tenants
+from fake_llm import FakeGenAIClient
 
 # Initialize Google GenAI Client
 try:
-    if config.GEMINI_API_KEY:
+    if config.LLM_BACKEND == "fake":
+        client = FakeGenAIClient(token_delay_s=config.FAKE_LLM_TOKEN_DELAY_S)
+    elif config.GEMINI_API_KEY:
         client = genai.Client(api_key=config.GEMINI_API_KEY)
     else:
         logging.warning("GEMINI_API_KEY not found in environment variables.")
@@ -24,6 +35,18 @@ except Exception as e:
     client = None
 
 
+SYSTEM_ERROR_MESSAGE = "System Error: Missing Models or Database Connection."
+GENERATION_ERROR_MESSAGE = "I encountered an error generating the answer due to high server load. Please try again in a moment."
+
+# Fans federated searches out to their collections
+_FEDERATED_EXECUTOR = ThreadPoolExecutor(max_workers=config.FEDERATED_MAX_WORKERS, thread_name_prefix="rag-federated")
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    error_str = str(e)
+    return "429" in error_str or "RESOURCE_EXHAUSTED" in error_str
+
+
 def _execute_with_retry(func, retries=3, initial_delay=2):
     """
     Helper to retry API calls with exponential backoff on 429 errors.
@@ -34,8 +57,7 @@ def _execute_with_retry(func, retries=3, initial_delay=2):
             return func()
         except Exception as e:
             # Check for Rate Limit (429) or Service Unavailable (503)
-            error_str = str(e)
-            if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
+            if is_rate_limit_error(e):
                 if attempt == retries - 1:
                     logging.error(f"Max retries reached for API call. Error: {e}")
                     raise e
@@ -58,34 +80,174 @@ def extract_page_number(query: str) -> int | None:
     return None
 
 
+def understand_query(user_query: str, client_qdrant, collection_name: str = None, tenant_id: str = None):
+    """
+    Query understanding: extracts act names (matched against the acts in
+    the collection, only the tenant's own on tenant collections), section
+    numbers, years and page references.
+    Returns (QueryFilters, models.Filter or None) for pushdown into search.
+    """
+    if not config.FILTER_PUSHDOWN_ENABLED:
+        page = extract_page_number(user_query)
+        return QueryFilters(pages=[page] if page else []), _build_page_filter(page)
+
+    target_coll = collection_name or config.COLLECTION_NAME
+    facet_filter = tenants.scope_filter(target_coll, tenant_id)
+    act_names = known_act_names(
+        client_qdrant, target_coll, config.get_collection_generation(target_coll),
+        tenant_id if facet_filter is not None else None, facet_filter,
+    )
+    filters = parse_query(user_query, act_names)
+    return filters, build_filter(filters)
+
+
+def route_query(user_query: str, resources, collection_name: str, query_filters: QueryFilters,
+                query_filter: models.Filter = None, timings: Dict = None) -> models.Filter:
+    """
+    Route stage of the two-level index: for large collections, restricts the
+    chunk-level search to the acts whose act/section summary vectors best
+    match the question. Skipped when the question already names an act, and
+    on tenant collections (no routing index is kept for them).
+    Returns the filter for the chunk stage.
+    """
+    target_coll = collection_name or config.COLLECTION_NAME
+    if not config.ROUTING_ENABLED or query_filters.act_names or tenants.requires_tenant(target_coll):
+        return query_filter
+    dense_model, _, client_qdrant = resources
+    act_names = known_act_names(client_qdrant, target_coll, config.get_collection_generation(target_coll))
+    if len([a for a in act_names if a != FALLBACK_ACT_NAME]) < config.ROUTING_MIN_ACTS:
+        return query_filter
+
+    start = time.time()
+    try:
+        acts = route_acts(client_qdrant, target_coll, dense_model.embed_query(user_query), config.ROUTING_TOP_ACTS)
+    except Exception as e:
+        logging.warning(f"Act routing failed for {target_coll}: {e}")
+        return query_filter
+    if timings is not None:
+        timings["route_ms"] = (time.time() - start) * 1000
+        timings["routed_acts"] = acts
+    if not acts:
+        return query_filter
+    return merge_filters(query_filter, build_filter(QueryFilters(act_names=acts)))
+
+
+def as_collection_list(collection_name: Union[str, List[str], None]) -> List[str]:
+    """One collection name or a list of them -> list without duplicates (default collection if empty)."""
+    if not collection_name:
+        return [config.COLLECTION_NAME]
+    if isinstance(collection_name, str):
+        return [collection_name]
+    return list(dict.fromkeys(collection_name))
+
+
+def understand_collections(user_query: str, client_qdrant, collection_name: Union[str, List[str], None],
+                           tenant_id: str = None) -> Dict[str, tuple]:
+    """
+    Query understanding for each target collection (act names are matched
+    against each collection's own acts). A tenant moved to a dedicated
+    collection is searched there instead of the shared one. Returns
+    {collection: (QueryFilters, filter)} in search order.
+    """
+    collections = dict.fromkeys(
+        tenants.resolve_collection(coll, tenant_id) for coll in as_collection_list(collection_name)
+    )
+    return {coll: understand_query(user_query, client_qdrant, coll, tenant_id) for coll in collections}
+
+
+def plan_collection_filters(user_query: str, resources, collection_name: Union[str, List[str], None],
+                            timings: Dict = None, tenant_id: str = None,
+                            understood: Dict[str, tuple] = None) -> Dict[str, models.Filter]:
+    """
+    Query understanding and act routing for each target collection. Pass
+    `understood` (from understand_collections) to reuse an earlier parse.
+    Returns {collection: filter or None} in search order. With several
+    collections the per-collection details go to timings["collections"].
+    """
+    if understood is None:
+        understood = understand_collections(user_query, resources[2], collection_name, tenant_id)
+    filters = {}
+    for coll, (query_filters, query_filter) in understood.items():
+        coll_timings = timings
+        if timings is not None and len(understood) > 1:
+            coll_timings = timings.setdefault("collections", {}).setdefault(coll, {})
+        if coll_timings is not None:
+            coll_timings["query_filters"] = query_filters.describe()
+        filters[coll] = route_query(user_query, resources, coll, query_filters, query_filter, coll_timings)
+    return filters
+
+
+def query_filters_key(understood: Dict[str, tuple]) -> str:
+    """
+    The structured constraints of a question (act names, sections, years,
+    pages per target collection, from understand_collections) as a stable
+    string. Questions that embed alike but name a different section or
+    year get different keys.
+    """
+    return json.dumps({coll: query_filters.describe() for coll, (query_filters, _) in understood.items()},
+                      sort_keys=True)
+
+
+def refinement_cache_key(user_query: str):
+    """Returns (cache, key) for memoizing refinements of `user_query` ((None, None) if disabled)."""
+    cache = config.get_refinement_cache()
+    if not cache:
+        return None, None
+    fingerprint = f"{config.LLM_MODEL}:{config.MAX_REFINED_QUERIES}:{hashlib.sha256(config.QUERY_GEN_PROMPT.encode()).hexdigest()[:16]}"
+    return cache, cache.make_key(user_query, fingerprint)
+
+
+def refinement_request(user_query: str) -> Dict[str, Any]:
+    """generate_content keyword arguments for query refinement."""
+    prompt = f"{config.QUERY_GEN_PROMPT.format(max_queries=config.MAX_REFINED_QUERIES)}\nUser Question: {user_query}"
+    return dict(
+        model=config.LLM_MODEL,
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            temperature=0.7, 
+            top_p=0.95,
+            top_k=40
+        )
+    )
+
+
+def parse_refinements(user_query: str, generated_text: str) -> List[str]:
+    """Generated variations, one per line, bounded by config.MAX_REFINED_QUERIES."""
+    new_queries = [q.strip() for q in generated_text.strip().split('\n') if q.strip()]
+    # Bound the retrieval fan-out even if the model returns extra lines
+    return [q for q in dict.fromkeys(new_queries) if q != user_query][:config.MAX_REFINED_QUERIES]
+
+
 def generate_refined_query(user_query: str) -> List[str]:
     """
     Generates multiple refined queries using Google GenAI SDK.
-    Returns a list including the original query and generated variations.
+    Returns a list including the original query and at most
+    config.MAX_REFINED_QUERIES generated variations. Results are memoized
+    per normalized question in the refinement cache.
     """
-    if not client:
+    if not client or config.MAX_REFINED_QUERIES <= 0:
         return [user_query]
 
-    prompt = f"{config.QUERY_GEN_PROMPT}\nUser Question: {user_query}"
+    cache, cache_key = refinement_cache_key(user_query)
+    if cache_key:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return list(dict.fromkeys([user_query] + cached))
+
+    request = refinement_request(user_query)
     
     def _api_call():
-        return client.models.generate_content(
-            model=config.LLM_MODEL,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                temperature=0.7, 
-                top_p=0.95,
-                top_k=40
-            )
-        )
+        return client.models.generate_content(**request)
 
     try:
         # Wrap the API call with retry logic
         response = _execute_with_retry(_api_call)
-        
-        generated_text = response.text.strip()
-        new_queries = [q.strip() for q in generated_text.split('\n') if q.strip()]
-        
+        new_queries = parse_refinements(user_query, response.text)
+
+        # Only successful refinements are cached; failures fall through below
+        if cache_key:
+            cache.put(cache_key, new_queries)
+
         all_queries = [user_query] + new_queries
         return list(dict.fromkeys(all_queries))
 
@@ -95,216 +257,423 @@ def generate_refined_query(user_query: str) -> List[str]:
         return [user_query]
 
 
+def _build_page_filter(page_filter: int = None):
+    """Payload filter restricting the search to one page (None if no page was given)."""
+    if page_filter is None:
+        return None
+    return models.Filter(
+        must=[
+            models.FieldCondition(
+                key="page_number",
+                match=models.MatchValue(value=page_filter)
+            )
+        ]
+    )
+
+
+def _build_hybrid_request(dense_query, sparse_query, qdrant_filter, collection_name: str) -> models.QueryRequest:
+    """One hybrid (dense + sparse prefetch, RRF) request for query_points / query_batch_points."""
+    prefetch = [
+        models.Prefetch(
+            query=dense_query,
+            using=config.DENSE_VECTOR_NAME,
+            limit=20, 
+            filter=qdrant_filter,
+            # ef / quantization rescoring matching the collection profile
+            params=config.build_search_params(collection_name)
+        ),
+        models.Prefetch(
+            query=sparse_query,
+            using=config.SPARSE_VECTOR_NAME,
+            limit=20,
+            filter=qdrant_filter
+        ),
+    ]
+    return models.QueryRequest(
+        prefetch=prefetch,
+        query=models.FusionQuery(fusion=models.Fusion.RRF),
+        limit=20,
+        with_payload=True
+    )
+
+
+def _format_points(points, collection_name: str = None) -> List[Dict]:
+    """Converts scored points into the result dicts used across the pipeline."""
+    docs = []
+    for point in points:
+        docs.append({
+            "chunk": point.payload.get("chunk", ""),
+            "legal_act_name":point.payload.get("legal_act_name","Nepal Act"),
+            "page_number": point.payload.get("page_number", "?"),
+            "source_file": point.payload.get("source_file"),
+            "global_chunk_id": point.payload.get("global_chunk_id"),
+            "file_chunk_id": point.payload.get("file_chunk_id"),
+            "section_name": point.payload.get("section_name"),
+            "score": point.score, 
+            "id": point.id,
+            "collection": collection_name
+        })
+    return docs
+
+
+def perform_batched_hybrid_search(
+    queries: List[str],
+    client,
+    dense_model,
+    sparse_model,
+    query_filter: models.Filter = None,
+    collection_name: str = None,
+    tenant_id: str = None
+) -> List[List[Dict]]:
+    """
+    Executes hybrid searches for several queries in one round trip.
+    All queries are embedded with one dense and one sparse model call, and
+    every prefetch/RRF request goes to Qdrant in a single query_batch_points.
+    Searches of tenant-partitioned collections are scoped to `tenant_id`.
+    Returns one result list per query (in order).
+    """
+    if not queries:
+        return []
+    try:
+        # 1. Batched Embeddings
+        embedded = embed_queries(queries, dense_model, sparse_model)
+    except Exception as e:
+        logging.error(f"Embedding failed for {len(queries)} queries: {e}")
+        return [[] for _ in queries]
+    return search_embedded(client, embedded, query_filter, collection_name, tenant_id)
+
+
+def embed_queries(queries: List[str], dense_model, sparse_model) -> List[Tuple[List[float], models.SparseVector]]:
+    """One dense and one sparse model call for all queries; returns (dense, sparse) per query."""
+    dense_queries = dense_model.embed_documents(queries)
+    sparse_queries = [
+        models.SparseVector(indices=emb.indices.tolist(), values=emb.values.tolist())
+        for emb in sparse_model.embed(queries)
+    ]
+    return list(zip(dense_queries, sparse_queries))
+
+
+def search_embedded(client, embedded, query_filter: models.Filter = None, collection_name: str = None,
+                    tenant_id: str = None) -> List[List[Dict]]:
+    """
+    Hybrid search for already embedded queries in one query_batch_points
+    round trip. Tenant collections are only ever searched within `tenant_id`
+    (without one, nothing is returned).
+    """
+    target_coll = collection_name or config.COLLECTION_NAME
+    try:
+        scoped_filter = tenants.scope_filter(target_coll, tenant_id, query_filter)
+
+        # 2. One request per query
+        requests = [
+            _build_hybrid_request(dense_query, sparse_query, scoped_filter, target_coll)
+            for dense_query, sparse_query in embedded
+        ]
+
+        # 3. Single round trip
+        responses = client.query_batch_points(collection_name=target_coll, requests=requests)
+        return [_format_points(response.points, target_coll) for response in responses]
+
+    except Exception as e:
+        logging.error(f"Batched search on {target_coll} failed for {len(embedded)} queries: {e}")
+        return [[] for _ in embedded]
+
+
 def perform_hybrid_search(
     query: str, 
     client, 
     dense_model, 
     sparse_model, 
-    page_filter: int = None,
-    collection_name: str = None 
+    query_filter: models.Filter = None,
+    collection_name: str = None,
+    tenant_id: str = None
 ) -> List[Dict]:
     """
-    Executes a single hybrid search (Dense + Sparse) for a given query.
+    Executes a single hybrid search (Dense + Sparse) for a given query,
+    scoped to `tenant_id` on tenant-partitioned collections.
     """
-    try:
-        # 1. Dense Embedding
-        dense_query = dense_model.embed_query(query)
-
-        # 2. Sparse Embedding
-        sparse_embedding_obj = list(sparse_model.embed([query]))[0]
-        sparse_query = models.SparseVector(
-            indices=sparse_embedding_obj.indices.tolist(),
-            values=sparse_embedding_obj.values.tolist()
-        )
+    return perform_batched_hybrid_search(
+        [query], client, dense_model, sparse_model, query_filter, collection_name, tenant_id
+    )[0]
 
-        # 3. Construct Filter
-        qdrant_filter = None
-        if page_filter is not None:
-            qdrant_filter = models.Filter(
-                must=[
-                    models.FieldCondition(
-                        key="page_number",
-                        match=models.MatchValue(value=page_filter)
-                    )
-                ]
-            )
-
-        # 4. Prefetch objects
-        prefetch = [
-            models.Prefetch(
-                query=dense_query,
-                using=config.DENSE_VECTOR_NAME,
-                limit=20, 
-                filter=qdrant_filter
-            ),
-            models.Prefetch(
-                query=sparse_query,
-                using=config.SPARSE_VECTOR_NAME,
-                limit=20,
-                filter=qdrant_filter
-            ),
-        ]
 
-        # 5. Execute Query
-        target_coll = collection_name or config.COLLECTION_NAME 
+def fuse_results(user_query: str, all_results: List[List[Dict]], queries: List[str] = None) -> List[Dict]:
+    """
+    Fuses per-query results with config.FUSION_METHOD. When `queries` (aligned
+    with `all_results`) is given, the original question's list is weighted
+    by config.FUSION_ORIGINAL_WEIGHT and generated variants by 1.0.
+    """
+    weights = None
+    if queries is not None:
+        weights = [config.FUSION_ORIGINAL_WEIGHT if q == user_query else 1.0 for q in queries]
+    return fusion.fuse(all_results, method=config.FUSION_METHOD, weights=weights, k=config.FUSION_RRF_K)
 
-        results = client.query_points(
-            collection_name=target_coll, 
-            prefetch=prefetch,
-            query=models.FusionQuery(fusion=models.Fusion.RRF),
-            limit=20, 
-            with_payload=True
-        )
 
-        # 6. Format Results
-        docs = []
-        for point in results.points:
-            docs.append({
-                "chunk": point.payload.get("chunk", ""),
-                "legal_act_name":point.payload.get("legal_act_name","Nepal Act"),
-                "page_number": point.payload.get("page_number", "?"),
-                "score": point.score, 
-                "id": point.id
-            })
-        return docs
+def rerank_documents(query: str, docs: List[Dict], top_k: int, timings: Dict = None) -> List[Dict]:
+    """
+    Re-ranks documents using a Cross-Encoder (through the rerank engine:
+    score cache, truncation, optional cascade). The mode used and the
+    pairs scored are added to `timings` when given.
+    """
+    engine = config.get_rerank_engine()
+    if not engine or not docs:
+        return docs[:top_k]
 
+    try:
+        ranked_docs, stats = engine.rerank(query, docs, top_k)
+        if timings is not None:
+            timings.update(stats)
+        return ranked_docs
     except Exception as e:
-        logging.error(f"Search failed for query '{query}': {e}")
-        return []
+        logging.error(f"Re-ranking failed: {e}")
+        if timings is not None:
+            timings["rerank_mode"] = "failed"
+        return docs[:top_k]
 
 
-def rrf_fusion(results_list: List[List[Dict]], k=60) -> List[Dict]:
+def load_search_resources():
+    """Returns (dense_model, sparse_model, qdrant_client), or None if any is unavailable."""
+    dense_model = config.get_dense_model()
+    sparse_model = config.get_sparse_model()
+    client_qdrant = config.get_qdrant_client()
+    if not dense_model or not sparse_model or not client_qdrant:
+        return None
+    return dense_model, sparse_model, client_qdrant
+
+
+def retrieve_for_queries(queries: List[str], resources, query_filter: models.Filter = None, collection_name: str = None,
+                         tenant_id: str = None) -> List[List[Dict]]:
     """
-    Reciprocal Rank Fusion to merge results from multiple parallel queries.
+    Batched hybrid retrieval (one embedding call per model, one Qdrant round
+    trip); one result list per query. If a pushed-down filter matches
+    nothing (e.g. a misread reference), the search is repeated unfiltered.
     """
-    fused_scores = {}
-    doc_map = {}
+    if not queries:
+        return []
+    dense_model, sparse_model, client_qdrant = resources
+    try:
+        embedded = embed_queries(queries, dense_model, sparse_model)
+    except Exception as e:
+        logging.error(f"Embedding failed for {len(queries)} queries: {e}")
+        return [[] for _ in queries]
+    return _search_with_fallback(client_qdrant, embedded, query_filter, collection_name, tenant_id)
 
-    for results in results_list:
-        for rank, doc in enumerate(results):
-            doc_content = doc["chunk"]
-            if doc_content not in doc_map:
-                doc_map[doc_content] = doc
-            
-            if doc_content not in fused_scores:
-                fused_scores[doc_content] = 0.0
-            
-            fused_scores[doc_content] += 1 / (k + rank + 1)
 
-    sorted_docs = sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)
-    
-    final_results = []
-    for content, score in sorted_docs:
-        d = doc_map[content]
-        d["score"] = score 
-        final_results.append(d)
-        
-    return final_results
+def _search_with_fallback(client_qdrant, embedded, query_filter: models.Filter, collection_name: str,
+                          tenant_id: str = None) -> List[List[Dict]]:
+    # The tenant scope is applied in search_embedded, so the fallback keeps it
+    results = search_embedded(client_qdrant, embedded, query_filter, collection_name, tenant_id)
+    if query_filter is not None and not any(results):
+        logging.info("Filtered search returned nothing; retrying without filters.")
+        results = search_embedded(client_qdrant, embedded, None, collection_name, tenant_id)
+    return results
 
 
-def rerank_documents(query: str, docs: List[Dict], top_k: int) -> List[Dict]:
+def merge_collection_results(per_collection: Dict[str, List[List[Dict]]]) -> List[List[Dict]]:
     """
-    Re-ranks documents using a Cross-Encoder.
+    Fuses each query's results across collections: every collection's
+    scores are normalized separately (config.FEDERATED_FUSION_METHOD) and
+    each doc is labelled with its collection. Returns one list per query.
     """
-    reranker = config.get_rerank_model()
-    if not reranker or not docs:
-        return docs[:top_k]
+    merged = []
+    for per_query in zip(*per_collection.values()):
+        labelled = [
+            [{**d, "collection_label": config.COLLECTION_LABELS.get(tenants.base_collection(coll), coll)} for d in results]
+            for coll, results in zip(per_collection, per_query)
+        ]
+        merged.append(fusion.fuse(labelled, method=config.FEDERATED_FUSION_METHOD, k=config.FUSION_RRF_K))
+    return merged
 
-    pairs = [[query, d["chunk"]] for d in docs]
-    
+
+def retrieve_for_collections(queries: List[str], resources, filters: Dict[str, models.Filter],
+                             tenant_id: str = None) -> List[List[Dict]]:
+    """
+    Retrieval over one or more collections ({collection: filter}, see
+    plan_collection_filters); one result list per query. Federated searches
+    embed the queries once and query all collections in parallel.
+    """
+    if len(filters) == 1:
+        (coll, query_filter), = filters.items()
+        return retrieve_for_queries(queries, resources, query_filter, coll, tenant_id)
+    if not queries:
+        return []
+
+    dense_model, sparse_model, client_qdrant = resources
     try:
-        scores = reranker.predict(pairs)
-        
-        for i, score in enumerate(scores):
-            docs[i]["score"] = float(score) 
-            
-        ranked_docs = sorted(docs, key=lambda x: x["score"], reverse=True)
-        return ranked_docs[:top_k]
+        embedded = embed_queries(queries, dense_model, sparse_model)
     except Exception as e:
-        logging.error(f"Re-ranking failed: {e}")
-        return docs[:top_k]
+        logging.error(f"Embedding failed for {len(queries)} queries: {e}")
+        return [[] for _ in queries]
+
+    futures = {
+        coll: _FEDERATED_EXECUTOR.submit(_search_with_fallback, client_qdrant, embedded, query_filter, coll, tenant_id)
+        for coll, query_filter in filters.items()
+    }
+    return merge_collection_results({coll: future.result() for coll, future in futures.items()})
 
 
-def query_qdrant_rag(user_query: str, chat_history: list, refined_queries: List[str] = None, collection_name: str = None):
+def query_qdrant_rag(user_query: str, chat_history: list, refined_queries: List[str] = None,
+                     collection_name: Union[str, List[str]] = None, tenant_id: str = None):
     """
-    Main Orchestrator:
+    Main Orchestrator (`collection_name` may list several collections for a
+    federated search; `tenant_id` scopes organization collections):
     1. Extract Filters
-    2. Parallel Search (Original + Refined Queries)
+    2. Batched Search (Original + Refined Queries, across collections)
     3. RRF Fusion
-    4. Re-ranking
+    4. Re-ranking (+ Neighbor Expansion)
     5. Final Generation
     """
     
     # Load Resources
-    dense_model = config.get_dense_model()
-    sparse_model = config.get_sparse_model()
-    client_qdrant = config.get_qdrant_client()
-
-    if not dense_model or not sparse_model or not client_qdrant:
-        return "System Error: Missing Models or Database Connection.", []
+    resources = load_search_resources()
+    if not resources:
+        return SYSTEM_ERROR_MESSAGE, []
 
-    # 1. Pre-Filtering
-    page_filter = extract_page_number(user_query)
+    # 1. Pre-Filtering (filters pushed down into the Qdrant query, per collection)
+    filters = plan_collection_filters(user_query, resources, collection_name, tenant_id=tenant_id)
     
     search_queries = refined_queries if refined_queries else [user_query]
     
-    # 2. Parallel Retrieval
-    all_results = []
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        future_to_query = {
-            executor.submit(
-                perform_hybrid_search, q, client_qdrant, dense_model, sparse_model, page_filter, collection_name
-            ): q for q in search_queries
-        }
-        
-        for future in as_completed(future_to_query):
-            res = future.result()
-            if res:
-                all_results.append(res)
-
-    if not all_results:
-        return "No matching content found in documents.", []
-
-    # 3. RRF Fusion
-    fused_docs = rrf_fusion(all_results)
+    # 2. Batched Retrieval
+    all_results = retrieve_for_collections(search_queries, resources, filters, tenant_id)
+
+    return rank_and_generate(user_query, all_results, queries=search_queries, tenant_id=tenant_id)
+
+
+def select_context_docs(
+    user_query: str, all_results: List[List[Dict]], timings: Dict = None, queries: List[str] = None,
+    tenant_id: str = None
+) -> Tuple[List[Dict], str | None]:
+    """
+    Fuses per-query results, re-ranks them (rerank stats go to `timings`)
+    and expands the winners with their neighboring chunks.
+    `queries`, aligned with `all_results`, enables original-query weighting.
+    Returns (final_docs, None), or ([], message) when nothing relevant was found.
+    """
+    if not any(all_results):
+        return [], "No matching content found in documents."
+
+    # 3. Fusion (weighted RRF / DBSF, by point ID)
+    fused_docs = fuse_results(user_query, all_results, queries)
 
     # 4. Re-Ranking
-    final_docs = rerank_documents(user_query, fused_docs, top_k=config.TOP_K_RERANK)
+    final_docs = rerank_documents(user_query, fused_docs, top_k=config.TOP_K_RERANK, timings=timings)
 
     if not final_docs:
-        return "No relevant context found after re-ranking.", []
+        return [], "No relevant context found after re-ranking."
+
+    # 4b. Neighbor Expansion (small-to-big)
+    if config.NEIGHBOR_WINDOW > 0:
+        start = time.time()
+        winners = len(final_docs)
+        final_docs = expand_neighbors(config.get_qdrant_client(), final_docs, config.NEIGHBOR_WINDOW, tenant_id)
+        if timings is not None:
+            timings["neighbor_expansion_ms"] = (time.time() - start) * 1000
+            timings["neighbor_chunks_added"] = len(final_docs) - winners
+    return final_docs, None
+
+
+def build_context(final_docs: List[Dict], timings: Dict = None) -> str:
+    """
+    Packs re-ranked docs into the prompt context (token budget, adjacent
+    chunk merging, MMR diversity, per-span citations) and reports the
+    estimated tokens used and saved in `timings`.
+    """
+    if not config.CONTEXT_PACKING_ENABLED:
+        return "\n\n".join(
+            f"[Source: {d['legal_act_name']}{' | ' + d['collection_label'] if d.get('collection_label') else ''}]: {d['chunk']}"
+            for d in final_docs
+        )
+
+    packed = pack_context(
+        final_docs,
+        token_budget=config.CONTEXT_TOKEN_BUDGET,
+        mmr_lambda=config.CONTEXT_MMR_LAMBDA,
+        chars_per_token=config.CONTEXT_CHARS_PER_TOKEN,
+    )
+    if timings is not None:
+        timings["context_docs_used"] = packed.docs_used
+        timings["context_spans"] = len(packed.spans)
+        timings["context_tokens"] = packed.tokens
+        timings["context_tokens_saved"] = packed.tokens_saved
+    return packed.text
 
+
+def answer_request(user_query: str, final_docs: List[Dict], timings: Dict = None) -> Dict[str, Any]:
+    """generate_content(_stream) keyword arguments for the final answer."""
     # 5. Construct Context
-    context_parts = []
-    for d in final_docs:
-        context_parts.append(f"[Source: {d['legal_act_name']}]: {d['chunk']}")
-    
-    full_context = "\n\n".join(context_parts)
-    print(f"\n\n\nFULL_CONTEXT:\n{full_context}\n\n\n")
+    full_context = build_context(final_docs, timings)
+    logging.debug(f"Answer context ({len(full_context)} chars):\n{full_context}")
+
+    return dict(
+        model=config.LLM_MODEL,
+        contents=f"CONTEXT:\n{full_context}\n\nUSER QUESTION: {user_query}",
+        config=types.GenerateContentConfig(
+            system_instruction=config.RAG_SYSTEM_PROMPT,
+            temperature=config.GEN_CONFIG["temperature"],
+            top_p=config.GEN_CONFIG["top_p"],
+            top_k=config.GEN_CONFIG["top_k"],
+            # max_output_tokens=config.GEN_CONFIG["max_output_tokens"],
+        )
+    )
+
+
+def generate_answer(user_query: str, final_docs: List[Dict], timings: Dict = None) -> str:
+    """6. Final Generation with Retry Logic (blocking)."""
+    request = answer_request(user_query, final_docs, timings)
 
-    # 6. Final Generation with Retry Logic
-    final_prompt = f"CONTEXT:\n{full_context}\n\nUSER QUESTION: {user_query}"
     def _final_gen_call():
-        return client.models.generate_content(
-            model=config.LLM_MODEL,
-            contents=final_prompt,
-            config=types.GenerateContentConfig(
-                system_instruction=config.RAG_SYSTEM_PROMPT,
-                temperature=config.GEN_CONFIG["temperature"],
-                top_p=config.GEN_CONFIG["top_p"],
-                top_k=config.GEN_CONFIG["top_k"],
-                # max_output_tokens=config.GEN_CONFIG["max_output_tokens"],
-            )
-        )
+        return client.models.generate_content(**request)
 
     try:
         response = _execute_with_retry(_final_gen_call)
-        answer = response.text
-        return answer, final_docs
+        return response.text
+
+    except Exception as e:
+        logging.error(f"LLM Generation Failed after retries: {e}")
+        return GENERATION_ERROR_MESSAGE
+
+
+def stream_answer(user_query: str, final_docs: List[Dict], timings: Dict = None) -> Iterator[str]:
+    """
+    6. Final Generation, streamed: yields text chunks as the LLM produces them.
+    Opening the stream and reading its first chunk are retried like the
+    blocking call, since rate-limit errors surface there.
+    """
+    request = answer_request(user_query, final_docs, timings)
 
+    def _open_stream():
+        stream = iter(client.models.generate_content_stream(**request))
+        return next(stream, None), stream
+
+    try:
+        first_chunk, stream = _execute_with_retry(_open_stream)
     except Exception as e:
         logging.error(f"LLM Generation Failed after retries: {e}")
-        return "I encountered an error generating the answer due to high server load. Please try again in a moment.", final_docs
+        yield GENERATION_ERROR_MESSAGE
+        return
+
+    try:
+        if first_chunk is not None and first_chunk.text:
+            yield first_chunk.text
+        for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+    except Exception as e:
+        logging.error(f"LLM stream interrupted: {e}")
+        yield f"\n\n{GENERATION_ERROR_MESSAGE}"
+
+
+def rank_and_generate(user_query: str, all_results: List[List[Dict]], timings: Dict = None, queries: List[str] = None,
+                      tenant_id: str = None):
+    """
+    Fuses per-query results, re-ranks them, expands neighbors and generates the answer.
+    Returns (answer, final_docs).
+    """
+    final_docs, message = select_context_docs(user_query, all_results, timings, queries, tenant_id)
+    if message:
+        return message, []
+    return generate_answer(user_query, final_docs, timings), final_docs
 
 
 # ---------------- NEW RULE GENERATION FUNCTION ----------------
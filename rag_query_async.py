@@ -0,0 +1,292 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Iterator, Tuple
+
+from qdrant_client import AsyncQdrantClient, models
+
+import config
+import rag_query
+import tenants
+
+# One event loop thread serves every Streamlit session; CPU-bound work
+# (embedding, re-ranking) goes to a bounded executor instead of ad hoc pools
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+_CPU_EXECUTOR = ThreadPoolExecutor(max_workers=config.ASYNC_CPU_WORKERS, thread_name_prefix="rag-cpu")
+
+# Bound to _LOOP, so it is created lazily from inside it
+_ASYNC_QDRANT_CLIENT = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Starts the shared background event loop on first use."""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name="rag-async-loop", daemon=True).start()
+    return _LOOP
+
+
+def _get_async_qdrant_client() -> AsyncQdrantClient:
+    global _ASYNC_QDRANT_CLIENT
+    if _ASYNC_QDRANT_CLIENT is None:
+        _ASYNC_QDRANT_CLIENT = AsyncQdrantClient(url=config.QDRANT_URL)
+    return _ASYNC_QDRANT_CLIENT
+
+
+async def _run_cpu(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_CPU_EXECUTOR, func, *args)
+
+
+async def _execute_with_retry_async(coro_factory, retries=3, initial_delay=2):
+    """
+    Async counterpart of rag_query._execute_with_retry: exponential backoff
+    with jitter on 429 errors, without blocking the event loop.
+    """
+    delay = initial_delay
+    for attempt in range(retries):
+        try:
+            return await coro_factory()
+        except Exception as e:
+            if not rag_query.is_rate_limit_error(e) or attempt == retries - 1:
+                raise
+            sleep_time = delay + random.uniform(0, 1)
+            logging.warning(f"Rate limit hit (429). Retrying in {sleep_time:.2f}s... (Attempt {attempt+1}/{retries})")
+            await asyncio.sleep(sleep_time)
+            delay *= 2
+
+
+# -------------------- PIPELINE STEPS --------------------
+
+async def agenerate_refined_query(user_query: str) -> List[str]:
+    """Async version of rag_query.generate_refined_query (same cache and bound)."""
+    if not rag_query.client or config.MAX_REFINED_QUERIES <= 0:
+        return [user_query]
+
+    cache, cache_key = rag_query.refinement_cache_key(user_query)
+    if cache_key:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return list(dict.fromkeys([user_query] + cached))
+
+    request = rag_query.refinement_request(user_query)
+    try:
+        response = await _execute_with_retry_async(
+            lambda: rag_query.client.aio.models.generate_content(**request)
+        )
+        new_queries = rag_query.parse_refinements(user_query, response.text)
+        if cache_key:
+            cache.put(cache_key, new_queries)
+        return list(dict.fromkeys([user_query] + new_queries))
+    except Exception as e:
+        logging.error(f"Error in agenerate_refined_query after retries: {e}")
+        return [user_query]
+
+
+async def aretrieve_for_collections(queries: List[str], filters: Dict[str, models.Filter],
+                                    tenant_id: str = None) -> List[List[Dict]]:
+    """
+    Retrieval over one or more collections ({collection: filter}); the
+    queries are embedded once and every collection is searched concurrently.
+    Each collection retries without its filter if the filter matches nothing
+    (tenant collections stay scoped to `tenant_id`).
+    """
+    if not queries:
+        return []
+    try:
+        # 1. Batched Embeddings (CPU-bound, off the event loop)
+        dense_model = await _run_cpu(config.get_dense_model)
+        sparse_model = await _run_cpu(config.get_sparse_model)
+        embedded = await _run_cpu(rag_query.embed_queries, queries, dense_model, sparse_model)
+    except Exception as e:
+        logging.error(f"Embedding failed for {len(queries)} queries: {e}")
+        return [[] for _ in queries]
+
+    per_collection = await asyncio.gather(*(
+        _asearch_with_fallback(embedded, query_filter, coll, tenant_id) for coll, query_filter in filters.items()
+    ))
+    if len(filters) == 1:
+        return per_collection[0]
+    return rag_query.merge_collection_results(dict(zip(filters, per_collection)))
+
+
+async def _asearch_with_fallback(embedded, query_filter: models.Filter, collection_name: str,
+                                 tenant_id: str = None) -> List[List[Dict]]:
+    results = await _asearch(embedded, query_filter, collection_name, tenant_id)
+    if query_filter is not None and not any(results):
+        logging.info("Filtered search returned nothing; retrying without filters.")
+        results = await _asearch(embedded, None, collection_name, tenant_id)
+    return results
+
+
+async def _asearch(embedded, query_filter: models.Filter, collection_name: str, tenant_id: str = None) -> List[List[Dict]]:
+    try:
+        scoped_filter = await _run_cpu(tenants.scope_filter, collection_name, tenant_id, query_filter)
+
+        # 2. One request per query, single round trip
+        requests = [
+            rag_query._build_hybrid_request(dense_query, sparse_query, scoped_filter, collection_name)
+            for dense_query, sparse_query in embedded
+        ]
+        responses = await _get_async_qdrant_client().query_batch_points(collection_name=collection_name, requests=requests)
+        return [rag_query._format_points(r.points, collection_name) for r in responses]
+
+    except Exception as e:
+        logging.error(f"Async batched search on {collection_name} failed for {len(embedded)} queries: {e}")
+        return [[] for _ in embedded]
+
+
+async def arefine_and_retrieve(user_query: str, collection_name: str | List[str] = None,
+                               tenant_id: str = None,
+                               understood: Dict = None) -> Tuple[List[Dict], str | None, List[str], Dict]:
+    """
+    Refinement and retrieval for the original query run concurrently; the
+    refined variants are searched once they arrive (same speculative
+    retrieval and REFINE_DEADLINE_MS semantics as the graph), then results
+    are fused and re-ranked. `understood` reuses an earlier
+    rag_query.understand_collections parse.
+    Returns (final_docs, message_if_empty, refined_queries, timings).
+    """
+    timings = {"pipeline": "async"}
+    start = time.time()
+    refine_task = asyncio.create_task(agenerate_refined_query(user_query))
+
+    # Filter pushdown and act routing per collection run as blocking calls on
+    # the sync client in the CPU executor (act names are a cached facet; the
+    # routing search happens only on large corpora without a named act)
+    resources = await _run_cpu(rag_query.load_search_resources)
+    if not resources:
+        return [], rag_query.SYSTEM_ERROR_MESSAGE, [user_query], timings
+    filters = await _run_cpu(
+        rag_query.plan_collection_filters, user_query, resources, collection_name, timings, tenant_id, understood
+    )
+    chunk_start = time.time()
+    original_task = asyncio.create_task(aretrieve_for_collections([user_query], filters, tenant_id))
+
+    # 1. Wait for refinement; shield() lets a late refinement finish (and be cached)
+    deadline_ms = config.REFINE_DEADLINE_MS
+    try:
+        refined_list = await asyncio.wait_for(
+            asyncio.shield(refine_task), None if deadline_ms is None else deadline_ms / 1000
+        )
+        timings["refine_deadline_hit"] = False
+    except asyncio.TimeoutError:
+        logging.warning(f"Query refinement missed its {deadline_ms} ms deadline; using the original query only.")
+        refined_list = [user_query]
+        timings["refine_deadline_hit"] = True
+    timings["refine_query_ms"] = (time.time() - start) * 1000
+
+    # 2. Search the refined variants (the original is already in flight)
+    variants = [q for q in refined_list if q != user_query]
+    step = time.time()
+    variant_results = await aretrieve_for_collections(variants, filters, tenant_id)
+    if variants:
+        timings["retrieve_refined_ms"] = (time.time() - step) * 1000
+    original_results = await original_task
+    timings["chunk_search_ms"] = (time.time() - chunk_start) * 1000
+    timings["refine_and_retrieve_ms"] = (time.time() - start) * 1000
+
+    # 3. RRF Fusion + 4. Re-Ranking (CPU-bound)
+    step = time.time()
+    final_docs, message = await _run_cpu(
+        rag_query.select_context_docs, user_query, original_results + variant_results, timings, [user_query] + variants,
+        tenant_id
+    )
+    timings["fuse_and_rerank_ms"] = (time.time() - step) * 1000
+    return final_docs, message, [user_query] + variants, timings
+
+
+async def agenerate_answer(user_query: str, final_docs: List[Dict], timings: Dict = None) -> str:
+    """5./6. Final generation on the async GenAI client."""
+    request = rag_query.answer_request(user_query, final_docs, timings)
+    try:
+        response = await _execute_with_retry_async(
+            lambda: rag_query.client.aio.models.generate_content(**request)
+        )
+        return response.text
+    except Exception as e:
+        logging.error(f"LLM Generation Failed after retries: {e}")
+        return rag_query.GENERATION_ERROR_MESSAGE
+
+
+async def astream_answer(user_query: str, final_docs: List[Dict], timings: Dict = None):
+    """
+    Streamed final generation; yields text chunks. As in
+    rag_query.stream_answer, opening the stream and reading its first chunk
+    are retried, since rate-limit errors surface there.
+    """
+    request = rag_query.answer_request(user_query, final_docs, timings)
+
+    async def _open_stream():
+        stream = await rag_query.client.aio.models.generate_content_stream(**request)
+        return await anext(stream, None), stream
+
+    try:
+        first_chunk, stream = await _execute_with_retry_async(_open_stream)
+    except Exception as e:
+        logging.error(f"LLM Generation Failed after retries: {e}")
+        yield rag_query.GENERATION_ERROR_MESSAGE
+        return
+
+    try:
+        if first_chunk is not None and first_chunk.text:
+            yield first_chunk.text
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+    except Exception as e:
+        logging.error(f"LLM stream interrupted: {e}")
+        yield f"\n\n{rag_query.GENERATION_ERROR_MESSAGE}"
+
+
+async def aquery_rag(user_query: str, collection_name: str | List[str] = None, tenant_id: str = None,
+                     understood: Dict = None):
+    """
+    Async orchestrator: refine + retrieve -> fuse -> rerank -> generate.
+    Returns (answer, docs, timings, refined_queries).
+    """
+    final_docs, message, refined_queries, timings = await arefine_and_retrieve(
+        user_query, collection_name, tenant_id, understood
+    )
+    if message:
+        return message, [], timings, refined_queries
+
+    step = time.time()
+    answer = await agenerate_answer(user_query, final_docs, timings)
+    timings["generate_ms"] = (time.time() - step) * 1000
+    return answer, final_docs, timings, refined_queries
+
+
+# -------------------- SYNC WRAPPERS --------------------
+
+def run_async_rag(user_query: str, collection_name: str | List[str] = None, stream: bool = False,
+                  tenant_id: str = None, understood: Dict = None):
+    """
+    Runs the async pipeline on the shared loop from synchronous code.
+    Returns (answer, docs, timings, refined_queries); with stream=True the
+    answer is an iterator of text chunks pulled from the loop on demand.
+    """
+    loop = _get_loop()
+    if not stream:
+        return asyncio.run_coroutine_threadsafe(aquery_rag(user_query, collection_name, tenant_id, understood), loop).result()
+
+    final_docs, message, refined_queries, timings = asyncio.run_coroutine_threadsafe(
+        arefine_and_retrieve(user_query, collection_name, tenant_id, understood), loop
+    ).result()
+    if message:
+        return message, [], timings, refined_queries
+    return _iterate_async(astream_answer(user_query, final_docs, timings), loop), final_docs, timings, refined_queries
+
+
+def _iterate_async(agen, loop) -> Iterator[str]:
+    """Bridges an async generator running on `loop` to a plain iterator."""
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
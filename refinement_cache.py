@@ -0,0 +1,95 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+
+def normalize_query(query: str) -> str:
+    """Case-folds, collapses whitespace and drops trailing punctuation."""
+    return re.sub(r"\s+", " ", query.lower()).strip().rstrip("?.!").strip()
+
+
+class RefinementCache:
+    """
+    Memoizes LLM query refinements, keyed by the normalized question and a
+    fingerprint of the model and prompt (so changing either invalidates
+    old entries).
+
+    Entries live in an in-memory LRU map capped at `max_entries` and expire
+    after `ttl_seconds`. With a `db_path` they are also written through to
+    SQLite and loaded back on start, so restarts keep the cache warm.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (queries, created_at)
+        self._hits = 0
+        self._misses = 0
+        self._db = None
+
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS refinements ("
+                "key TEXT PRIMARY KEY, queries TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM refinements WHERE created_at < ?", (time.time() - ttl_seconds,))
+            rows = self._db.execute(
+                "SELECT key, queries, created_at FROM refinements ORDER BY created_at DESC LIMIT ?", (max_entries,)
+            ).fetchall()
+            for key, queries, created_at in reversed(rows):
+                self._entries[key] = (json.loads(queries), created_at)
+
+    @staticmethod
+    def make_key(query: str, fingerprint: str) -> str:
+        return hashlib.sha256(f"{fingerprint}\x1f{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] > self.ttl_seconds:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return list(entry[0])
+
+    def put(self, key: str, queries: List[str]):
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (list(queries), now)
+            self._entries.move_to_end(key)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO refinements (key, queries, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(queries), now),
+                )
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: str):
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM refinements WHERE key = ?", (key,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / lookups) if lookups else 0.0,
+                "entries": len(self._entries),
+            }
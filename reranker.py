@@ -0,0 +1,100 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Tuple
+
+from refinement_cache import normalize_query
+
+
+class RerankEngine:
+    """
+    Cross-encoder re-ranking with a (query, point id) score cache.
+
+    Point IDs are derived from chunk content at ingestion, so a cached score
+    stays valid for as long as the point exists. Docs without an ID are
+    cached under a hash of their text instead. Inputs are truncated to the
+    model's `max_length` tokens by the CrossEncoder itself and scored in
+    `batch_size` pairs per forward pass.
+
+    Modes:
+    - "full": every fused candidate is scored (misses only).
+    - "cascade": only the top `cascade_top_m` fused candidates are scored, and
+      the cross-encoder is skipped entirely when the fused (RRF) score gap
+      after position top_k is at least `skip_margin` of the top score, i.e.
+      the selection is already decisive.
+    """
+
+    def __init__(self, model, model_name: str, mode: str = "full", batch_size: int = 32,
+                 cascade_top_m: int = 30, skip_margin: float = 0.2, cache_max_entries: int = 50_000):
+        self.model = model
+        self.model_name = model_name
+        self.mode = mode
+        self.batch_size = batch_size
+        self.cascade_top_m = cascade_top_m
+        self.skip_margin = skip_margin
+        self.cache_max_entries = cache_max_entries
+        self._lock = threading.Lock()
+        self._scores: "OrderedDict[tuple, float]" = OrderedDict()
+
+    @staticmethod
+    def _doc_key(d: Dict):
+        if d.get("id") is not None:
+            return d.get("collection"), d["id"]
+        return None, "sha256:" + hashlib.sha256(d["chunk"].encode("utf-8")).hexdigest()
+
+    def _decisive(self, docs: List[Dict], top_k: int) -> bool:
+        if len(docs) <= top_k or not docs[0]["score"]:
+            return False
+        return (docs[top_k - 1]["score"] - docs[top_k]["score"]) / docs[0]["score"] >= self.skip_margin
+
+    def _cached_scores(self, keys: List[tuple]) -> Dict[tuple, float]:
+        with self._lock:
+            found = {k: self._scores[k] for k in keys if k in self._scores}
+            for key in found:
+                self._scores.move_to_end(key)
+        return found
+
+    def _store_scores(self, scores: Dict[tuple, float]):
+        with self._lock:
+            self._scores.update(scores)
+            while len(self._scores) > self.cache_max_entries:
+                self._scores.popitem(last=False)
+
+    def rerank(self, query: str, docs: List[Dict], top_k: int) -> Tuple[List[Dict], Dict]:
+        """
+        Re-ranks fused docs (sorted by fused score, best first).
+        Returns (top_k docs, stats) where stats holds the mode actually used,
+        the number of pairs scored by the model and cache hits.
+        """
+        start = time.time()
+        stats = {"rerank_mode": self.mode, "rerank_pairs_scored": 0, "rerank_cache_hits": 0}
+
+        candidates = docs
+        if self.mode == "cascade":
+            if self._decisive(docs, top_k):
+                stats["rerank_mode"] = "skipped"
+                stats["rerank_ms"] = (time.time() - start) * 1000
+                return docs[:top_k], stats
+            candidates = docs[:max(self.cascade_top_m, top_k)]
+
+        query_key = normalize_query(query)
+        keys = [(self.model_name, query_key, *self._doc_key(d)) for d in candidates]
+        scores = self._cached_scores(keys)
+        stats["rerank_cache_hits"] = len(scores)
+
+        missing = [(key, d) for key, d in zip(keys, candidates) if key not in scores]
+        if missing:
+            predicted = self.model.predict(
+                [[query, d["chunk"]] for _, d in missing], batch_size=self.batch_size
+            )
+            new_scores = {key: float(score) for (key, _), score in zip(missing, predicted)}
+            self._store_scores(new_scores)
+            scores.update(new_scores)
+            stats["rerank_pairs_scored"] = len(missing)
+
+        for key, d in zip(keys, candidates):
+            d["score"] = scores[key]
+        ranked_docs = sorted(candidates, key=lambda x: x["score"], reverse=True)
+        stats["rerank_ms"] = (time.time() - start) * 1000
+        return ranked_docs[:top_k], stats
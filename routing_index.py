@@ -0,0 +1,172 @@
+import uuid
+from typing import List, Dict, Iterable, Optional
+
+import numpy as np
+from qdrant_client import models
+
+import config
+
+# Namespace for routing point IDs (uuid5 of collection, level, act and section)
+ROUTING_ID_NAMESPACE = uuid.UUID("b3e0a7c4-1d2f-5e6a-8b9c-0d1e2f3a4b5c")
+# Act name of files without a detected act: a mix of unrelated documents, never a routing target
+FALLBACK_ACT_NAME = "General Document"
+
+
+def routing_collection_for(collection_name: str) -> str:
+    return f"{collection_name}{config.ROUTING_COLLECTION_SUFFIX}"
+
+
+def ensure_routing_collection(client, collection_name: str) -> str:
+    """Creates the small act/section routing collection (dense vectors only)."""
+    routing_collection = routing_collection_for(collection_name)
+    if not client.collection_exists(collection_name=routing_collection):
+        client.create_collection(
+            collection_name=routing_collection,
+            vectors_config={
+                config.DENSE_VECTOR_NAME: models.VectorParams(size=config.VECTOR_SIZE, distance=models.Distance.COSINE)
+            },
+        )
+        client.create_payload_index(routing_collection, "level", models.PayloadSchemaType.KEYWORD)
+        client.create_payload_index(routing_collection, "legal_act_name", models.PayloadSchemaType.KEYWORD)
+        client.create_payload_index(routing_collection, "source_files", models.PayloadSchemaType.KEYWORD)
+    return routing_collection
+
+
+def _scroll_all(client, collection_name: str, scroll_filter: models.Filter, with_vectors, with_payload) -> Iterable:
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=scroll_filter,
+            limit=1000,
+            offset=offset,
+            with_payload=with_payload,
+            with_vectors=with_vectors,
+        )
+        yield from records
+        if offset is None:
+            break
+
+
+def _routing_point(collection_name: str, level: str, act: str, section: Optional[str], entry: dict) -> models.PointStruct:
+    centroid = entry["sum"] / max(1, entry["count"])
+    norm = np.linalg.norm(centroid)
+    key = f"{collection_name}\x1f{level}\x1f{act}\x1f{section or ''}"
+    return models.PointStruct(
+        id=str(uuid.uuid5(ROUTING_ID_NAMESPACE, key)),
+        vector={config.DENSE_VECTOR_NAME: (centroid / norm if norm else centroid).tolist()},
+        payload={
+            "level": level,
+            "legal_act_name": act,
+            "section_name": section,
+            "source_files": sorted(entry["source_files"]),
+            "chunk_count": entry["count"],
+        },
+    )
+
+
+def rebuild_routing_entries(client, collection_name: str, source_files: List[str]) -> int:
+    """
+    Recomputes the act- and section-level summary vectors (centroids of the
+    chunk dense vectors) of every act touched by `source_files`, including
+    acts those files contained before re-ingestion. Rebuilds of the same
+    collection are serialized (a lock row in the ID allocator database), so
+    concurrent ingestions never interleave their delete and upload. Returns
+    the number of routing points written.
+    """
+    if not source_files:
+        return 0
+    with config.get_id_allocator().lock(
+        collection_name, "routing", timeout_s=config.ROUTING_LOCK_TIMEOUT_S, stale_after_s=config.ROUTING_LOCK_STALE_S
+    ):
+        return _rebuild_routing_entries(client, collection_name, source_files)
+
+
+def _rebuild_routing_entries(client, collection_name: str, source_files: List[str]) -> int:
+    routing_collection = ensure_routing_collection(client, collection_name)
+    by_source = models.Filter(must=[models.FieldCondition(key="source_file", match=models.MatchAny(any=source_files))])
+
+    # 1. Acts to recompute: those in the files now, and those routed to them before
+    acts = {
+        (r.payload or {}).get("legal_act_name")
+        for r in _scroll_all(client, collection_name, by_source, False, ["legal_act_name"])
+    }
+    stale_filter = models.Filter(must=[models.FieldCondition(key="source_files", match=models.MatchAny(any=source_files))])
+    acts |= {
+        (r.payload or {}).get("legal_act_name")
+        for r in _scroll_all(client, routing_collection, stale_filter, False, ["legal_act_name"])
+    }
+    acts = sorted(a for a in acts if a and a != FALLBACK_ACT_NAME)
+    if not acts:
+        return 0
+
+    # 2. Accumulate chunk vectors per act and per (act, section)
+    by_act = models.Filter(must=[models.FieldCondition(key="legal_act_name", match=models.MatchAny(any=acts))])
+    act_entries: Dict[str, dict] = {}
+    section_entries: Dict[tuple, dict] = {}
+    for record in _scroll_all(
+        client, collection_name, by_act, [config.DENSE_VECTOR_NAME], ["legal_act_name", "section_name", "source_file"]
+    ):
+        vector = (record.vector or {}).get(config.DENSE_VECTOR_NAME)
+        if vector is None:
+            continue
+        vector = np.asarray(vector, dtype=np.float32)
+        payload = record.payload or {}
+        act = payload.get("legal_act_name")
+        keys = [(act_entries, act)]
+        if payload.get("section_name"):
+            keys.append((section_entries, (act, payload["section_name"])))
+        for entries, key in keys:
+            entry = entries.setdefault(key, {"sum": np.zeros_like(vector), "count": 0, "source_files": set()})
+            entry["sum"] += vector
+            entry["count"] += 1
+            entry["source_files"].add(payload.get("source_file"))
+
+    # 3. Replace the routing points of those acts (and drop any fallback-act entries)
+    client.delete(
+        collection_name=routing_collection,
+        points_selector=models.FilterSelector(filter=models.Filter(
+            must=[models.FieldCondition(key="legal_act_name", match=models.MatchAny(any=acts + [FALLBACK_ACT_NAME]))]
+        )),
+        wait=True,
+    )
+    points = [_routing_point(collection_name, "act", act, None, e) for act, e in act_entries.items()]
+    points += [_routing_point(collection_name, "section", act, section, e) for (act, section), e in section_entries.items()]
+    if points:
+        client.upload_points(collection_name=routing_collection, points=points, batch_size=config.UPSERT_BATCH_SIZE, wait=True)
+    return len(points)
+
+
+def route_acts(client, collection_name: str, query_vector: List[float], top_acts: int) -> List[str]:
+    """
+    Route stage: searches act and section summaries and returns the names
+    of the `top_acts` best matching acts (best first).
+    """
+    response = client.query_points(
+        collection_name=routing_collection_for(collection_name),
+        query=query_vector,
+        using=config.DENSE_VECTOR_NAME,
+        limit=top_acts * 4,
+        with_payload=["legal_act_name"],
+    )
+    acts = []
+    for point in response.points:
+        act = (point.payload or {}).get("legal_act_name")
+        if act and act != FALLBACK_ACT_NAME and act not in acts:
+            acts.append(act)
+        if len(acts) == top_acts:
+            break
+    return acts
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the act/section routing index of an existing collection.")
+    parser.add_argument("--collection", default=config.COLLECTION_NAME)
+    args = parser.parse_args()
+
+    qdrant = config.get_qdrant_client()
+    facets = qdrant.facet(collection_name=args.collection, key="source_file", limit=100_000)
+    written = rebuild_routing_entries(qdrant, args.collection, [str(hit.value) for hit in facets.hits])
+    print(f"Wrote {written} routing points to {routing_collection_for(args.collection)}")
@@ -0,0 +1,110 @@
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    docs: List[Dict[str, Any]]
+    refined_queries: List[str]
+    created_at: float = field(default_factory=time.time)
+
+
+class _CollectionBucket:
+    """Entries of one collection, valid for a single ingestion generation."""
+
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()  # LRU order
+        self.vectors: Dict[int, np.ndarray] = {}
+        self.constraints: Dict[int, str] = {}
+        self.next_key = 0
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed by the query embedding, scoped per collection.
+
+    A lookup hits when a cached query has cosine similarity >= `threshold`
+    and exactly the same `constraints` (e.g. the act names, sections and
+    years extracted from the question).
+    Entries expire after `ttl_seconds`, the least recently used entry is
+    evicted beyond `max_entries` per collection, and a collection's entries
+    are dropped as soon as its ingestion generation changes (re-ingest).
+    """
+
+    def __init__(self, threshold: float, max_entries: int, ttl_seconds: float):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, _CollectionBucket] = {}
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _bucket(self, collection_name: str, generation: int) -> _CollectionBucket:
+        bucket = self._buckets.get(collection_name)
+        if bucket is None or bucket.generation != generation:
+            bucket = _CollectionBucket(generation)
+            self._buckets[collection_name] = bucket
+        return bucket
+
+    def lookup(self, collection_name: str, query_vector, generation: int, constraints: str = "") -> Optional[CachedAnswer]:
+        query = self._normalize(query_vector)
+        now = time.time()
+        with self._lock:
+            bucket = self._bucket(collection_name, generation)
+            expired = [k for k, e in bucket.entries.items() if now - e.created_at > self.ttl_seconds]
+            for key in expired:
+                del bucket.entries[key]
+                del bucket.vectors[key]
+                del bucket.constraints[key]
+
+            best_key, best_score = None, self.threshold
+            keys = [k for k, c in bucket.constraints.items() if c == constraints]
+            if keys:
+                scores = np.stack([bucket.vectors[k] for k in keys]) @ query
+                idx = int(np.argmax(scores))
+                if scores[idx] >= best_score:
+                    best_key = keys[idx]
+
+            if best_key is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            bucket.entries.move_to_end(best_key)
+            return bucket.entries[best_key]
+
+    def store(self, collection_name: str, query_vector, generation: int, answer: CachedAnswer, constraints: str = ""):
+        with self._lock:
+            bucket = self._bucket(collection_name, generation)
+            key = bucket.next_key
+            bucket.next_key += 1
+            bucket.entries[key] = answer
+            bucket.vectors[key] = self._normalize(query_vector)
+            bucket.constraints[key] = constraints
+            while len(bucket.entries) > self.max_entries:
+                old_key, _ = bucket.entries.popitem(last=False)
+                del bucket.vectors[old_key]
+                del bucket.constraints[old_key]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / lookups) if lookups else 0.0,
+                "entries": sum(len(b.entries) for b in self._buckets.values()),
+            }
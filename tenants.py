@@ -0,0 +1,207 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from typing import Optional, Dict
+
+from qdrant_client import models
+
+import config
+from query_understanding import merge_filters
+
+# In-memory copy of the registry, {(collection, tenant_id): dedicated collection};
+# reloaded after TENANT_REGISTRY_TTL_S (migrations by other processes) and
+# right after a migration in this process
+_REGISTRY: Optional[Dict[tuple, str]] = None
+_REGISTRY_LOADED_AT = 0.0
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    """Opens the registry of tenants moved to dedicated collections (created on first use)."""
+    os.makedirs(os.path.dirname(config.TENANT_DB) or ".", exist_ok=True)
+    conn = sqlite3.connect(config.TENANT_DB, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS dedicated_tenants ("
+        "collection TEXT NOT NULL, tenant_id TEXT NOT NULL, dedicated_collection TEXT NOT NULL, "
+        "PRIMARY KEY (collection, tenant_id))"
+    )
+    return conn
+
+
+def _registry() -> Dict[tuple, str]:
+    global _REGISTRY, _REGISTRY_LOADED_AT
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None or time.time() - _REGISTRY_LOADED_AT > config.TENANT_REGISTRY_TTL_S:
+            conn = _connect()
+            try:
+                rows = conn.execute("SELECT collection, tenant_id, dedicated_collection FROM dedicated_tenants").fetchall()
+            finally:
+                conn.close()
+            _REGISTRY = {(collection, tenant_id): dedicated for collection, tenant_id, dedicated in rows}
+            _REGISTRY_LOADED_AT = time.time()
+        return _REGISTRY
+
+
+def _invalidate_registry():
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        _REGISTRY = None
+
+
+def dedicated_collections() -> Dict[str, str]:
+    """{dedicated collection: shared collection it was moved out of}."""
+    return {dedicated: collection for (collection, _), dedicated in _registry().items()}
+
+
+def base_collection(collection_name: str) -> str:
+    """The shared collection a dedicated tenant collection belongs to (itself otherwise)."""
+    if "__tenant_" not in collection_name:
+        return collection_name
+    return dedicated_collections().get(collection_name, collection_name)
+
+
+def requires_tenant(collection_name: str) -> bool:
+    """Whether every read and write on the collection must be scoped to one tenant."""
+    return base_collection(collection_name) in config.TENANT_COLLECTIONS
+
+
+def resolve_collection(collection_name: str, tenant_id: Optional[str]) -> str:
+    """The tenant's dedicated collection if it was moved out of `collection_name`, else the collection itself."""
+    if not tenant_id or collection_name not in config.TENANT_COLLECTIONS:
+        return collection_name
+    return _registry().get((collection_name, tenant_id), collection_name)
+
+
+def tenant_filter(tenant_id: str) -> models.Filter:
+    return models.Filter(
+        must=[models.FieldCondition(key=config.TENANT_FIELD, match=models.MatchValue(value=tenant_id))]
+    )
+
+
+def scope_filter(collection_name: str, tenant_id: Optional[str], query_filter: models.Filter = None) -> Optional[models.Filter]:
+    """
+    Adds the tenant condition to `query_filter` on tenant-partitioned
+    collections. Raises ValueError if such a collection is used without a tenant.
+    """
+    if not requires_tenant(collection_name):
+        return query_filter
+    if not tenant_id:
+        raise ValueError(f"Collection '{collection_name}' is partitioned by tenant; a tenant_id is required.")
+    return merge_filters(query_filter, tenant_filter(tenant_id))
+
+
+def ensure_tenant_index(client, collection_name: str):
+    """
+    Tenant-optimized keyword index: Qdrant co-locates each tenant's points
+    and builds per-tenant HNSW links, so a scoped search only touches that
+    tenant's data.
+    """
+    client.create_payload_index(
+        collection_name,
+        config.TENANT_FIELD,
+        models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True),
+    )
+
+
+def tag_untagged_points(client, collection_name: str, tenant_id: str):
+    """Assigns points ingested before multi-tenancy (no tenant id) to `tenant_id`."""
+    ensure_tenant_index(client, collection_name)
+    client.set_payload(
+        collection_name=collection_name,
+        payload={config.TENANT_FIELD: tenant_id},
+        points=models.Filter(must=[models.IsEmptyCondition(is_empty=models.PayloadField(key=config.TENANT_FIELD))]),
+        wait=True,
+    )
+    config.bump_collection_generation(collection_name)
+
+
+def dedicated_collection_name(collection_name: str, tenant_id: str) -> str:
+    return f"{collection_name}__tenant_{re.sub(r'[^A-Za-z0-9_-]+', '_', tenant_id)}"
+
+
+def migrate_tenant(client, collection_name: str, tenant_id: str) -> int:
+    """
+    Moves a (large) tenant out of a shared collection into its own:
+    1. creates the dedicated collection (same profile and indexes),
+    2. copies the tenant's points with their vectors and payloads,
+    3. registers the collection, so searches and ingestion switch to it,
+    4. deletes the tenant's points from the shared collection.
+    Pause the tenant's ingestion jobs while this runs. Returns the number of
+    points moved.
+    """
+    # Imported here: ingestion_pipeline itself depends on this module
+    from ingestion_pipeline import ensure_collection
+
+    if collection_name not in config.TENANT_COLLECTIONS:
+        raise ValueError(f"Collection '{collection_name}' is not partitioned by tenant.")
+    dedicated = dedicated_collection_name(collection_name, tenant_id)
+    ensure_collection(client, dedicated)
+    ensure_tenant_index(client, dedicated)
+
+    # 1. Copy (point IDs are kept, so a re-run overwrites instead of duplicating)
+    scoped = tenant_filter(tenant_id)
+    moved = 0
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=scoped,
+            limit=config.UPSERT_BATCH_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if records:
+            client.upload_points(
+                collection_name=dedicated,
+                points=[models.PointStruct(id=r.id, vector=r.vector, payload=r.payload) for r in records],
+                batch_size=config.UPSERT_BATCH_SIZE,
+                wait=True,
+            )
+            moved += len(records)
+        if offset is None:
+            break
+
+    copied = client.count(collection_name=dedicated, count_filter=scoped, exact=True).count
+    if copied < moved:
+        raise RuntimeError(f"Only {copied} of {moved} points reached '{dedicated}'; the shared collection was left as is.")
+
+    # 2. Switch reads and writes over, then drop the shared copy
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO dedicated_tenants (collection, tenant_id, dedicated_collection) VALUES (?, ?, ?)",
+            (collection_name, tenant_id, dedicated),
+        )
+    finally:
+        conn.close()
+    _invalidate_registry()
+    client.delete(collection_name=collection_name, points_selector=models.FilterSelector(filter=scoped), wait=True)
+
+    config.bump_collection_generation(collection_name)
+    config.bump_collection_generation(dedicated)
+    logging.info(f"Moved {moved} points of tenant '{tenant_id}' from {collection_name} to {dedicated}")
+    return moved
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Move a tenant out of a shared collection into a dedicated one.")
+    parser.add_argument("tenant_id")
+    parser.add_argument("--collection", default=config.ORGANIZATION_COLLECTION_NAME)
+    parser.add_argument("--tag-untagged", action="store_true",
+                        help="Instead of moving, assign points without a tenant id to this tenant")
+    args = parser.parse_args()
+
+    qdrant = config.get_qdrant_client()
+    if args.tag_untagged:
+        tag_untagged_points(qdrant, args.collection, args.tenant_id)
+        print(f"Assigned untagged points of {args.collection} to tenant '{args.tenant_id}'")
+    else:
+        moved = migrate_tenant(qdrant, args.collection, args.tenant_id)
+        print(f"Moved {moved} points to {dedicated_collection_name(args.collection, args.tenant_id)}")
@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The modules live at the repository root (no package install)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Modules that import config keep their on-disk state out of the working tree
+os.environ.setdefault("KANUN_DATA_DIR", tempfile.mkdtemp(prefix="kanun_test_"))
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+
+def pytest_addoption(parser):
+    parser.addoption("--run-models", action="store_true",
+                     help="run tests that download and load the ONNX and PyTorch models")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "models: needs downloaded models (run with --run-models)")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-models"):
+        return
+    skip = pytest.mark.skip(reason="needs downloaded models; run with --run-models")
+    for item in items:
+        if "models" in item.keywords:
+            item.add_marker(skip)
+
+
+def pytest_report_header(config):
+    if not config.getoption("--run-models"):
+        return "model parity tests skipped (run with --run-models)"
@@ -0,0 +1,46 @@
+from context_packer import merge_adjacent
+
+OVERLAP = "the licensing authority may suspend the licence"
+
+
+def _doc(file_chunk_id, chunk, score=0.5, source_file="act.pdf", page=1, collection="acts"):
+    return {
+        "chunk": chunk, "score": score, "source_file": source_file, "file_chunk_id": file_chunk_id,
+        "page_number": page, "legal_act_name": "Test Act", "collection": collection,
+    }
+
+
+def test_adjacent_chunks_merge_without_repeated_overlap():
+    first = f"Section 5. Any person operating without approval is liable, and {OVERLAP}"
+    second = f"{OVERLAP} for up to one year."
+    spans = merge_adjacent([_doc(1, second, 0.9, page=2), _doc(0, first, 0.4, page=1)])
+
+    assert len(spans) == 1
+    span = spans[0]
+    assert span.text == f"{first} for up to one year."
+    assert span.text.count(OVERLAP) == 1
+    assert span.chunk_ids == [0, 1]
+    assert span.score == 0.9
+    assert span.citation == "[Source: Test Act, Page 1-2]"
+
+
+def test_short_coincidental_overlap_is_kept():
+    spans = merge_adjacent([_doc(0, "ends with the act"), _doc(1, "the act begins")])
+    assert spans[0].text == "ends with the actthe act begins"
+
+
+def test_gaps_sources_and_collections_stay_separate():
+    spans = merge_adjacent([
+        _doc(0, "a", 0.1),
+        _doc(2, "c", 0.3),
+        _doc(1, "b", 0.2, source_file="other.pdf"),
+        _doc(1, "b", 0.4, collection="rules"),
+    ])
+    assert len(spans) == 4
+    assert [s.score for s in spans] == [0.4, 0.3, 0.2, 0.1]
+
+
+def test_docs_without_position_are_kept_alone():
+    spans = merge_adjacent([{"chunk": "loose", "score": 0.2, "page_number": 3}, _doc(0, "placed", 0.1)])
+    assert [s.text for s in spans] == ["loose", "placed"]
+    assert spans[0].chunk_ids == []
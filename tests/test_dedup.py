@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from dedup import MinHashLSH
+
+WORDS = (
+    "act section person authority licence court government order notice fine year punishment "
+    "offence provision rule committee office application register record duty right"
+).split()
+
+
+def _passage(rng, length=120):
+    return " ".join(rng.choice(WORDS) + str(rng.randrange(50)) for _ in range(length))
+
+
+def _near_duplicate(rng, text, edits=2):
+    words = text.split()
+    for _ in range(edits):
+        words[rng.randrange(len(words))] = "changed"
+    return " ".join(words)
+
+
+def test_near_duplicates_are_found():
+    rng = random.Random(0)
+    index = MinHashLSH(threshold=0.85, num_perm=128, bands=16, shingle_size=3)
+    originals = [_passage(rng) for _ in range(50)]
+    for n, text in enumerate(originals):
+        index.insert(f"doc-{n}", index.signature(text))
+
+    found = sum(
+        index.query(index.signature(_near_duplicate(rng, text))) == f"doc-{n}"
+        for n, text in enumerate(originals)
+    )
+    assert found >= 48
+
+
+def test_distinct_texts_are_not_matched():
+    rng = random.Random(1)
+    index = MinHashLSH(threshold=0.85)
+    for n in range(50):
+        index.insert(f"doc-{n}", index.signature(_passage(rng)))
+
+    assert all(index.query(index.signature(_passage(rng))) is None for _ in range(50))
+
+
+def test_exact_duplicate_and_whitespace():
+    index = MinHashLSH()
+    index.insert("a", index.signature("Preamble: Whereas it is expedient to amend the law."))
+    assert index.query(index.signature("preamble:  whereas it is expedient\nto amend the law.")) == "a"
+    assert len(index) == 1
+
+
+def test_bands_must_divide_permutations():
+    with pytest.raises(ValueError):
+        MinHashLSH(num_perm=100, bands=16)
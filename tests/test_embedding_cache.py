@@ -0,0 +1,98 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+pytest.importorskip("fastembed")
+from fastembed import SparseEmbedding
+
+from embedding_cache import CachedDenseEmbeddings, EmbeddingCache
+
+MODEL = "test/dense"
+DIM = 4
+
+
+def _vector(n):
+    return [float(n)] * DIM
+
+
+def test_dense_round_trip_and_hit_rate(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=10)
+    cache.put_dense(MODEL, ["a", "b"], [_vector(1), _vector(2)])
+    assert cache.get_dense(MODEL, ["b", "c", "a"], DIM) == [_vector(2), None, _vector(1)]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=2)
+    cache.put_dense(MODEL, ["a"], [_vector(1)])
+    cache.put_dense(MODEL, ["b"], [_vector(2)])
+    cache.get_dense(MODEL, ["a"], DIM)  # "b" is now the least recently used
+    cache.put_dense(MODEL, ["c"], [_vector(3)])
+    assert cache.get_dense(MODEL, ["a", "b", "c"], DIM) == [_vector(1), None, _vector(3)]
+
+
+def test_reader_never_gets_a_reused_slot(tmp_path):
+    reader = EmbeddingCache(str(tmp_path), max_entries=1)
+    writer = EmbeddingCache(str(tmp_path), max_entries=1)
+    reader.put_dense(MODEL, ["a"], [_vector(1)])
+    reader.get_dense(MODEL, ["a"], DIM)
+
+    # Another process reuses the slot but has not committed its index change yet
+    vectors, tags = writer._store(MODEL, DIM)
+    tags[0] = 0
+    vectors[0] = _vector(9)
+    assert reader.get_dense(MODEL, ["a"], DIM) == [None]
+
+    # ... or commits it: "a" is gone, the slot belongs to "b"
+    writer.put_dense(MODEL, ["b"], [_vector(2)])
+    assert reader.get_dense(MODEL, ["a", "b"], DIM) == [None, _vector(2)]
+
+
+def test_rolled_back_write_is_not_served(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=1)
+    cache.put_dense(MODEL, ["a"], [_vector(1)])
+    with pytest.raises(ValueError):
+        # The second vector fails after "b" already took over the slot of "a"
+        cache.put_dense(MODEL, ["b", "c"], [_vector(2), [1.0, 2.0]])
+    assert cache.get_dense(MODEL, ["a", "b"], DIM) == [None, None]
+
+
+def _open_and_write(cache_dir, n):
+    EmbeddingCache(cache_dir, max_entries=8).put_dense(MODEL, [f"text {n}"], [_vector(n)])
+
+
+def test_concurrent_first_use_keeps_every_vector(tmp_path):
+    processes = [multiprocessing.Process(target=_open_and_write, args=(str(tmp_path), n)) for n in range(4)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    cache = EmbeddingCache(str(tmp_path), max_entries=8)
+    assert cache.get_dense(MODEL, [f"text {n}" for n in range(4)], DIM) == [_vector(n) for n in range(4)]
+
+
+def test_sparse_round_trip_and_cap(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=2)
+    for n, text in enumerate(["a", "b", "c"]):
+        cache.put_sparse("test/sparse", [text], [SparseEmbedding(values=np.array([n + 0.5]), indices=np.array([n]))])
+    a, b, c = cache.get_sparse("test/sparse", ["a", "b", "c"])
+    assert a is None
+    assert b.indices.tolist() == [1] and c.values.tolist() == [2.5]
+
+
+def test_cached_embedder_only_embeds_misses(tmp_path):
+    class _Model:
+        calls = []
+
+        def embed_documents(self, texts):
+            self.calls.append(list(texts))
+            return [_vector(len(t)) for t in texts]
+
+    model = _Model()
+    embedder = CachedDenseEmbeddings(model, MODEL, EmbeddingCache(str(tmp_path), max_entries=10), DIM)
+    assert embedder.embed_documents(["x", "yy", "x"]) == [_vector(1), _vector(2), _vector(1)]
+    assert embedder.embed_documents(["yy", "zzz"]) == [_vector(2), _vector(3)]
+    assert model.calls == [["x", "yy"], ["zzz"]]
@@ -0,0 +1,60 @@
+import pytest
+
+from fusion import fuse
+
+
+def _doc(point_id, score=0.0, collection="acts"):
+    return {"id": point_id, "collection": collection, "chunk": f"chunk {point_id}", "score": score}
+
+
+def test_rrf_sums_reciprocal_ranks():
+    fused = fuse([[_doc(1), _doc(2)], [_doc(2), _doc(3)]], method="rrf", k=60)
+    scores = {d["id"]: d["score"] for d in fused}
+    assert [d["id"] for d in fused] == [2, 1, 3]
+    assert scores[2] == pytest.approx(1 / 62 + 1 / 61)
+    assert scores[1] == pytest.approx(1 / 61)
+    assert scores[3] == pytest.approx(1 / 62)
+
+
+def test_rrf_keys_points_by_collection():
+    fused = fuse([[_doc(1, collection="acts")], [_doc(1, collection="rules")]], method="rrf")
+    assert len(fused) == 2
+
+
+def test_weights_follow_their_result_list():
+    # Empty lists are skipped; the weights must still line up with the non-empty ones
+    fused = fuse([[], [_doc(1)], [_doc(2)]], method="rrf", weights=[10.0, 1.0, 3.0], k=0)
+    assert [d["id"] for d in fused] == [2, 1]
+    assert fused[0]["score"] == pytest.approx(3.0)
+    assert fused[1]["score"] == pytest.approx(1.0)
+
+
+def test_weights_length_mismatch_raises():
+    with pytest.raises(ValueError):
+        fuse([[_doc(1)], [_doc(2)]], weights=[1.0])
+
+
+def test_dbsf_normalizes_each_source():
+    # Raw scores on very different scales contribute equally after normalization
+    dense = [_doc(1, 0.9), _doc(2, 0.5), _doc(3, 0.1)]
+    sparse = [_doc(3, 30.0), _doc(2, 20.0), _doc(1, 10.0)]
+    fused = fuse([dense, sparse], method="dbsf")
+    scores = {d["id"]: d["score"] for d in fused}
+    assert scores[1] == pytest.approx(scores[3])
+    assert scores[2] == pytest.approx(1.0)
+
+
+def test_minmax_scores_are_bounded():
+    fused = fuse([[_doc(1, 5.0), _doc(2, 1.0)]], method="minmax")
+    assert [d["score"] for d in fused] == [pytest.approx(1.0), pytest.approx(0.0)]
+
+
+def test_inputs_are_not_modified():
+    docs = [_doc(1, 0.7)]
+    fuse([docs], method="dbsf")
+    assert docs[0]["score"] == 0.7
+
+
+def test_unknown_method_raises():
+    with pytest.raises(ValueError):
+        fuse([[_doc(1)]], method="borda")
@@ -0,0 +1,123 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from id_allocator import IdAllocator
+
+RESERVES = 50
+BLOCK = 7
+
+
+def _reserve_many(db_path, results, sequence="chunk_seq"):
+    allocator = IdAllocator(db_path)
+    for _ in range(RESERVES):
+        results.append(allocator.reserve("acts", sequence, BLOCK))
+
+
+def _assert_disjoint(starts, expected_blocks):
+    assert len(starts) == expected_blocks
+    ids = [start + i for start in starts for i in range(BLOCK)]
+    assert len(set(ids)) == len(ids)
+    assert sorted(ids) == list(range(expected_blocks * BLOCK))
+
+
+def test_threads_get_disjoint_ranges(tmp_path):
+    allocator = IdAllocator(str(tmp_path / "ids.db"))
+    starts = []
+    lock = threading.Lock()
+
+    def _worker():
+        for _ in range(RESERVES):
+            start = allocator.reserve("acts", "chunk_seq", BLOCK)
+            with lock:
+                starts.append(start)
+
+    threads = [threading.Thread(target=_worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    _assert_disjoint(starts, 8 * RESERVES)
+
+
+def test_processes_get_disjoint_ranges(tmp_path):
+    db_path = str(tmp_path / "ids.db")
+    with multiprocessing.Manager() as manager:
+        results = manager.list()
+        processes = [multiprocessing.Process(target=_reserve_many, args=(db_path, results)) for _ in range(4)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+        assert all(p.exitcode == 0 for p in processes)
+        _assert_disjoint(list(results), 4 * RESERVES)
+
+
+def test_seed_only_used_for_new_sequences(tmp_path):
+    allocator = IdAllocator(str(tmp_path / "ids.db"))
+    calls = []
+
+    def _seed():
+        calls.append(1)
+        return 100
+
+    assert allocator.reserve("acts", "global_chunk_id", 3, seed=_seed) == 100
+    assert allocator.reserve("acts", "global_chunk_id", 1, seed=_seed) == 103
+    assert calls == [1]
+    assert allocator.peek("acts", "global_chunk_id") == 104
+    assert allocator.peek("rules", "global_chunk_id") == 0
+
+    allocator.reset("acts")
+    assert allocator.peek("acts", "global_chunk_id") == 0
+
+
+def test_lock_serializes_holders(tmp_path):
+    db_path = str(tmp_path / "ids.db")
+    inside, overlaps = [], []
+
+    def _worker():
+        # One allocator (connection) per thread, as separate processes would have
+        allocator = IdAllocator(db_path)
+        for _ in range(5):
+            with allocator.lock("acts", "routing", poll_s=0.01):
+                if inside:
+                    overlaps.append(1)
+                inside.append(1)
+                time.sleep(0.005)
+                inside.pop()
+
+    threads = [threading.Thread(target=_worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not overlaps
+
+
+def test_lock_times_out_and_stale_lock_is_taken_over(tmp_path):
+    db_path = str(tmp_path / "ids.db")
+    holder, waiter = IdAllocator(db_path), IdAllocator(db_path)
+    with holder.lock("acts", "routing"):
+        with pytest.raises(TimeoutError):
+            with waiter.lock("acts", "routing", timeout_s=0.05, poll_s=0.01):
+                pass
+        with waiter.lock("acts", "routing", stale_after_s=0.0):
+            pass
+    with waiter.lock("acts", "routing", timeout_s=0.0):
+        pass
+
+
+def test_reset_keeps_the_generation(tmp_path):
+    allocator = IdAllocator(str(tmp_path / "ids.db"))
+    allocator.reserve("acts", "global_chunk_id", 10)
+    allocator.reserve("acts", "generation", 1)
+    allocator.reserve("acts", "generation", 1)
+
+    allocator.reset("acts")
+    assert allocator.peek("acts", "global_chunk_id") == 0
+    assert allocator.peek("acts", "generation") == 2
+
+    allocator.reset("acts", keep=())
+    assert allocator.peek("acts", "generation") == 0
@@ -0,0 +1,34 @@
+import pytest
+
+from inference_backends import _kendall_tau
+
+
+def test_kendall_tau():
+    assert _kendall_tau([3, 2, 1], [30, 20, 10]) == 1.0
+    assert _kendall_tau([3, 2, 1], [10, 20, 30]) == -1.0
+    assert _kendall_tau([1], [1]) == 1.0
+
+
+def test_quantized_models_are_registered():
+    fastembed = pytest.importorskip("fastembed")
+    from fastembed.rerank.cross_encoder import TextCrossEncoder
+    from inference_backends import QUANTIZED_MODELS, _register_quantized
+
+    dense, rerank = QUANTIZED_MODELS
+    for name, registry in ((dense, fastembed.TextEmbedding), (rerank, TextCrossEncoder)):
+        _register_quantized(name, registry)
+        _register_quantized(name, registry)  # idempotent
+        [description] = [m for m in registry.list_supported_models() if m["model"] == name]
+        assert description["model_file"] == "onnx/model_quantized.onnx"
+
+
+@pytest.mark.models
+def test_onnx_backends_match_pytorch_models():
+    # Opt-in (--run-models): downloads the int8 ONNX and the PyTorch models
+    pytest.importorskip("fastembed")
+    pytest.importorskip("sentence_transformers")
+    pytest.importorskip("langchain_huggingface")
+    pytest.importorskip("streamlit")
+    from inference_backends import check_parity
+
+    assert check_parity()
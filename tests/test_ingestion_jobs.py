@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+pytest.importorskip("streamlit")
+import config
+import ingestion_jobs
+
+
+@pytest.fixture(autouse=True)
+def _job_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "JOBS_DB", str(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(config, "JOBS_SPOOL_DIR", str(tmp_path / "uploads"))
+
+
+def _submit(source_name, collection="acts", tenant_id=None):
+    return ingestion_jobs.submit_job(b"%PDF", source_name, collection, tenant_id)
+
+
+def test_jobs_of_the_same_file_do_not_run_concurrently():
+    first = _submit("act.pdf")
+    second = _submit("act.pdf")
+    other = _submit("other.pdf")
+
+    assert ingestion_jobs._claim_next_job("w1")["id"] == first
+    # The second upload of act.pdf waits; other files are not held up
+    assert ingestion_jobs._claim_next_job("w2")["id"] == other
+    assert ingestion_jobs._claim_next_job("w3") is None
+
+    ingestion_jobs._update_job(first, status="done")
+    assert ingestion_jobs._claim_next_job("w3")["id"] == second
+
+
+def test_same_name_in_other_tenant_or_collection_is_independent():
+    first = _submit("act.pdf", tenant_id="a")
+    second = _submit("act.pdf", tenant_id="b")
+    third = _submit("act.pdf", collection="rules", tenant_id="a")
+    claimed = [ingestion_jobs._claim_next_job(f"w{n}")["id"] for n in range(3)]
+    assert claimed == [first, second, third]
+
+
+def test_stale_job_is_resumed(monkeypatch):
+    job_id = _submit("act.pdf")
+    ingestion_jobs._claim_next_job("crashed")
+    monkeypatch.setattr(config, "JOB_STALE_AFTER_S", -1)
+    job = ingestion_jobs._claim_next_job("w2")
+    assert job["id"] == job_id
+
+
+def test_worker_loop_returns_when_stopped():
+    stop = threading.Event()
+    worker = threading.Thread(target=ingestion_jobs.worker_main, args=("w", 1, stop))
+    worker.start()
+    stop.set()
+    worker.join(timeout=config.JOB_POLL_INTERVAL_S + 5)
+    assert not worker.is_alive()
@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("streamlit")
+from langchain_core.documents import Document
+
+import config
+from dedup import MinHashLSH
+from ingestion_pipeline import _FileState, _assign_point_ids
+
+PENALTY = (
+    "Any person who accesses a computer system without authorization, or causes damage to its data, "
+    "shall be punished with a fine of up to two hundred thousand rupees or imprisonment of up to three years, or both."
+)
+PREAMBLE = "Whereas it is expedient to make legal provisions for the authentication of electronic records."
+
+
+def _state():
+    return _FileState(
+        source_file="act.pdf", file_hash="h", existing={}, global_chunk_id=0,
+        dedup_index=MinHashLSH(
+            threshold=config.DEDUP_THRESHOLD, num_perm=config.DEDUP_NUM_PERM,
+            bands=config.DEDUP_BANDS, shingle_size=config.DEDUP_SHINGLE_SIZE,
+        ),
+    )
+
+
+def _chunks(*texts, page=1):
+    return [Document(page_content=t, metadata={"page_number": page, "legal_act_name": "Test Act"}) for t in texts]
+
+
+def test_repeated_chunk_is_dropped_and_its_page_recorded():
+    state, provenance = _state(), {}
+    first = _assign_point_ids(state, _chunks(PREAMBLE, PENALTY), provenance)
+    second = _assign_point_ids(state, _chunks(PREAMBLE.upper().replace(" ", "  "), page=7), provenance)
+
+    assert len(first) == 2 and second == []
+    assert state.duplicates == 1
+    survivor = provenance[first[0][0]]
+    assert survivor["pages"] == {1, 7} and survivor["duplicate_count"] == 1
+
+
+def test_clause_differing_in_one_word_is_kept():
+    state, provenance = _state(), {}
+    amended = PENALTY.replace("three years", "five years")
+    assigned = _assign_point_ids(state, _chunks(PENALTY, amended), provenance)
+    assert [doc.page_content for _, _, doc in assigned] == [PENALTY, amended]
+    assert state.duplicates == 0
+
+
+def test_file_chunk_ids_stay_contiguous_around_dropped_chunks():
+    state, provenance = _state(), {}
+    _assign_point_ids(state, _chunks(PREAMBLE, "Section 1. Short title."), provenance)
+    assigned = _assign_point_ids(state, _chunks(PREAMBLE, "Section 2. Definitions."), provenance)
+    assert [doc.metadata["file_chunk_id"] for _, _, doc in assigned] == [2]
+    assert state.kept == 3
@@ -0,0 +1,93 @@
+import pytest
+
+pytest.importorskip("streamlit")
+from qdrant_client import QdrantClient, models
+
+import config
+import tenants
+from neighbor_expansion import NEIGHBOR_SCORE_STEP, expand_neighbors
+
+COLLECTION = "acts"
+# Local (in-memory) Qdrant ignores payload indexes
+pytestmark = pytest.mark.filterwarnings("ignore:Payload indexes have no effect")
+
+
+@pytest.fixture
+def client():
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        COLLECTION,
+        vectors_config={config.DENSE_VECTOR_NAME: models.VectorParams(size=2, distance=models.Distance.COSINE)},
+    )
+    return client
+
+
+def _upload(client, chunks, collection_name=COLLECTION):
+    """chunks: (point id, file id, position in file, section, extra payload)."""
+    client.upload_points(collection_name, points=[
+        models.PointStruct(
+            id=point_id,
+            vector={config.DENSE_VECTOR_NAME: [1.0, 0.0]},
+            payload={
+                "chunk": f"chunk {point_id}", "global_chunk_id": file_id, "file_chunk_id": position,
+                "section_name": section, **extra,
+            },
+        )
+        for point_id, file_id, position, section, extra in chunks
+    ], wait=True)
+
+
+def _winner(point_id, file_id, position, section, score=1.0, collection_name=COLLECTION):
+    return {
+        "id": point_id, "global_chunk_id": file_id, "file_chunk_id": position, "section_name": section,
+        "score": score, "collection": collection_name,
+    }
+
+
+def test_window_stays_in_file_and_section(client):
+    _upload(client, [
+        (1, 100, 0, "1. Definitions", {}),
+        (2, 100, 1, "2. Offences", {}),
+        (3, 100, 2, "2. Offences", {}),
+        (4, 100, 3, "2. Offences", {}),
+        (5, 100, 4, "2. Offences", {}),
+        (6, 200, 2, "2. Offences", {}),  # another file
+    ])
+    docs = [_winner(3, 100, 2, "2. Offences")]
+
+    expanded = expand_neighbors(client, docs, window=1)
+    assert [d["id"] for d in expanded] == [3, 2, 4]
+    assert all(d["neighbor_of"] == 3 for d in expanded[1:])
+    assert expanded[1]["score"] == pytest.approx(1.0 - NEIGHBOR_SCORE_STEP)
+
+
+def test_neighbors_are_not_repeated(client):
+    _upload(client, [(n, 100, n, None, {}) for n in range(1, 6)])
+    docs = [_winner(2, 100, 2, None, score=0.5), _winner(3, 100, 3, None, score=0.9)]
+
+    expanded = expand_neighbors(client, docs, window=1)
+    assert [d["id"] for d in expanded] == [2, 3, 1, 4]
+    # A chunk in both windows goes to the better winner
+    assert expanded[3]["neighbor_of"] == 3
+
+
+def test_no_window_returns_docs_unchanged(client):
+    docs = [_winner(1, 100, 0, None)]
+    assert expand_neighbors(client, docs, window=0) == docs
+
+
+def test_tenant_collection_only_expands_into_the_tenant(client):
+    shared = config.ORGANIZATION_COLLECTION_NAME
+    client.create_collection(
+        shared,
+        vectors_config={config.DENSE_VECTOR_NAME: models.VectorParams(size=2, distance=models.Distance.COSINE)},
+    )
+    _upload(client, [
+        (1, 100, 0, None, {config.TENANT_FIELD: "acme"}),
+        (2, 100, 1, None, {config.TENANT_FIELD: "acme"}),
+        (3, 100, 2, None, {config.TENANT_FIELD: "other"}),
+    ], shared)
+    docs = [_winner(2, 100, 1, None, collection_name=shared)]
+
+    assert tenants.requires_tenant(shared)
+    assert [d["id"] for d in expand_neighbors(client, docs, window=1, tenant_id="acme")] == [2, 1]
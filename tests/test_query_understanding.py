@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+
+import query_understanding
+from query_understanding import MAX_PAGE_RANGE, QueryFilters, act_years, build_filter, known_act_names, parse_query
+
+ACTS = [
+    "Muluki Civil Code, 2074 (2017)",
+    "Electronic Transactions Act, 2063 (2008)",
+    "Electronic Transactions Act, 2075 (2018)",
+]
+
+
+def test_single_page():
+    assert parse_query("What is on page 12?").pages == [12]
+
+
+def test_page_range_is_expanded():
+    assert parse_query("Summarize pages 3-5").pages == [3, 4, 5]
+    assert parse_query("pages 7 to 8 please").pages == [7, 8]
+
+
+def test_too_wide_page_range_is_ignored():
+    assert parse_query(f"pages 1-{MAX_PAGE_RANGE + 2}").pages == []
+
+
+def test_sections():
+    filters = parse_query("Compare section 5 and sec. 12a")
+    assert filters.section_numbers == ["5", "12A"]
+
+
+def test_year_outside_references():
+    filters = parse_query("Which laws changed in 2018?")
+    assert filters.years == [2018]
+    # Numbers of page or section references are not years
+    assert parse_query("section 2019 on page 2020").years == []
+
+
+def test_act_name_match():
+    filters = parse_query("What does the muluki civil code say about marriage?", ACTS)
+    assert filters.act_names == ["Muluki Civil Code, 2074 (2017)"]
+
+
+def test_year_selects_act_edition():
+    filters = parse_query("Section 47 of the Electronic Transactions Act 2018", ACTS)
+    assert filters.act_names == ["Electronic Transactions Act, 2075 (2018)"]
+    assert filters.section_numbers == ["47"]
+    assert filters.years == []
+
+
+def test_act_years():
+    assert act_years("Muluki Civil Code, 2074 (2017)") == [2074, 2017]
+
+
+def test_build_filter():
+    assert build_filter(QueryFilters()) is None
+    query_filter = build_filter(QueryFilters(section_numbers=["5"], pages=[1, 2]))
+    assert [c.key for c in query_filter.must] == ["section_number", "page_number"]
+
+
+class _FacetClient:
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    def facet(self, **kwargs):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("no index")
+        return SimpleNamespace(hits=[SimpleNamespace(value=ACTS[0])])
+
+
+def test_act_names_failure_is_cached(monkeypatch):
+    client = _FacetClient(fail=True)
+    assert known_act_names(client, "failing_collection") == []
+    assert known_act_names(client, "failing_collection") == []
+    assert client.calls == 1
+
+    # Failures expire like successes
+    monkeypatch.setattr(query_understanding, "ACT_NAMES_TTL_S", 0)
+    client.fail = False
+    assert known_act_names(client, "failing_collection") == [ACTS[0]]
+    assert client.calls == 2
@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+pytest.importorskip("streamlit")
+import rag_query
+from query_understanding import QueryFilters
+
+
+def test_query_filters_key_is_stable():
+    understood = {
+        "b": (QueryFilters(section_numbers=["5"]), None),
+        "a": (QueryFilters(years=[2018]), None),
+    }
+    key = rag_query.query_filters_key(understood)
+    assert json.loads(key) == {"a": {"years": [2018]}, "b": {"section_numbers": ["5"]}}
+    assert key == rag_query.query_filters_key(dict(reversed(understood.items())))
+
+
+def test_plan_reuses_understood_query(monkeypatch):
+    def _fail(*args, **kwargs):
+        raise AssertionError("query understanding ran twice")
+
+    monkeypatch.setattr(rag_query, "understand_query", _fail)
+    monkeypatch.setattr(rag_query, "route_query", lambda q, r, coll, qf, f, t: (coll, qf.section_numbers))
+    understood = {"acts": (QueryFilters(section_numbers=["5"]), None)}
+    timings = {}
+    filters = rag_query.plan_collection_filters("section 5?", (None, None, None), "acts", timings, None, understood)
+    assert filters == {"acts": ("acts", ["5"])}
+    assert timings["query_filters"] == {"section_numbers": ["5"]}
@@ -0,0 +1,62 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("streamlit")
+import rag_query
+import rag_query_async
+
+DOCS = [{"chunk": "Penalty: up to three years.", "legal_act_name": "Test Act", "page_number": 1, "score": 1.0}]
+
+
+class _Stream:
+    def __init__(self, texts, fail_first=None):
+        self._texts = list(texts)
+        self._fail_first = fail_first
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._fail_first:
+            error, self._fail_first = self._fail_first, None
+            raise error
+        if not self._texts:
+            raise StopAsyncIteration
+        return SimpleNamespace(text=self._texts.pop(0))
+
+
+def _client(streams):
+    async def generate_content_stream(**_):
+        return streams.pop(0)
+
+    return SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content_stream=generate_content_stream)))
+
+
+async def _collect(agen):
+    return [chunk async for chunk in agen]
+
+
+def _stream_answer():
+    return asyncio.run(_collect(rag_query_async.astream_answer("What is the penalty?", DOCS)))
+
+
+def test_first_chunk_rate_limit_is_retried(monkeypatch):
+    streams = [_Stream([], fail_first=RuntimeError("429 RESOURCE_EXHAUSTED")), _Stream(["Up to ", "three years."])]
+    monkeypatch.setattr(rag_query, "client", _client(streams))
+    monkeypatch.setattr(rag_query_async.random, "uniform", lambda a, b: 0.0)
+    monkeypatch.setattr(rag_query_async, "_execute_with_retry_async", _no_delay_retry)
+    assert _stream_answer() == ["Up to ", "three years."]
+
+
+def test_other_errors_end_in_the_error_message(monkeypatch):
+    monkeypatch.setattr(rag_query, "client", _client([_Stream([], fail_first=ValueError("bad request"))]))
+    assert _stream_answer() == [rag_query.GENERATION_ERROR_MESSAGE]
+
+
+async def _no_delay_retry(coro_factory, retries=3, initial_delay=2):
+    return await _original_retry(coro_factory, retries, 0)
+
+
+_original_retry = rag_query_async._execute_with_retry_async
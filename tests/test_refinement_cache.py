@@ -0,0 +1,51 @@
+import time
+
+from refinement_cache import RefinementCache, normalize_query
+
+
+def test_normalized_questions_share_a_key():
+    assert normalize_query("  What is Section 5?  ") == "what is section 5"
+    assert RefinementCache.make_key("What is  section 5?", "fp") == RefinementCache.make_key("what is section 5", "fp")
+    # A different model or prompt fingerprint invalidates old refinements
+    assert RefinementCache.make_key("what is section 5", "fp") != RefinementCache.make_key("what is section 5", "fp2")
+
+
+def test_get_put_and_hit_rate():
+    cache = RefinementCache(max_entries=10, ttl_seconds=60)
+    assert cache.get("k") is None
+    cache.put("k", ["q1", "q2"])
+    queries = cache.get("k")
+    assert queries == ["q1", "q2"]
+    queries.append("mutated")
+    assert cache.get("k") == ["q1", "q2"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 1)
+
+
+def test_lru_eviction_and_ttl():
+    cache = RefinementCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", ["a"])
+    cache.put("b", ["b"])
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("c", ["c"])
+    assert cache.get("b") is None
+    assert cache.get("a") == ["a"]
+
+    cache.ttl_seconds = 0.01
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_entries_survive_a_restart(tmp_path):
+    db_path = str(tmp_path / "refinements.sqlite")
+    cache = RefinementCache(max_entries=2, ttl_seconds=60, db_path=db_path)
+    cache.put("a", ["a"])
+    cache.put("b", ["b"])
+    cache.put("c", ["c"])  # evicts "a" from memory and disk
+
+    restarted = RefinementCache(max_entries=2, ttl_seconds=60, db_path=db_path)
+    assert restarted.get("a") is None
+    assert restarted.get("b") == ["b"] and restarted.get("c") == ["c"]
+
+    expired = RefinementCache(max_entries=2, ttl_seconds=0, db_path=db_path)
+    assert expired.stats()["entries"] == 0
@@ -0,0 +1,63 @@
+from reranker import RerankEngine
+
+
+class _Model:
+    def __init__(self):
+        self.pairs = []
+
+    def predict(self, pairs, batch_size=32):
+        self.pairs.extend(pairs)
+        # Longer chunks score higher
+        return [float(len(chunk)) for _, chunk in pairs]
+
+
+def _doc(point_id, chunk, score=1.0, collection="acts"):
+    return {"id": point_id, "chunk": chunk, "score": score, "collection": collection}
+
+
+def test_scores_are_cached_per_query_and_point():
+    model = _Model()
+    engine = RerankEngine(model, "test-model")
+    ranked, stats = engine.rerank("What is the fine?", [_doc(1, "short"), _doc(2, "a longer chunk")], top_k=2)
+    assert [d["id"] for d in ranked] == [2, 1]
+    assert stats["rerank_pairs_scored"] == 2
+
+    _, stats = engine.rerank("what is the fine", [_doc(1, "short"), _doc(2, "a longer chunk")], top_k=1)
+    assert (stats["rerank_pairs_scored"], stats["rerank_cache_hits"]) == (0, 2)
+    _, stats = engine.rerank("Another question", [_doc(1, "short")], top_k=1)
+    assert stats["rerank_pairs_scored"] == 1
+
+
+def test_same_id_in_another_collection_is_scored_separately():
+    engine = RerankEngine(_Model(), "test-model")
+    engine.rerank("q", [_doc(1, "short", collection="acts")], top_k=1)
+    ranked, stats = engine.rerank("q", [_doc(1, "a longer chunk", collection="rules")], top_k=1)
+    assert stats["rerank_cache_hits"] == 0
+    assert ranked[0]["score"] == len("a longer chunk")
+
+
+def test_docs_without_id_do_not_share_scores():
+    engine = RerankEngine(_Model(), "test-model")
+    ranked, _ = engine.rerank("q", [_doc(None, "short"), _doc(None, "a longer chunk")], top_k=2)
+    assert [d["score"] for d in ranked] == [len("a longer chunk"), len("short")]
+    _, stats = engine.rerank("q", [_doc(None, "short")], top_k=1)
+    assert stats["rerank_cache_hits"] == 1
+
+
+def test_cache_is_bounded():
+    engine = RerankEngine(_Model(), "test-model", cache_max_entries=2)
+    engine.rerank("q", [_doc(n, f"chunk {n}") for n in range(3)], top_k=3)
+    _, stats = engine.rerank("q", [_doc(0, "chunk 0")], top_k=1)
+    assert stats["rerank_cache_hits"] == 0
+
+
+def test_cascade_skips_a_decisive_selection_and_limits_candidates():
+    model = _Model()
+    engine = RerankEngine(model, "test-model", mode="cascade", cascade_top_m=2, skip_margin=0.2)
+    decisive = [_doc(1, "a", 1.0), _doc(2, "b", 0.1)]
+    ranked, stats = engine.rerank("q", decisive, top_k=1)
+    assert stats["rerank_mode"] == "skipped" and ranked[0]["id"] == 1 and not model.pairs
+
+    close = [_doc(n, "x" * n, 1.0 - n * 0.01) for n in range(1, 6)]
+    _, stats = engine.rerank("q", close, top_k=1)
+    assert stats["rerank_mode"] == "cascade" and stats["rerank_pairs_scored"] == 2
@@ -0,0 +1,76 @@
+import pytest
+
+pytest.importorskip("streamlit")
+from qdrant_client import QdrantClient, models
+
+import config
+from routing_index import FALLBACK_ACT_NAME, rebuild_routing_entries, route_acts, routing_collection_for
+
+COLLECTION = "acts"
+# Local (in-memory) Qdrant ignores payload indexes
+pytestmark = pytest.mark.filterwarnings("ignore:Payload indexes have no effect")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(config, "VECTOR_SIZE", 3)
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        COLLECTION,
+        vectors_config={config.DENSE_VECTOR_NAME: models.VectorParams(size=3, distance=models.Distance.COSINE)},
+    )
+    return client
+
+
+def _upload(client, chunks):
+    client.upload_points(COLLECTION, points=[
+        models.PointStruct(
+            id=n,
+            vector={config.DENSE_VECTOR_NAME: vector},
+            payload={"legal_act_name": act, "section_name": section, "source_file": source},
+        )
+        for n, (act, section, source, vector) in enumerate(chunks)
+    ], wait=True)
+
+
+def _routing_payloads(client):
+    records, _ = client.scroll(routing_collection_for(COLLECTION), limit=100, with_payload=True)
+    return sorted((r.payload["level"], r.payload["legal_act_name"], r.payload["section_name"] or "") for r in records)
+
+
+def test_rebuild_writes_act_and_section_centroids_without_fallback_act(client):
+    _upload(client, [
+        ("Cyber Act", "1. Hacking", "cyber.pdf", [1.0, 0.0, 0.0]),
+        ("Cyber Act", "2. Fines", "cyber.pdf", [0.9, 0.1, 0.0]),
+        ("Bank Act", "1. Licences", "bank.pdf", [0.0, 1.0, 0.0]),
+        (FALLBACK_ACT_NAME, None, "misc.pdf", [0.0, 0.0, 1.0]),
+    ])
+    written = rebuild_routing_entries(client, COLLECTION, ["cyber.pdf", "bank.pdf", "misc.pdf"])
+
+    assert written == 5
+    assert _routing_payloads(client) == [
+        ("act", "Bank Act", ""), ("act", "Cyber Act", ""),
+        ("section", "Bank Act", "1. Licences"), ("section", "Cyber Act", "1. Hacking"), ("section", "Cyber Act", "2. Fines"),
+    ]
+    assert route_acts(client, COLLECTION, [1.0, 0.05, 0.0], top_acts=1) == ["Cyber Act"]
+    assert route_acts(client, COLLECTION, [0.0, 0.0, 1.0], top_acts=5) == ["Bank Act", "Cyber Act"]
+
+
+def test_rebuild_drops_acts_a_file_no_longer_contains(client):
+    _upload(client, [("Old Act", "1. Scope", "act.pdf", [1.0, 0.0, 0.0])])
+    rebuild_routing_entries(client, COLLECTION, ["act.pdf"])
+
+    # Re-ingested under a new act name
+    client.delete(COLLECTION, points_selector=models.PointIdsList(points=[0]), wait=True)
+    _upload(client, [("New Act", "1. Scope", "act.pdf", [1.0, 0.0, 0.0])])
+    rebuild_routing_entries(client, COLLECTION, ["act.pdf"])
+    assert [p[1] for p in _routing_payloads(client)] == ["New Act", "New Act"]
+
+
+def test_rebuilds_of_a_collection_are_serialized(client, monkeypatch):
+    _upload(client, [("Cyber Act", None, "cyber.pdf", [1.0, 0.0, 0.0])])
+    with config.get_id_allocator().lock(COLLECTION, "routing"):
+        monkeypatch.setattr(config, "ROUTING_LOCK_TIMEOUT_S", 0.05)
+        with pytest.raises(TimeoutError):
+            rebuild_routing_entries(client, COLLECTION, ["cyber.pdf"])
+    assert rebuild_routing_entries(client, COLLECTION, ["cyber.pdf"]) == 1
@@ -0,0 +1,58 @@
+import time
+
+from id_allocator import IdAllocator
+from semantic_cache import CachedAnswer, SemanticAnswerCache
+
+
+def _answer(text="answer"):
+    return CachedAnswer(answer=text, docs=[{"chunk": "c"}], refined_queries=[])
+
+
+def test_similar_question_hits_and_dissimilar_misses():
+    cache = SemanticAnswerCache(threshold=0.9, max_entries=10, ttl_seconds=60)
+    cache.store("acts", [1.0, 0.0], 0, _answer())
+    assert cache.lookup("acts", [0.99, 0.05], 0).answer == "answer"
+    assert cache.lookup("acts", [0.0, 1.0], 0) is None
+    assert cache.lookup("rules", [1.0, 0.0], 0) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 1)
+
+
+def test_constraints_must_match_exactly():
+    cache = SemanticAnswerCache(threshold=0.9, max_entries=10, ttl_seconds=60)
+    cache.store("acts", [1.0, 0.0], 0, _answer("section 5"), '{"acts": {"section_numbers": ["5"]}}')
+    assert cache.lookup("acts", [1.0, 0.0], 0, '{"acts": {"section_numbers": ["6"]}}') is None
+    assert cache.lookup("acts", [1.0, 0.0], 0, '{"acts": {"section_numbers": ["5"]}}').answer == "section 5"
+
+
+def test_new_generation_drops_entries():
+    cache = SemanticAnswerCache(threshold=0.9, max_entries=10, ttl_seconds=60)
+    cache.store("acts", [1.0, 0.0], 3, _answer())
+    assert cache.lookup("acts", [1.0, 0.0], 4) is None
+    assert cache.lookup("acts", [1.0, 0.0], 3) is None
+
+
+def test_recreated_collection_never_serves_old_answers(tmp_path):
+    # ensure_collection resets the ID sequences and bumps the generation
+    allocator = IdAllocator(str(tmp_path / "ids.db"))
+    cache = SemanticAnswerCache(threshold=0.9, max_entries=10, ttl_seconds=60)
+    allocator.reserve("acts", "generation", 1)
+    cache.store("acts", [1.0, 0.0], allocator.peek("acts", "generation"), _answer("deleted data"))
+
+    allocator.reset("acts")
+    allocator.reserve("acts", "generation", 1)
+    assert cache.lookup("acts", [1.0, 0.0], allocator.peek("acts", "generation")) is None
+
+
+def test_lru_eviction_and_ttl():
+    cache = SemanticAnswerCache(threshold=0.99, max_entries=2, ttl_seconds=60)
+    cache.store("acts", [1.0, 0.0, 0.0], 0, _answer("a"))
+    cache.store("acts", [0.0, 1.0, 0.0], 0, _answer("b"))
+    cache.lookup("acts", [1.0, 0.0, 0.0], 0)  # "b" is now the least recently used
+    cache.store("acts", [0.0, 0.0, 1.0], 0, _answer("c"))
+    assert cache.lookup("acts", [0.0, 1.0, 0.0], 0) is None
+    assert cache.lookup("acts", [1.0, 0.0, 0.0], 0).answer == "a"
+
+    cache.ttl_seconds = 0.01
+    time.sleep(0.02)
+    assert cache.lookup("acts", [1.0, 0.0, 0.0], 0) is None
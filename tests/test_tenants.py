@@ -0,0 +1,83 @@
+import pytest
+
+pytest.importorskip("streamlit")
+from qdrant_client import QdrantClient, models
+
+import config
+import rag_query
+import tenants
+from ingestion_pipeline import ensure_collection
+
+SHARED = config.ORGANIZATION_COLLECTION_NAME
+# Local (in-memory) Qdrant ignores payload indexes
+pytestmark = pytest.mark.filterwarnings("ignore:Payload indexes have no effect")
+
+
+@pytest.fixture(autouse=True)
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TENANT_DB", str(tmp_path / "tenants.sqlite"))
+    tenants._invalidate_registry()
+    yield
+    tenants._invalidate_registry()
+
+
+@pytest.fixture
+def client():
+    client = QdrantClient(":memory:")
+    ensure_collection(client, SHARED)
+    vector = {config.DENSE_VECTOR_NAME: [1.0] * config.VECTOR_SIZE}
+    client.upload_points(SHARED, points=[
+        models.PointStruct(id=n, vector=vector, payload={config.TENANT_FIELD: tenant, "legal_act_name": act})
+        for n, (tenant, act) in enumerate([("acme", "Acme Bylaws"), ("acme", "Acme Policy"), ("other", "Other Rules")])
+    ], wait=True)
+    return client
+
+
+def _tenants_in(client, collection_name):
+    records, _ = client.scroll(collection_name, limit=100, with_payload=True)
+    return sorted(r.payload[config.TENANT_FIELD] for r in records)
+
+
+def test_scope_filter_requires_a_tenant_on_tenant_collections():
+    with pytest.raises(ValueError):
+        tenants.scope_filter(SHARED, None)
+    assert tenants.scope_filter(config.COLLECTION_NAME, None) is None
+
+    scoped = tenants.scope_filter(SHARED, "acme")
+    assert scoped.must[0].key == config.TENANT_FIELD
+    assert scoped.must[0].match.value == "acme"
+
+
+def test_migrate_moves_only_that_tenant(client):
+    assert tenants.migrate_tenant(client, SHARED, "acme") == 2
+
+    dedicated = tenants.dedicated_collection_name(SHARED, "acme")
+    assert _tenants_in(client, dedicated) == ["acme", "acme"]
+    assert _tenants_in(client, SHARED) == ["other"]
+    # The registry is reloaded right after a migration in this process
+    assert tenants.resolve_collection(SHARED, "acme") == dedicated
+    assert tenants.resolve_collection(SHARED, "other") == SHARED
+    assert tenants.base_collection(dedicated) == SHARED
+    assert tenants.requires_tenant(dedicated)
+
+
+def test_registry_picks_up_other_processes_after_ttl(monkeypatch):
+    assert tenants.resolve_collection(SHARED, "acme") == SHARED
+    conn = tenants._connect()
+    try:
+        conn.execute("INSERT INTO dedicated_tenants VALUES (?, ?, ?)", (SHARED, "acme", "moved"))
+    finally:
+        conn.close()
+    # Still the cached copy until it expires
+    assert tenants.resolve_collection(SHARED, "acme") == SHARED
+    monkeypatch.setattr(config, "TENANT_REGISTRY_TTL_S", -1)
+    assert tenants.resolve_collection(SHARED, "acme") == "moved"
+
+
+def test_act_names_are_scoped_to_the_tenant(client):
+    query_filters, _ = rag_query.understand_query("What do the acme bylaws and other rules say?", client, SHARED, "acme")
+    assert query_filters.act_names == ["Acme Bylaws"]
+    query_filters, _ = rag_query.understand_query("What do the acme bylaws and other rules say?", client, SHARED, "other")
+    assert query_filters.act_names == ["Other Rules"]
+    with pytest.raises(ValueError):
+        rag_query.understand_query("Other Rules", client, SHARED)
@@ -26,12 +26,14 @@ class Authentication:
                     {
                         "username": "admin1",
                         "password": "admin123",
-                        "role": "admin"
+                        "role": "admin",
+                        "tenant_id": "default"
                     },
                     {
                         "username": "employee1",
                         "password": "employee123",
-                        "role": "employee"
+                        "role": "employee",
+                        "tenant_id": "default"
                     },
                     {
                         "username": "developer",
@@ -1,5 +1,6 @@
 import streamlit as st
 from utils.auth import Authentication
+import config
 
 ROLE_PAGES = {
     "user": [
@@ -71,3 +72,33 @@ def init_page(title):
             st.page_link(page_path, label=label)
 
     return user
+
+
+def allowed_collections(role: str) -> list:
+    """Collections behind the chat pages a role may open (ROLE_PAGES)."""
+    return [
+        config.PAGE_COLLECTIONS[page_path]
+        for page_path, _ in ROLE_PAGES.get(role.lower(), [])
+        if page_path in config.PAGE_COLLECTIONS
+    ]
+
+
+def select_collections(user, primary_collection: str) -> list:
+    """
+    Sidebar choice of extra collections to search alongside the page's own
+    (federated search); only collections the user's role may access are offered.
+    Returns the collections to search, `primary_collection` first.
+    """
+    others = [c for c in allowed_collections(user["role"]) if c != primary_collection]
+    if not others:
+        return [primary_collection]
+
+    with st.sidebar:
+        st.divider()
+        extra = st.multiselect(
+            "Also search",
+            options=others,
+            format_func=lambda c: config.COLLECTION_LABELS.get(c, c),
+            key=f"federated_{primary_collection}",
+        )
+    return [primary_collection] + extra